@@ -1,19 +1,25 @@
 import streamlit as st  # type: ignore
+import io
+import json
 import os
 import tempfile
 import glob
-import geometry
-import costs
-import data_loader
-import pandas as pd  # type: ignore
-from utils import export
+import step_scan
+from utils import instrumentation
+from utils.lazy import lazy_import, warm_up
+
+# Heavy modules (CadQuery/OCP, ReportLab, pandas) load on first use so the
+# first page renders without them
+geometry = lazy_import("geometry")
+costs = lazy_import("costs")
+nesting = lazy_import("nesting")
+data_loader = lazy_import("data_loader")
+pd = lazy_import("pandas")
+np = lazy_import("numpy")
+export = lazy_import("utils.export")
 
 st.set_page_config(page_title="QuoteForge", page_icon="⚙️", layout="wide")
 
-print("DEBUG: Geometry imported successfully")
-print("DEBUG: Costs imported successfully")
-print("DEBUG: Export imported successfully")
-
 st.markdown(
     """
     <style>
@@ -67,6 +73,18 @@ st.markdown(
 if "cost_overrides" not in st.session_state:
     st.session_state.cost_overrides = {}
 
+if "background_parts" not in st.session_state:
+    st.session_state.background_parts = {}
+
+# Quantities quoted in the price-break table and exports
+if "price_breaks" not in st.session_state:
+    st.session_state.price_breaks = [1, 10, 50, 100, 500]
+
+# Per-session timings; the process-wide registry still sees everything
+if "metrics_registry" not in st.session_state:
+    st.session_state.metrics_registry = instrumentation.Registry()
+instrumentation.set_session_registry(st.session_state.metrics_registry)
+
 
 def update_cost_overrides(part_number, key, df_ref):
     """
@@ -137,6 +155,294 @@ def update_quantity(part_number, key, other_key):
             st.session_state[other_key] = new_qty
 
 
+def price_parts(file_infos, volumes):
+    """
+    Prices every part, re-costing only those whose inputs changed since the
+    last rerun. The Costing and Export tabs share the memo in session state.
+
+    volumes maps part number to volume in cubic inches.
+    Returns a dict mapping part number to its cost breakdown result.
+    """
+    part_numbers = [f["name"] for f in file_infos]
+    configs = [st.session_state.part_configs.get(p, {}) for p in part_numbers]
+    overrides = [st.session_state.cost_overrides.get(p, {}) for p in part_numbers]
+    part_features = [st.session_state.get(f"features_{p}") for p in part_numbers]
+    if "quote_memo" not in st.session_state:
+        st.session_state.quote_memo = costs.IncrementalQuote()
+    return st.session_state.quote_memo.price(
+        part_numbers,
+        configs,
+        [volumes[p] for p in part_numbers],
+        overrides,
+        part_features,
+    )
+
+
+def session_memo(name, inputs, compute):
+    """
+    Returns compute(), reusing the result of the last call under the same name
+    while its inputs and the rate sheets are unchanged. Only the latest result
+    per name is kept. Results are shared between tabs and reruns and must not
+    be mutated.
+
+    inputs must be JSON-serializable (anything else is fingerprinted by str).
+    """
+    fingerprint = (
+        json.dumps(inputs, sort_keys=True, default=str),
+        data_loader.get_rates_version(),
+    )
+    if "session_memo" not in st.session_state:
+        st.session_state.session_memo = {}
+    memo = st.session_state.session_memo
+    if name not in memo or memo[name][0] != fingerprint:
+        memo[name] = (fingerprint, compute())
+    return memo[name][1]
+
+
+def price_break_curves(file_infos, volumes):
+    """
+    Prices every part at each of the session's price-break quantities.
+
+    Curves are recomputed only when the parts' inputs, the quantities or the
+    rates change; the Costing and Export tabs share the result.
+
+    Returns a DataFrame of per-part cost indexed by part number with one
+    column per quantity.
+    """
+    part_numbers = [f["name"] for f in file_infos]
+    configs = [st.session_state.part_configs.get(p, {}) for p in part_numbers]
+    part_volumes = [volumes[p] for p in part_numbers]
+    quantities = list(st.session_state.price_breaks)
+    overrides = [st.session_state.cost_overrides.get(p, {}) for p in part_numbers]
+    part_features = [st.session_state.get(f"features_{p}") for p in part_numbers]
+
+    def price_breaks():
+        per_part, _ = costs.calculate_price_breaks(
+            part_numbers, configs, part_volumes, quantities, overrides, part_features
+        )
+        return per_part
+
+    return session_memo(
+        "price_break_curves",
+        (part_numbers, configs, part_volumes, quantities, overrides, part_features),
+        price_breaks,
+    )
+
+
+def simulate_costs(file_infos, volumes):
+    """
+    Simulates the batch cost uncertainty of every part and the whole quote.
+
+    The simulation is seeded, so it only reruns when the parts' inputs or the
+    rates change; the Costing and Export tabs share the result.
+
+    Returns (parts, quote) from costs.simulate_quote: a DataFrame of P10/P50/
+    P90 batch cost indexed by part number and the quote totals.
+    """
+    part_numbers = [f["name"] for f in file_infos]
+    configs = [st.session_state.part_configs.get(p, {}) for p in part_numbers]
+    part_volumes = [volumes[p] for p in part_numbers]
+    overrides = [st.session_state.cost_overrides.get(p, {}) for p in part_numbers]
+    part_features = [st.session_state.get(f"features_{p}") for p in part_numbers]
+
+    def simulate():
+        # Stock follows from the configs and features in the fingerprint
+        stock, _ = nesting.plan_stock(part_numbers, configs, part_features)
+        return costs.simulate_quote(
+            part_numbers, configs, part_volumes, overrides, part_features, stock
+        )
+
+    return session_memo(
+        "simulate_costs",
+        (part_numbers, configs, part_volumes, overrides, part_features),
+        simulate,
+    )
+
+
+def material_matrix(part_numbers, configs, part_features, materials_df):
+    """
+    Prices analyzed parts in every catalog material (see
+    costs.material_cost_matrix), recomputing only when the parts' inputs or
+    the rates change. The expander body runs on every rerun, even collapsed.
+    """
+    part_volumes = [st.session_state[f"vol_{p}"] for p in part_numbers]
+
+    def price_materials():
+        stock, _ = nesting.plan_stock(part_numbers, configs, part_features)
+        return costs.material_cost_matrix(
+            part_numbers, part_volumes, stock, materials_df
+        )
+
+    return session_memo(
+        "material_matrix",
+        (part_numbers, configs, part_volumes, part_features),
+        price_materials,
+    )
+
+
+def process_routes(part_numbers, configs, part_features):
+    """
+    Finds the cheapest and the Pareto-best process routes of analyzed parts,
+    recomputing only when the parts' inputs or the rates change. The
+    expander body runs on every rerun, even collapsed.
+
+    Returns:
+        (costs.cheapest_routes DataFrame, costs.pareto_routes dict)
+    """
+    part_volumes = [st.session_state[f"vol_{p}"] for p in part_numbers]
+    overrides = [st.session_state.cost_overrides.get(p, {}) for p in part_numbers]
+
+    def optimize_routes():
+        route_options = costs.calculate_route_options(
+            part_numbers, configs, part_volumes, overrides, part_features
+        )
+        return (
+            costs.cheapest_routes(route_options),
+            costs.pareto_routes(route_options),
+        )
+
+    return session_memo(
+        "process_routes",
+        (part_numbers, configs, part_volumes, overrides, part_features),
+        optimize_routes,
+    )
+
+
+def format_cost_range(cost_range):
+    """Formats a percentile label -> cost dict as "P10 $1.00 · P50 $2.00 ..." """
+    return " · ".join(f"{label} ${cost:,.2f}" for label, cost in cost_range.items())
+
+
+def switch_all_materials(material):
+    """Callback to set every part to one material"""
+    for config in st.session_state.part_configs.values():
+        config["material"] = material
+    # Drop the per-row selectbox state so the widgets show the new material
+    for key in [
+        k
+        for k in st.session_state.keys()
+        if isinstance(k, str) and k.startswith("mat_")
+    ]:
+        del st.session_state[key]
+
+
+def route_label(config):
+    """Short description of the processes a part configuration runs through"""
+    return " → ".join(costs.get_part_processes(config)) or "Material only"
+
+
+def apply_routes(routes):
+    """Callback to switch parts to the given routes (part number -> route)"""
+    for part_number, route in routes.items():
+        config = st.session_state.part_configs[part_number]
+        config.update(costs.apply_route(config, route))
+    # Drop the per-row process widget state so the widgets show the new routes
+    prefixes = ("cut_", "mach_", "turn_", "3dprint_", "finish_")
+    for key in [
+        k
+        for k in st.session_state.keys()
+        if isinstance(k, str) and k.startswith(prefixes)
+    ]:
+        del st.session_state[key]
+
+
+def update_price_breaks():
+    """Callback to parse the price-break quantities text input"""
+    try:
+        quantities = costs.parse_quantities(st.session_state.price_break_text)
+    except ValueError:
+        st.session_state.price_break_error = True
+        return
+    st.session_state.price_break_error = not quantities
+    if quantities:
+        st.session_state.price_breaks = quantities
+
+
+def dismiss_rate_report():
+    """Callback to hide the rate change report until rates change again"""
+    st.session_state.quote_memo.rate_report = None
+
+
+def discard_generated_pdf():
+    """Deletes the generated PDF report's temp file and forgets its path"""
+    path = st.session_state.pop("pdf_generated_path", None)
+    if path and os.path.exists(path):
+        os.remove(path)
+
+
+def store_analysis(part_number, analysis):
+    """Stores an analyze_many result for a part in session state"""
+    if "error" in analysis:
+        st.session_state[f"geom_err_{part_number}"] = analysis["error"]
+        return
+    if analysis.get("thumbnail_svg"):
+        st.session_state[f"thumb_v2_{part_number}"] = analysis["thumbnail_svg"]
+    st.session_state[f"vol_{part_number}"] = analysis["volume_in3"]
+    if analysis.get("features"):
+        st.session_state[f"features_{part_number}"] = analysis["features"]
+
+
+def analyze_uploaded_files(file_infos):
+    """
+    Pre-scans newly imported files, then analyzes them in a process pool and
+    stores thumbnails/volumes in session state so the Configuration and
+    Costing tabs render from memory. Multi-body and very large files are
+    analyzed in the background instead of blocking the page.
+    """
+    if not file_infos:
+        return
+
+    foreground = []
+    for file_info in file_infos:
+        try:
+            file_info["scan"] = step_scan.scan_step(file_info["path"])
+        except Exception as e:
+            print(f"STEP pre-scan failed for {file_info['name']}: {e}")
+            file_info["scan"] = None
+
+        if file_info["scan"] and step_scan.needs_background(file_info["scan"]):
+            st.session_state.background_parts[file_info["name"]] = file_info["path"]
+        else:
+            foreground.append(file_info)
+
+    background_paths = [
+        f["path"] for f in file_infos if f["name"] in st.session_state.background_parts
+    ]
+    if background_paths:
+        geometry.analyze_in_background(background_paths)
+
+    if foreground:
+        with st.spinner(f"Analyzing {len(foreground)} part(s)..."):
+            results = geometry.analyze_many([f["path"] for f in foreground])
+        for file_info in foreground:
+            store_analysis(file_info["name"], results.get(file_info["path"], {}))
+
+
+def collect_background_results():
+    """Moves finished background analyses into session state"""
+    for part_number, path in list(st.session_state.background_parts.items()):
+        analysis = geometry.background_result(path)
+        if analysis is not None:
+            store_analysis(part_number, analysis)
+            del st.session_state.background_parts[part_number]
+
+
+def is_analyzing(part_number):
+    return part_number in st.session_state.background_parts
+
+
+@st.fragment(run_every="2s")
+def background_analysis_monitor():
+    """Reruns the app once every background analysis has finished"""
+    pending = st.session_state.background_parts
+    if not pending:
+        return
+    if any(geometry.background_pending(path) for path in pending.values()):
+        st.info(f"Analyzing {len(pending)} large part(s) in the background...")
+    else:
+        st.rerun(scope="app")
+
+
 st.markdown(
     "<h1><span style='font-weight:700; color:#EA7600'>Quote</span><span style='font-weight:400'>Forge</span></h1>",
     unsafe_allow_html=True,
@@ -155,6 +461,19 @@ with st.sidebar:
         help="Select the display units for measurements and inputs. Source data remains in Imperial.",
     )
 
+    show_performance = st.toggle(
+        "Show performance",
+        key="show_performance",
+        help="Per-stage latency percentiles for this session.",
+    )
+    # Filled at the end of the run so it includes this run's timings
+    performance_panel = st.container()
+
+if st.session_state.background_parts:
+    collect_background_results()
+if st.session_state.background_parts:
+    background_analysis_monitor()
+
 # Placeholder for main content
 tab1, tab2, tab3, tab4 = st.tabs(["Import", "Configuration", "Costing", "Export"])
 
@@ -175,6 +494,7 @@ with tab1:
 
     # Process newly uploaded files
     if uploaded_files:
+        new_files = []
         for uploaded_file in uploaded_files:
             # Check if file already exists in session state
             existing_names = [f["name"] for f in st.session_state.uploaded_files]
@@ -185,13 +505,16 @@ with tab1:
                     tmp_path = tmp.name
 
                 # Store file info in session state
-                st.session_state.uploaded_files.append(
-                    {
-                        "name": uploaded_file.name,
-                        "path": tmp_path,
-                        "size": uploaded_file.size,
-                    }
-                )
+                file_info = {
+                    "name": uploaded_file.name,
+                    "path": tmp_path,
+                    "size": uploaded_file.size,
+                }
+                st.session_state.uploaded_files.append(file_info)
+                new_files.append(file_info)
+
+        # Analyze once at upload time rather than per row render
+        analyze_uploaded_files(new_files)
 
         st.success(f"Added {len(uploaded_files)} file(s)")
 
@@ -205,7 +528,7 @@ with tab1:
                     os.path.join(samples_dir, "*.step")
                 ) + glob.glob(os.path.join(samples_dir, "*.stp"))
 
-                added_count = 0
+                new_files = []
                 for sample_path in sample_files:
                     file_name = os.path.basename(sample_path)
                     existing_names = [
@@ -220,17 +543,17 @@ with tab1:
                                 tmp.write(sf.read())
                             tmp_path = tmp.name
 
-                        st.session_state.uploaded_files.append(
-                            {
-                                "name": file_name,
-                                "path": tmp_path,
-                                "size": os.path.getsize(sample_path),
-                            }
-                        )
-                        added_count += 1
-
-                if added_count > 0:
-                    st.success(f"Added {added_count} sample file(s)")
+                        file_info = {
+                            "name": file_name,
+                            "path": tmp_path,
+                            "size": os.path.getsize(sample_path),
+                        }
+                        st.session_state.uploaded_files.append(file_info)
+                        new_files.append(file_info)
+
+                if new_files:
+                    analyze_uploaded_files(new_files)
+                    st.success(f"Added {len(new_files)} sample file(s)")
                     st.rerun()
                 else:
                     st.info("Sample files already loaded.")
@@ -242,6 +565,9 @@ with tab1:
             st.session_state.uploaded_files = []
             st.session_state.part_configs = {}
             st.session_state.cost_overrides = {}
+            st.session_state.background_parts = {}
+            st.session_state.pop("quote_memo", None)
+            st.session_state.pop("session_memo", None)
             # Also clear cached geometry/thumbnails keys from session state if present
             keys_to_clear = [
                 k
@@ -250,19 +576,57 @@ with tab1:
                 and (
                     k.startswith("thumb_")
                     or k.startswith("vol_")
+                    or k.startswith("features_")
                     or k.startswith("qty_")
                     or k.startswith("cost_qty_")
+                    or k.startswith("geom_err_")
                 )
             ]
             for k in keys_to_clear:
                 del st.session_state[k]
 
             # Clear generated PDF
-            if "pdf_generated_data" in st.session_state:
-                del st.session_state["pdf_generated_data"]
+            discard_generated_pdf()
 
             st.rerun()
 
+    if st.session_state.uploaded_files:
+        file_rows = []
+        for file_info in st.session_state.uploaded_files:
+            part_number = file_info["name"]
+            if "scan" not in file_info:
+                try:
+                    file_info["scan"] = step_scan.scan_step(file_info["path"])
+                except Exception:
+                    file_info["scan"] = None
+            scan = file_info["scan"] or {}
+
+            if is_analyzing(part_number):
+                status = "Analyzing"
+            elif f"geom_err_{part_number}" in st.session_state:
+                status = "Error"
+            elif f"vol_{part_number}" in st.session_state:
+                status = "Ready"
+            else:
+                status = "Pending"
+
+            file_rows.append(
+                {
+                    "Part": os.path.splitext(part_number)[0].replace("_", "-"),
+                    "Size (KB)": file_info.get("size", 0) / 1024,
+                    "Units": scan.get("length_unit", "unknown"),
+                    "Solids": scan.get("solid_count"),
+                    "Faces": scan.get("face_count"),
+                    "Source": scan.get("originating_system"),
+                    "Status": status,
+                }
+            )
+        st.dataframe(
+            file_rows,
+            hide_index=True,
+            column_config={"Size (KB)": st.column_config.NumberColumn(format="%.0f")},
+        )
+
     # Sticky Footer (Import Tab Only)
     st.markdown(
         """
@@ -333,18 +697,7 @@ with tab2:
             st.session_state.part_configs = {}
             for file_info in st.session_state.uploaded_files:
                 part_number = file_info["name"]
-                st.session_state.part_configs[part_number] = {
-                    "quantity": 1,
-                    "material": "Steel ASTM A36",
-                    "cutting": None,
-                    "machining": False,
-                    "turning": False,
-                    "3d_printing": False,
-                    "forming": False,
-                    "threading": False,
-                    "welding": False,
-                    "finishing": None,
-                }
+                st.session_state.part_configs[part_number] = costs.default_part_config()
 
         # Load materials and processes
         materials_df = data_loader.get_materials()
@@ -462,18 +815,7 @@ with tab2:
 
             # Ensure this part has a config
             if part_number not in st.session_state.part_configs:
-                st.session_state.part_configs[part_number] = {
-                    "quantity": 1,
-                    "material": "Steel ASTM A36",
-                    "cutting": None,
-                    "machining": False,
-                    "turning": False,
-                    "3d_printing": False,
-                    "forming": False,
-                    "threading": False,
-                    "welding": False,
-                    "finishing": None,
-                }
+                st.session_state.part_configs[part_number] = costs.default_part_config()
 
             config = st.session_state.part_configs[part_number]
 
@@ -489,19 +831,25 @@ with tab2:
 
                 # We store result in session state to avoid re-analyzing on every widget interaction
                 # Note: geometry analyzer is still needed for volume calculation in tab 3, but we can do it here too
-                if thumb_key not in st.session_state:
+                geom_err = st.session_state.get(f"geom_err_{part_number}")
+                if geom_err:
+                    st.error(f"Failed to generate thumbnail: {geom_err}")
+                elif is_analyzing(part_number):
+                    pass
+                elif thumb_key not in st.session_state:
                     try:
-                        analyzer = geometry.GeometryAnalyzer(file_path)
-                        svg_data = analyzer.get_thumbnail_svg()
-                        if svg_data:
-                            st.session_state[thumb_key] = svg_data
-                        # Also cache volume if we already have the analyzer
-                        st.session_state[f"vol_{part_number}"] = analyzer.get_volume()
+                        # Served from the on-disk geometry cache for previously seen files
+                        analysis = geometry.analyze_file(file_path)
+                        # Also caches volume and features since the analysis
+                        # already computed them
+                        store_analysis(part_number, analysis)
                     except Exception as e:
                         st.error(f"Failed to generate thumbnail: {e}")
                         pass
 
-                if thumb_key in st.session_state:
+                if is_analyzing(part_number):
+                    st.text("⏳")
+                elif thumb_key in st.session_state:
                     import base64
 
                     svg_data = st.session_state[thumb_key]
@@ -649,6 +997,202 @@ with tab2:
         # Close scrollable container (both inner and outer divs)
         st.markdown("</div></div>", unsafe_allow_html=True)
 
+        analyzed = [
+            f["name"]
+            for f in st.session_state.uploaded_files
+            if f"vol_{f['name']}" in st.session_state
+        ]
+        analyzed_configs = [st.session_state.part_configs.get(p, {}) for p in analyzed]
+        analyzed_features = [st.session_state.get(f"features_{p}") for p in analyzed]
+
+        with st.expander("Material Alternatives"):
+            if not analyzed:
+                st.info("Material alternatives appear once parts are analyzed.")
+            else:
+                matrix = material_matrix(
+                    analyzed, analyzed_configs, analyzed_features, materials_df
+                )
+                n_alternatives = st.number_input(
+                    "Alternatives per part",
+                    min_value=1,
+                    max_value=10,
+                    value=3,
+                    key="material_alternatives_n",
+                )
+                cheapest = costs.cheapest_materials(matrix, int(n_alternatives))
+
+                rows = []
+                for part_number, config in zip(analyzed, analyzed_configs):
+                    current = config.get("material")
+                    row = {
+                        "Part": os.path.splitext(part_number)[0].replace("_", "-"),
+                        "Current": (
+                            f"{current} · ${matrix.at[part_number, current]:.2f}"
+                            if current in matrix.columns
+                            else current
+                        ),
+                    }
+                    for rank, (name, cost) in enumerate(cheapest[part_number], start=1):
+                        row[f"#{rank}"] = f"{name} · ${cost:.2f}"
+                    rows.append(row)
+                st.caption("Material cost per part, cheapest alternatives first")
+                st.dataframe(
+                    pd.DataFrame(rows), hide_index=True, use_container_width=True
+                )
+
+                switch_cols = st.columns([3, 1])
+                target_material = switch_cols[0].selectbox(
+                    "Switch all parts to",
+                    options=sorted(matrix.columns),
+                    key="switch_all_material",
+                )
+                switch_cols[1].button(
+                    "Switch All",
+                    on_click=switch_all_materials,
+                    args=(target_material,),
+                    use_container_width=True,
+                )
+                quantities = np.array([c.get("quantity", 1) for c in analyzed_configs])
+                target_total = float(
+                    (matrix[target_material].to_numpy() * quantities).sum()
+                )
+                st.caption(
+                    f"Material cost of the whole quote in {target_material}: "
+                    f"${target_total:,.2f}"
+                )
+
+        with st.expander("Process Routes"):
+            if not analyzed:
+                st.info("Process routes appear once parts are analyzed.")
+            else:
+                cheapest_routes, fronts = process_routes(
+                    analyzed, analyzed_configs, analyzed_features
+                )
+
+                rows = []
+                cheaper = {}
+                for part_number, config, route in zip(
+                    analyzed, analyzed_configs, cheapest_routes.itertuples()
+                ):
+                    if pd.isna(route.total_cost_batch):
+                        continue
+                    best = {
+                        slot: value if isinstance(value, str) else None
+                        for slot, value in zip(
+                            costs.ROUTE_SLOTS,
+                            (route.cutting, route.shaping, route.finishing),
+                        )
+                    }
+                    if route.savings > 0.005:
+                        cheaper[part_number] = best
+                    rows.append(
+                        {
+                            "Part": os.path.splitext(part_number)[0].replace("_", "-"),
+                            "Current Route": route_label(config),
+                            "Current ($)": route.current_cost_batch,
+                            "Cheapest Route": route_label(
+                                costs.apply_route(config, best)
+                            ),
+                            "Cheapest ($)": route.total_cost_batch,
+                            "Savings ($)": route.savings,
+                        }
+                    )
+                st.caption(
+                    "Batch cost of each part's configured route and the cheapest "
+                    "route using other cutting, machining and finishing processes"
+                )
+                st.dataframe(
+                    pd.DataFrame(rows),
+                    hide_index=True,
+                    use_container_width=True,
+                    column_config={
+                        c: st.column_config.NumberColumn(format="$%.2f")
+                        for c in ("Current ($)", "Cheapest ($)", "Savings ($)")
+                    },
+                )
+                st.button(
+                    "Apply Cheapest Routes",
+                    on_click=apply_routes,
+                    args=(cheaper,),
+                    disabled=not cheaper,
+                    help=f"Switches {len(cheaper)} part(s) to a cheaper route",
+                )
+
+                st.markdown("**Cost vs. Shop Time**")
+                front_part = st.selectbox(
+                    "Part",
+                    options=analyzed,
+                    format_func=lambda p: os.path.splitext(p)[0].replace("_", "-"),
+                    key="route_front_part",
+                )
+                front_config = st.session_state.part_configs.get(front_part, {})
+                front = fronts[front_part]
+                st.caption(
+                    "Routes that no other route beats on both batch cost and shop time"
+                )
+                st.dataframe(
+                    pd.DataFrame(
+                        [
+                            {
+                                "Route": route_label(
+                                    costs.apply_route(front_config, route)
+                                ),
+                                "Batch Cost ($)": route["total_cost_batch"],
+                                "Shop Hours": route["shop_minutes"] / 60.0,
+                            }
+                            for route in front
+                        ]
+                    ),
+                    hide_index=True,
+                    use_container_width=True,
+                    column_config={
+                        "Batch Cost ($)": st.column_config.NumberColumn(format="$%.2f"),
+                        "Shop Hours": st.column_config.NumberColumn(format="%.1f"),
+                    },
+                )
+
+        with st.expander("3D Preview"):
+            preview_part = st.selectbox(
+                "Part",
+                options=[None] + [f["name"] for f in st.session_state.uploaded_files],
+                format_func=lambda p: (
+                    "Select a part"
+                    if p is None
+                    else os.path.splitext(p)[0].replace("_", "-")
+                ),
+                key="preview_part",
+            )
+            if preview_part:
+                try:
+                    import pyvista as pv  # type: ignore
+                    from stpyvista import stpyvista  # type: ignore
+                except ImportError:
+                    st.info("Install stpyvista to enable the 3D preview.")
+                else:
+                    preview_path = next(
+                        f["path"]
+                        for f in st.session_state.uploaded_files
+                        if f["name"] == preview_part
+                    )
+                    try:
+                        # Coarse mesh from the mesh store; tessellated on a miss only
+                        part_mesh = geometry.get_mesh(preview_path)
+                        faces = np.hstack(
+                            [
+                                np.full((len(part_mesh.faces), 1), 3, dtype=np.int64),
+                                part_mesh.faces,
+                            ]
+                        ).ravel()
+                        plotter = pv.Plotter(window_size=[500, 400])
+                        plotter.add_mesh(
+                            pv.PolyData(np.asarray(part_mesh.vertices), faces),
+                            color="#EA7600",
+                        )
+                        plotter.view_isometric()
+                        stpyvista(plotter, key=f"preview_{preview_part}")
+                    except Exception as e:
+                        st.error(f"Failed to render preview: {e}")
+
 with tab3:
     st.header("Costing")
 
@@ -664,35 +1208,59 @@ with tab3:
 
         grand_total = 0.0
 
-        # Process each part
+        # Get geometry info for every part first so the quote is priced in one pass
+        volumes = {}
         for file_info in st.session_state.uploaded_files:
             part_number = file_info["name"]
-            display_name = os.path.splitext(part_number)[0].replace("_", "-")
             file_path = file_info["path"]
 
-            # Get configuration for this part
-            config = st.session_state.part_configs.get(part_number, {})
-            quantity = config.get("quantity", 1)
-            material_name = config.get("material")
-
             # Get geometry info from session state or analyzer
             vol_key = f"vol_{part_number}"
+            geom_err = st.session_state.get(f"geom_err_{part_number}")
             if vol_key in st.session_state:
                 volume_in3 = st.session_state[vol_key]
+            elif geom_err:
+                volume_in3 = 0.0
+                st.error(f"Error analyzing {part_number}: {geom_err}")
+            elif is_analyzing(part_number):
+                volume_in3 = 0.0
+                st.info(
+                    f"{part_number} is still being analyzed; material cost is pending."
+                )
             else:
                 try:
-                    analyzer = geometry.GeometryAnalyzer(file_path)
-                    volume_in3 = analyzer.get_volume()
-                    st.session_state[vol_key] = volume_in3
+                    analysis = geometry.analyze_file(file_path)
+                    store_analysis(part_number, analysis)
+                    volume_in3 = analysis["volume_in3"]
                 except Exception as e:
                     volume_in3 = 0.0
                     st.error(f"Error analyzing {part_number}: {e}")
+            volumes[part_number] = volume_in3
+
+        # Calculate detailed costs for the whole quote
+        cost_results = price_parts(st.session_state.uploaded_files, volumes)
 
-            # Get manual overrides
-            overrides = st.session_state.cost_overrides.get(part_number, {})
+        simulate = st.toggle(
+            "Simulate cost uncertainty",
+            key="simulate_costs",
+            help="Samples material prices, process rates and times around "
+            "their sheet values and shows the P10/P50/P90 batch cost",
+        )
+        if simulate:
+            cost_ranges, quote_range = simulate_costs(
+                st.session_state.uploaded_files, volumes
+            )
+
+        # Process each part
+        for file_info in st.session_state.uploaded_files:
+            part_number = file_info["name"]
+            display_name = os.path.splitext(part_number)[0].replace("_", "-")
+
+            # Get configuration for this part
+            config = st.session_state.part_configs.get(part_number, {})
+            quantity = config.get("quantity", 1)
 
-            # Calculate detailed costs
-            cost_result = costs.calculate_part_breakdown(config, volume_in3, overrides)
+            cost_result = cost_results[part_number]
 
             weight_lbs = cost_result["weight_lbs"]
             per_part_cost = cost_result["per_part_cost"]
@@ -710,6 +1278,7 @@ with tab3:
                 LB_TO_KG_PRICE = 2.20462
 
                 weight_display = weight_lbs * LBS_TO_KG
+                buy_weight_display = cost_result["buy_weight_lbs"] * LBS_TO_KG
                 weight_unit = "kg"
 
                 for item in raw_details:
@@ -720,6 +1289,7 @@ with tab3:
                     cost_details.append(new_item)
             else:
                 weight_display = weight_lbs
+                buy_weight_display = cost_result["buy_weight_lbs"]
                 weight_unit = "lbs"
                 cost_details = raw_details
 
@@ -767,6 +1337,22 @@ with tab3:
                     )
                     metric_cols[2].metric("Per Part Cost", f"${per_part_cost:.2f}")
                     metric_cols[3].metric("Total Cost", f"${total_cost:.2f}")
+                    if cost_result.get("stock"):
+                        utilization = cost_result["utilization"]
+                        st.caption(
+                            f"Stock: {cost_result['stock']} · buy weight "
+                            f"{buy_weight_display:.2f} {weight_unit}"
+                            + (
+                                f" · {utilization:.0%} utilization"
+                                if utilization is not None
+                                else ""
+                            )
+                        )
+                    if simulate:
+                        st.caption(
+                            "Batch cost range: "
+                            + format_cost_range(cost_ranges.loc[part_number].to_dict())
+                        )
 
                 # Details Expander
                 with st.expander("Cost Breakdown"):
@@ -827,8 +1413,115 @@ with tab3:
                             st.rerun()
                     else:
                         st.info("No costs associated.")
+        # Stock purchased for the whole quote, parts sharing sheets and bars
+        stock_groups = st.session_state.quote_memo.stock_groups
+        if stock_groups:
+            with st.expander("Material Utilization"):
+                is_metric = st.session_state.get("units_selection") == "Metric"
+                weight_factor = 0.453592 if is_metric else 1.0
+                weight_label = "Buy Weight (kg)" if is_metric else "Buy Weight (lbs)"
+                rows = []
+                for group in stock_groups:
+                    material_info = costs.get_material_rate(group["material"])
+                    density = material_info[0] if material_info else 0.0
+                    rows.append(
+                        {
+                            "Material": group["material"],
+                            "Stock": group["stock"],
+                            "Pieces": group["stock_count"],
+                            weight_label: group["buy_volume_in3"]
+                            * density
+                            * weight_factor,
+                            "Utilization": (group["utilization"] or 0.0) * 100,
+                            "Parts": ", ".join(
+                                os.path.splitext(p)[0] for p in group["parts"]
+                            ),
+                        }
+                    )
+                st.dataframe(
+                    pd.DataFrame(rows),
+                    hide_index=True,
+                    use_container_width=True,
+                    column_config={
+                        weight_label: st.column_config.NumberColumn(format="%.2f"),
+                        "Utilization": st.column_config.NumberColumn(
+                            "Utilization", format="%.0f%%"
+                        ),
+                    },
+                )
+
+        # Parts re-priced because material or process rates were updated
+        rate_report = st.session_state.quote_memo.rate_report
+        if rate_report is not None:
+            quote_delta = rate_report["quote_after"] - rate_report["quote_before"]
+            st.info(
+                f"Rates updated: {len(rate_report['parts'])} part(s) affected, "
+                f"quote total {'+' if quote_delta >= 0 else '-'}${abs(quote_delta):,.2f}"
+            )
+            with st.expander("Rate Changes"):
+                if rate_report["changes"] is None:
+                    st.caption(
+                        "Rate history was incomplete, so every part was re-priced."
+                    )
+                else:
+                    st.dataframe(
+                        rate_report["changes"],
+                        hide_index=True,
+                        use_container_width=True,
+                        column_config={
+                            "Change (%)": st.column_config.NumberColumn(
+                                format="%.1f%%"
+                            ),
+                        },
+                    )
+                st.dataframe(
+                    rate_report["parts"],
+                    use_container_width=True,
+                    column_config={
+                        "Before ($)": st.column_config.NumberColumn(format="$%.2f"),
+                        "After ($)": st.column_config.NumberColumn(format="$%.2f"),
+                        "Change ($)": st.column_config.NumberColumn(format="$%.2f"),
+                        "Change (%)": st.column_config.NumberColumn(format="%.1f%%"),
+                    },
+                )
+                st.markdown(
+                    f"Quote total: ${rate_report['quote_before']:,.2f} → "
+                    f"**${rate_report['quote_after']:,.2f}**"
+                )
+                st.button("Dismiss", key="dismiss_rates", on_click=dismiss_rate_report)
+
+        with st.expander("Price Breaks"):
+            st.text_input(
+                "Quantities",
+                value=", ".join(str(q) for q in st.session_state.price_breaks),
+                key="price_break_text",
+                on_change=update_price_breaks,
+                help="Comma-separated batch quantities to price every part at",
+            )
+            if st.session_state.get("price_break_error"):
+                st.error("Enter whole quantities greater than zero, e.g. 1, 10, 50.")
+            # Copied: the curves are shared with the Export tab
+            per_part_curve = price_break_curves(
+                st.session_state.uploaded_files, volumes
+            ).copy()
+            per_part_curve.index = [
+                os.path.splitext(p)[0].replace("_", "-") for p in per_part_curve.index
+            ]
+            per_part_curve.columns = [f"@ {q}" for q in per_part_curve.columns]
+            st.caption("Per part cost at each batch quantity")
+            st.dataframe(
+                per_part_curve,
+                use_container_width=True,
+                column_config={
+                    col: st.column_config.NumberColumn(format="$%.2f")
+                    for col in per_part_curve.columns
+                },
+            )
+
         # Grand total
         st.markdown(f"### Grand Total: **${grand_total:.2f}**")
+        if simulate:
+            st.caption("Quote cost range: " + format_cost_range(quote_range))
 
 with tab4:
     st.header("Export")
@@ -844,6 +1537,7 @@ with tab4:
 
         # Prepare data for export
         export_data = []
+        volumes = {}
 
         # We need to re-calculate costs (or cache them?)
         # For safety and latest state, we re-calculate using the shared function
@@ -857,40 +1551,68 @@ with tab4:
             # 2. Volume (Reuse session state if available, else re-analyze - though Tab 3 logic likely populated it)
             vol_key = f"vol_{part_number}"
             volume_in3 = st.session_state.get(vol_key, 0.0)
-            if volume_in3 == 0.0:
+            if volume_in3 == 0.0 and not is_analyzing(part_number):
                 try:
-                    analyzer = geometry.GeometryAnalyzer(file_path)
-                    volume_in3 = analyzer.get_volume()
+                    analysis = geometry.analyze_file(file_path)
+                    store_analysis(part_number, analysis)
+                    volume_in3 = analysis["volume_in3"]
                 except:  # noqa: E722
                     pass
+            volumes[part_number] = volume_in3
 
-            # 3. Overrides
-            overrides = st.session_state.cost_overrides.get(part_number, {})
-
-            # 4. Thumbnail SVG (for PDF)
+            # 3. Thumbnail SVG (for PDF)
             thumb_key = f"thumb_v2_{part_number}"
             thumbnail_svg = st.session_state.get(thumb_key)
 
-            # Calculate
-            result = costs.calculate_part_breakdown(config, volume_in3, overrides)
-
             export_data.append(
                 {
                     "name": part_number,
                     "config": config,
-                    "result": result,
                     "thumbnail_svg": thumbnail_svg,
                 }
             )
 
+        # 4. Calculate (overrides are applied per part)
+        results = price_parts(st.session_state.uploaded_files, volumes)
+        per_part_curve = price_break_curves(st.session_state.uploaded_files, volumes)
+        cost_range_labels = []
+        if st.session_state.get("simulate_costs"):
+            cost_ranges, _ = simulate_costs(st.session_state.uploaded_files, volumes)
+            cost_range_labels = list(cost_ranges.columns)
+        for item in export_data:
+            item["result"] = results[item["name"]]
+            item["price_breaks"] = per_part_curve.loc[item["name"]].to_dict()
+            if cost_range_labels:
+                item["cost_range"] = cost_ranges.loc[item["name"]].to_dict()
+
         # Generate Export
         if export_data:
             if export_type == "CSV":
                 units = st.session_state.get("units_selection", "Imperial")
-                csv_data = export.generate_batch_export(export_data, units=units)
+                # Only emit cost columns for processes this quote actually uses
+                used_processes = {
+                    entry["Process"]
+                    for item in export_data
+                    for entry in item["result"]["breakdown"]
+                    if not entry["Process"].startswith("Material:")
+                }
+                # Spools to disk for large quotes instead of building one big string
+                csv_file = tempfile.SpooledTemporaryFile(
+                    max_size=8 * 1024 * 1024, mode="w+b"
+                )
+                csv_text = io.TextIOWrapper(csv_file, encoding="utf-8", newline="")
+                export.write_batch_export(
+                    export_data,
+                    csv_text,
+                    process_names=used_processes,
+                    units=units,
+                    price_breaks=st.session_state.price_breaks,
+                    cost_range=cost_range_labels,
+                )
+                csv_text.seek(0)
                 st.download_button(
                     label="Download Batch CSV",
-                    data=csv_data,
+                    data=csv_text,
                     file_name="quoteforge_batch_export.csv",
                     mime="text/csv",
                 )
@@ -898,20 +1620,92 @@ with tab4:
                 # PDF Export
                 if st.button("Generate PDF Report"):
                     with st.spinner("Generating PDF..."):
-                        try:
-                            units = st.session_state.get("units_selection", "Imperial")
-                            pdf_data = export.generate_pdf_export(
-                                export_data, units=units
+                        progress_bar = st.progress(0.0)
+
+                        def on_pdf_progress(stage, done, total):
+                            # Thumbnails fill the first half of the bar, layout the second
+                            fraction = done / total if total else 1.0
+                            offset = 0.0 if stage == "thumbnails" else 0.5
+                            progress_bar.progress(
+                                min(1.0, offset + fraction / 2),
+                                text=f"{stage.capitalize()} ({done}/{total})",
                             )
-                            st.session_state["pdf_generated_data"] = pdf_data
+
+                        discard_generated_pdf()
+                        # Written to disk so the report never sits in session state
+                        with tempfile.NamedTemporaryFile(
+                            delete=False, suffix=".pdf"
+                        ) as tmp:
+                            pdf_path = tmp.name
+                            try:
+                                units = st.session_state.get(
+                                    "units_selection", "Imperial"
+                                )
+                                export.generate_pdf_export(
+                                    export_data,
+                                    units=units,
+                                    output=tmp,
+                                    progress=on_pdf_progress,
+                                )
+                            except Exception as e:
+                                pdf_path = None
+                                st.error(f"Failed to generate PDF: {e}")
+                        if pdf_path:
+                            st.session_state["pdf_generated_path"] = pdf_path
                             st.success("PDF Generated!")
-                        except Exception as e:
-                            st.error(f"Failed to generate PDF: {e}")
+                        else:
+                            os.remove(tmp.name)
+
+                pdf_path = st.session_state.get("pdf_generated_path")
+                if pdf_path and os.path.exists(pdf_path):
+
+                    def open_generated_pdf():
+                        # Read from disk only when the download is requested
+                        return open(pdf_path, "rb")
 
-                if "pdf_generated_data" in st.session_state:
                     st.download_button(
                         label="Download PDF Report",
-                        data=st.session_state["pdf_generated_data"],
+                        data=open_generated_pdf,
                         file_name="quoteforge_report.pdf",
                         mime="application/pdf",
                     )
+
+if show_performance:
+    with performance_panel:
+        summary = st.session_state.metrics_registry.summary()
+        if summary["spans"]:
+            st.dataframe(
+                pd.DataFrame(
+                    [
+                        {
+                            "Stage": name,
+                            "Count": stats["count"],
+                            "P50 (ms)": stats["p50_s"] * 1000,
+                            "P90 (ms)": stats["p90_s"] * 1000,
+                            "P99 (ms)": stats["p99_s"] * 1000,
+                        }
+                        for name, stats in summary["spans"].items()
+                    ]
+                ),
+                hide_index=True,
+                column_config={
+                    col: st.column_config.NumberColumn(format="%.1f")
+                    for col in ("P50 (ms)", "P90 (ms)", "P99 (ms)")
+                },
+            )
+        else:
+            st.caption("No timings recorded yet.")
+
+        for name, value in summary["counters"].items():
+            st.caption(f"{name}: {value:g}")
+
+        st.download_button(
+            label="Download Metrics (Prometheus)",
+            data=st.session_state.metrics_registry.to_prometheus(),
+            file_name="quoteforge_metrics.prom",
+            mime="text/plain",
+        )
+
+# Preload the deferred modules now that the page has rendered
+if data_loader.load_config().get("startup", {}).get("warm_up_imports", True):
+    warm_up(data_loader, costs, pd, export, geometry)
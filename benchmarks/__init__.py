@@ -0,0 +1 @@
+"""Benchmarks for QuoteForge; run with ``python -m benchmarks.run``."""
@@ -0,0 +1,185 @@
+"""
+Synthetic inputs for the QuoteForge benchmarks.
+Generates parametric STEP parts of increasing face count, fixed rate tables
+and batches of part configs so every run measures the same workload.
+"""
+
+import os
+import random
+
+import pandas as pd
+
+import costs
+import data_loader
+
+# Holes per side of the perforated plate; each hole adds cylindrical faces
+HOLE_GRID_SIZES = (0, 4, 8, 16)
+
+BENCH_MATERIALS = pd.DataFrame(
+    {
+        "name": ["Steel ASTM A36", "Aluminum 6061", "Stainless 304", "Brass C360"],
+        "density (lb/in^3)": [0.284, 0.0975, 0.289, 0.307],
+        "cost_per_lb": [0.85, 3.10, 4.25, 5.60],
+        "priority": [True, True, False, False],
+    }
+)
+
+BENCH_PROCESSES = pd.DataFrame(
+    {
+        "name": [
+            "Laser Cutting",
+            "Waterjet Cutting",
+            "Machining",
+            "Turning",
+            "3D Printing",
+            "Forming",
+            "Threading",
+            "Welding",
+            "Powder Coat",
+            "Anodize",
+        ],
+        "category": [
+            "Cutting",
+            "Cutting",
+            "Machining",
+            "Machining",
+            "Additive",
+            "Forming",
+            "Machining",
+            "Fabrication",
+            "Finishing",
+            "Finishing",
+        ],
+        "setup_time_mins": [15, 20, 45, 30, 10, 20, 10, 30, 20, 30],
+        "hourly_rate": [150, 120, 95, 90, 40, 85, 80, 75, 60, 65],
+        "run_time_mins": [5, 12, 60, 45, 120, 10, 5, 30, 15, 20],
+    }
+)
+
+
+def install_rate_fixtures():
+    """Seeds the data loader with the fixed rate tables (no network)"""
+    data_loader.seed_cache("materials", BENCH_MATERIALS.copy())
+    data_loader.seed_cache("processes", BENCH_PROCESSES.copy())
+
+
+def corpus_dir():
+    return data_loader.get_cache_dir("bench", "corpus")
+
+
+def make_plate(holes_per_side):
+    """Builds a 100 x 60 x 10 mm plate with a grid of through holes"""
+    import cadquery as cq  # type: ignore
+
+    plate = cq.Workplane("XY").box(100, 60, 10)
+    if holes_per_side:
+        pitch_x = 90.0 / holes_per_side
+        pitch_y = 50.0 / holes_per_side
+        diameter = min(pitch_x, pitch_y) * 0.5
+        plate = (
+            plate.faces(">Z")
+            .workplane()
+            .rarray(pitch_x, pitch_y, holes_per_side, holes_per_side)
+            .hole(diameter)
+        )
+    return plate
+
+
+def build_step_corpus(grid_sizes=HOLE_GRID_SIZES):
+    """
+    Writes one STEP file per grid size, reusing files from earlier runs.
+
+    Returns:
+        List of (path, face_count) in grid size order
+    """
+    import cadquery as cq  # type: ignore
+
+    corpus = []
+    for n in grid_sizes:
+        plate = make_plate(n)
+        path = os.path.join(corpus_dir(), f"plate_{n}x{n}.step")
+        if not os.path.exists(path):
+            cq.exporters.export(plate, path)
+        corpus.append((path, plate.faces().size()))
+    return corpus
+
+
+def make_part_batch(n_parts, seed=0):
+    """
+    Returns (names, configs, volumes_in3) for n_parts randomized parts.
+    The same seed always yields the same batch.
+    """
+    rng = random.Random(seed)
+    materials = BENCH_MATERIALS["name"].tolist()
+    cutting = [None, "Laser Cutting", "Waterjet Cutting"]
+    finishing = [None, "Powder Coat", "Anodize"]
+
+    names, configs, volumes = [], [], []
+    for i in range(n_parts):
+        config = costs.default_part_config()
+        config["quantity"] = rng.choice([1, 5, 10, 25, 100])
+        config["material"] = rng.choice(materials)
+        config["cutting"] = rng.choice(cutting)
+        config["finishing"] = rng.choice(finishing)
+        for flag in costs.PROCESS_FLAGS:
+            config[flag] = rng.random() < 0.3
+        names.append(f"PRT-{i:06d}.step")
+        configs.append(config)
+        volumes.append(rng.uniform(0.5, 200.0))
+    return names, configs, volumes
+
+
+def make_material_catalog(n_materials, seed=0):
+    """
+    Returns a materials DataFrame with n_materials randomized rows in the
+    catalog's columns. The same seed always yields the same catalog.
+    """
+    rng = random.Random(seed)
+    return pd.DataFrame(
+        {
+            "name": [f"Material {i:03d}" for i in range(n_materials)],
+            "density (lb/in^3)": [rng.uniform(0.05, 0.33) for _ in range(n_materials)],
+            "cost_per_lb": [rng.uniform(0.5, 30.0) for _ in range(n_materials)],
+            "priority": [rng.random() < 0.2 for _ in range(n_materials)],
+        }
+    )
+
+
+def make_part_features(volumes_in3, seed=0):
+    """
+    Returns geometry features (as features.extract_features) for a batch of
+    parts with the given volumes: a mix of flat plates and long round bar
+    parts. The same seed always yields the same features.
+    """
+    rng = random.Random(seed)
+    part_features = []
+    for volume in volumes_in3:
+        if rng.random() < 0.7:
+            thickness = rng.choice([0.125, 0.25, 0.5])
+            width = rng.uniform(2.0, 30.0)
+            turned_area_fraction = 0.0
+        else:
+            thickness = rng.choice([0.5, 1.0, 2.0])
+            width = thickness
+            turned_area_fraction = 0.9
+        # Parts fill 60-95% of their envelope
+        length = volume / (width * thickness * rng.uniform(0.6, 0.95))
+        stock_volume = length * width * thickness
+        part_features.append(
+            {
+                "hole_count": rng.randint(0, 12),
+                "hole_diameters_in": [],
+                "cut_length_in": 2 * (length + width),
+                "pierce_count": 1,
+                "bend_count": rng.randint(0, 4),
+                "stock_envelope_in": sorted([length, width, thickness], reverse=True),
+                "stock_volume_in3": stock_volume,
+                "volume_in3": volume,
+                "removed_volume_in3": stock_volume - volume,
+                "removed_fraction": 1 - volume / stock_volume,
+                "surface_area_in2": 2 * length * width,
+                "face_count": 6,
+                "turned_area_fraction": turned_area_fraction,
+            }
+        )
+    return part_features
@@ -0,0 +1,394 @@
+"""
+Benchmark runner for QuoteForge.
+
+Measures STEP import, mass properties, feature recognition and thumbnails
+over a synthetic corpus of increasing face count, costing, stock nesting,
+material alternatives, process routes, cost simulation, rate-change
+repricing, CSV export and PDF export for batches of 10/100/1000 parts, and the
+app's cold start in a fresh interpreter. Results are written as JSON and can
+be compared with an earlier run to catch regressions:
+
+    python -m benchmarks.run
+    python -m benchmarks.run --compare benchmarks/results/baseline.json
+
+Run from the repository root. Rates come from fixed tables, never the network.
+"""
+
+import argparse
+import datetime
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+import costs
+import data_loader
+import features
+import geometry
+import nesting
+from utils import export
+
+from benchmarks import corpus
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+
+BATCH_SIZES = (10, 100, 1000)
+# Laying out a page per part dominates the PDF, so keep its batches smaller
+PDF_BATCH_SIZES = (10, 100)
+PRICE_BREAKS = (
+    1,
+    2,
+    5,
+    10,
+    20,
+    25,
+    50,
+    75,
+    100,
+    150,
+    200,
+    250,
+    300,
+    400,
+    500,
+    750,
+    1000,
+    2000,
+    5000,
+    10000,
+)
+# Catalog size for the material alternatives matrix
+MATRIX_MATERIALS = 200
+
+
+def measure(func, repeat, setup=None):
+    """
+    Times func over repeat runs; setup (untimed) runs before each one.
+
+    Returns:
+        Dict with min_s, median_s, mean_s, stdev_s and repeat
+    """
+    timings = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return _stats(timings)
+
+
+def _stats(timings):
+    return {
+        "min_s": min(timings),
+        "median_s": statistics.median(timings),
+        "mean_s": statistics.fmean(timings),
+        "stdev_s": statistics.stdev(timings) if len(timings) > 1 else 0.0,
+        "repeat": len(timings),
+    }
+
+
+def bench_geometry(results, repeat, grid_sizes):
+    for path, faces in corpus.build_step_corpus(grid_sizes):
+        params = f"faces={faces}"
+        results[f"geometry.import[{params}]"] = measure(
+            lambda: geometry.GeometryAnalyzer(path), repeat
+        )
+
+        analyzer = geometry.GeometryAnalyzer(path)
+
+        def reset_metrics():
+            analyzer._metrics = None
+
+        results[f"geometry.mass_properties[{params}]"] = measure(
+            analyzer.metrics, repeat, setup=reset_metrics
+        )
+        results[f"geometry.features[{params}]"] = measure(
+            lambda: features.extract_features(analyzer), repeat
+        )
+        results[f"geometry.thumbnail[{params}]"] = measure(
+            analyzer.get_thumbnail_svg, repeat, setup=geometry._thumbnail_cache.clear
+        )
+
+
+def _export_items(n_parts, thumbnail_svg=None):
+    names, configs, volumes = corpus.make_part_batch(n_parts)
+    results = costs.quote_results(*costs.calculate_quote(names, configs, volumes))
+    return [
+        {
+            "name": name,
+            "config": config,
+            "result": results[name],
+            "thumbnail_svg": thumbnail_svg,
+        }
+        for name, config in zip(names, configs)
+    ]
+
+
+def bench_costing(results, repeat, batch_sizes):
+    for n_parts in batch_sizes:
+        names, configs, volumes = corpus.make_part_batch(n_parts)
+        params = f"parts={n_parts}"
+
+        results[f"costs.quote[{params}]"] = measure(
+            lambda: costs.quote_results(
+                *costs.calculate_quote(names, configs, volumes)
+            ),
+            repeat,
+        )
+        results[f"costs.part_breakdown_loop[{params}]"] = measure(
+            lambda: [
+                costs.calculate_part_breakdown(c, v) for c, v in zip(configs, volumes)
+            ],
+            repeat,
+        )
+
+        part_features = corpus.make_part_features(volumes)
+        results[f"nesting.plan[{params}]"] = measure(
+            lambda: nesting.plan_stock(names, configs, part_features), repeat
+        )
+
+        breaks_params = f"{params},breaks={len(PRICE_BREAKS)}"
+        results[f"costs.price_breaks[{breaks_params}]"] = measure(
+            lambda: costs.calculate_price_breaks(
+                names, configs, volumes, PRICE_BREAKS, features=part_features
+            ),
+            repeat,
+        )
+
+        part_stock, _ = nesting.plan_stock(names, configs, part_features)
+        catalog = corpus.make_material_catalog(MATRIX_MATERIALS)
+        matrix_params = f"{params},materials={MATRIX_MATERIALS}"
+        results[f"costs.material_matrix[{matrix_params}]"] = measure(
+            lambda: costs.cheapest_materials(
+                costs.material_cost_matrix(names, volumes, part_stock, catalog)
+            ),
+            repeat,
+        )
+
+        simulate_params = f"{params},samples={costs.SIMULATION_SAMPLES}"
+        results[f"costs.simulate[{simulate_params}]"] = measure(
+            lambda: costs.simulate_quote(
+                names, configs, volumes, features=part_features, stock=part_stock
+            ),
+            repeat,
+        )
+
+        def optimize_routes():
+            options = costs.calculate_route_options(
+                names, configs, volumes, features=part_features
+            )
+            costs.cheapest_routes(options)
+            costs.pareto_routes(options)
+
+        results[f"costs.routes[{params}]"] = measure(optimize_routes, repeat)
+
+        # One edited part out of a warm memo
+        memo = costs.IncrementalQuote()
+        memo.price(names, configs, volumes)
+
+        def touch_one():
+            configs[0]["quantity"] += 1
+
+        results[f"costs.incremental_one_dirty[{params}]"] = measure(
+            lambda: memo.price(names, configs, volumes), repeat, setup=touch_one
+        )
+
+        # One material's price updated under a warm memo
+        materials = data_loader.get_materials()
+
+        def reprice_one_material():
+            updated = materials.copy()
+            updated.loc[0, "cost_per_lb"] *= 1.01
+            data_loader.seed_cache("materials", updated)
+
+        results[f"costs.incremental_rate_change[{params}]"] = measure(
+            lambda: memo.price(names, configs, volumes),
+            repeat,
+            setup=reprice_one_material,
+        )
+        data_loader.seed_cache("materials", materials)
+
+
+def bench_export(results, repeat, batch_sizes, pdf_batch_sizes):
+    for n_parts in batch_sizes:
+        items = _export_items(n_parts)
+        results[f"export.batch_csv[parts={n_parts}]"] = measure(
+            lambda: export.write_batch_export(items, io.StringIO()), repeat
+        )
+
+    # Thumbnails from the smallest corpus part, converted fresh on every run
+    path, _ = corpus.build_step_corpus(corpus.HOLE_GRID_SIZES[1:2])[0]
+    svg = geometry.GeometryAnalyzer(path).get_thumbnail_svg()
+    for n_parts in pdf_batch_sizes:
+        items = _export_items(n_parts, thumbnail_svg=svg)
+        results[f"export.pdf[parts={n_parts}]"] = measure(
+            lambda: export.generate_pdf_export(items, output=io.BytesIO(), workers=1),
+            repeat,
+            setup=export._drawing_cache.clear,
+        )
+
+
+# Each snippet runs in a fresh interpreter and prints "elapsed <seconds>"
+STARTUP_SNIPPETS = {
+    # First full script run of the app with no parts, as a new session sees it
+    "startup.first_run": (
+        "import time; t = time.perf_counter()\n"
+        "from streamlit.testing.v1 import AppTest\n"
+        "at = AppTest.from_file('app.py', default_timeout=300)\n"
+        "at.run()\n"
+        "assert not at.exception, at.exception\n"
+        "print('elapsed', time.perf_counter() - t)\n"
+        "from utils import lazy\n"
+        "if lazy._warm_up_thread: lazy._warm_up_thread.join()"
+    ),
+    # What every session paid before imports were deferred
+    "startup.eager_imports": (
+        "import time; t = time.perf_counter()\n"
+        "import geometry, costs, data_loader\n"
+        "from utils import export\n"
+        "print('elapsed', time.perf_counter() - t)"
+    ),
+}
+
+
+def _time_snippet(code):
+    completed = subprocess.run(
+        [sys.executable, "-c", code],
+        capture_output=True,
+        text=True,
+        cwd=REPO_DIR,
+        check=True,
+    )
+    for line in completed.stdout.splitlines():
+        if line.startswith("elapsed "):
+            return float(line.split()[1])
+    raise RuntimeError(f"startup snippet printed no timing:\n{completed.stdout}")
+
+
+def bench_startup(results, repeat):
+    for name, code in STARTUP_SNIPPETS.items():
+        results[name] = _stats([_time_snippet(code) for _ in range(repeat)])
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            cwd=REPO_DIR,
+        ).stdout.strip()
+    except OSError:
+        return None
+
+
+def compare(results, baseline, threshold):
+    """
+    Prints the ratio against a baseline for every shared benchmark.
+
+    Returns:
+        Names whose median grew by more than threshold (e.g. 1.2 = 20%)
+    """
+    regressions = []
+    for name, stats in results.items():
+        base = baseline.get(name)
+        if not base or not base["median_s"]:
+            continue
+        ratio = stats["median_s"] / base["median_s"]
+        flag = ""
+        if ratio > threshold:
+            regressions.append(name)
+            flag = "  REGRESSION"
+        print(
+            f"{name:55s} {base['median_s'] * 1000:10.2f} ms -> "
+            f"{stats['median_s'] * 1000:10.2f} ms  x{ratio:.2f}{flag}"
+        )
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="benchmarks.run", description="Run the QuoteForge benchmarks."
+    )
+    parser.add_argument(
+        "--only",
+        choices=["startup", "geometry", "costing", "export"],
+        action="append",
+        help="Run only these groups (repeatable)",
+    )
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument(
+        "--quick",
+        action="store_true",
+        help="Smaller corpus and batches with fewer repeats, for smoke runs",
+    )
+    parser.add_argument("--output", help="Result JSON path (defaults to results/)")
+    parser.add_argument("--compare", help="Earlier result JSON to compare against")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=1.2,
+        help="Median ratio above which --compare reports a regression",
+    )
+    args = parser.parse_args(argv)
+
+    groups = args.only or ["startup", "geometry", "costing", "export"]
+    repeat = 2 if args.quick else args.repeat
+    grid_sizes = corpus.HOLE_GRID_SIZES[:2] if args.quick else corpus.HOLE_GRID_SIZES
+    batch_sizes = BATCH_SIZES[:2] if args.quick else BATCH_SIZES
+    pdf_batch_sizes = PDF_BATCH_SIZES[:1] if args.quick else PDF_BATCH_SIZES
+
+    corpus.install_rate_fixtures()
+
+    results = {}
+    if "startup" in groups:
+        bench_startup(results, repeat)
+    if "geometry" in groups:
+        bench_geometry(results, repeat, grid_sizes)
+    if "costing" in groups:
+        bench_costing(results, repeat, batch_sizes)
+    if "export" in groups:
+        bench_export(results, repeat, batch_sizes, pdf_batch_sizes)
+
+    report = {
+        "meta": {
+            "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "quick": args.quick,
+        },
+        "results": results,
+    }
+
+    output = args.output
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        stamp = datetime.datetime.now().strftime("%Y%m%d-%H%M%S")
+        output = os.path.join(RESULTS_DIR, f"{stamp}.json")
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote {output}", file=sys.stderr)
+
+    if args.compare:
+        with open(args.compare, "r") as f:
+            baseline = json.load(f)["results"]
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"{len(regressions)} benchmark(s) regressed", file=sys.stderr)
+            return 1
+    else:
+        for name, stats in results.items():
+            print(f"{name:55s} {stats['median_s'] * 1000:10.2f} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,340 @@
+"""
+Headless batch quoting for QuoteForge.
+
+Quotes a directory or manifest of STEP files without Streamlit:
+
+    python cli.py samples/ --configs parts.json --csv quote.csv --pdf quote.pdf
+
+Geometry is analyzed in parallel worker processes and every analyzed file is
+appended to a journal next to the output, so an interrupted run resumes where
+it stopped. Analysis results are also kept in the on-disk geometry cache.
+"""
+
+import argparse
+import csv
+import glob
+import json
+import os
+import sys
+
+import costs
+import geometry
+import nesting
+from utils import export
+
+STEP_EXTENSIONS = (".step", ".stp")
+
+CONFIG_TEXT_FIELDS = ("material", "cutting", "finishing")
+
+
+def find_step_files(source):
+    """
+    Returns STEP file paths from a directory (searched recursively) or a
+    manifest file (.txt with one path per line, .json list, or .csv with a
+    "path" column). Relative manifest paths resolve against the manifest.
+    """
+    if os.path.isdir(source):
+        paths = []
+        for ext in STEP_EXTENSIONS:
+            paths += glob.glob(os.path.join(source, "**", f"*{ext}"), recursive=True)
+        return sorted(set(paths))
+
+    base_dir = os.path.dirname(os.path.abspath(source))
+    ext = os.path.splitext(source)[1].lower()
+    if ext in STEP_EXTENSIONS:
+        return [source]
+
+    with open(source, "r") as f:
+        if ext == ".json":
+            entries = json.load(f)
+        elif ext == ".csv":
+            entries = [row["path"] for row in csv.DictReader(f)]
+        else:
+            entries = [line.strip() for line in f]
+
+    return [
+        p if os.path.isabs(p) else os.path.join(base_dir, p)
+        for p in entries
+        if p and not p.startswith("#")
+    ]
+
+
+def _parse_bool(value):
+    return str(value).strip().lower() in ("1", "true", "yes", "y", "x")
+
+
+def _parse_config_row(row):
+    """Converts a CSV row of strings into a part config dict"""
+    config = {}
+    for key, value in row.items():
+        if key is None or key == "name" or value is None or value == "":
+            continue
+        if key == "quantity":
+            config[key] = int(float(value))
+        elif key in costs.PROCESS_FLAGS:
+            config[key] = _parse_bool(value)
+        elif key in CONFIG_TEXT_FIELDS:
+            config[key] = None if value == "None" else value
+    return config
+
+
+def load_part_configs(path):
+    """
+    Loads part configs from JSON ({part name: config}) or CSV (one row per
+    part with a "name" column). The name "*" holds defaults for every part.
+    """
+    if path is None:
+        return {}
+
+    with open(path, "r") as f:
+        if path.lower().endswith(".csv"):
+            return {row["name"]: _parse_config_row(row) for row in csv.DictReader(f)}
+        return json.load(f)
+
+
+def resolve_config(part_configs, part_name):
+    """Builds the effective config for a part: app defaults, "*", then per part"""
+    config = costs.default_part_config()
+    config.update(part_configs.get("*", {}))
+    display_name = os.path.splitext(part_name)[0]
+    config.update(part_configs.get(display_name, {}))
+    config.update(part_configs.get(part_name, {}))
+    return config
+
+
+def _load_journal(journal_path):
+    done = {}
+    if not os.path.exists(journal_path):
+        return done
+    with open(journal_path, "r") as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                # A run killed mid-write leaves a truncated last line
+                continue
+            done[entry["path"]] = entry
+    return done
+
+
+def _file_stat(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return [stat.st_size, stat.st_mtime]
+
+
+def _is_resumable(entry, path):
+    """A journaled file is reused only if it succeeded and is unchanged on disk"""
+    if entry is None or "error" in entry:
+        return False
+    return entry.get("stat") == _file_stat(path)
+
+
+def _progress(done, total, message):
+    print(f"[{done}/{total}] {message}", file=sys.stderr, flush=True)
+
+
+def analyze_files(paths, journal_path, workers=None, timeout=120, resume=True):
+    """
+    Analyzes STEP files in parallel, journaling each result as it completes.
+
+    Returns:
+        Dict mapping path to its journal entry (volume, bbox, area, features
+        or error)
+    """
+    entries = _load_journal(journal_path) if resume else {}
+    if not resume and os.path.exists(journal_path):
+        os.remove(journal_path)
+
+    remaining = [p for p in paths if not _is_resumable(entries.get(p), p)]
+    total = len(paths)
+    done_count = total - len(remaining)
+    if done_count:
+        _progress(done_count, total, "resumed from journal")
+
+    # Chunks keep progress flowing while each chunk still fills every worker
+    chunk_size = max(1, (workers or os.cpu_count() or 1) * 4)
+
+    with open(journal_path, "a") as journal:
+        for start in range(0, len(remaining), chunk_size):
+            chunk = remaining[start : start + chunk_size]
+            results = geometry.analyze_many(chunk, workers=workers, timeout=timeout)
+            for path in chunk:
+                analysis = results.get(path, {"error": "not analyzed"})
+                entry = {"path": path, "stat": _file_stat(path)}
+                if "error" in analysis:
+                    entry["error"] = analysis["error"]
+                else:
+                    entry["file_hash"] = analysis["file_hash"]
+                    entry["volume_in3"] = analysis["volume_in3"]
+                    entry["bounding_box_in"] = analysis["bounding_box_in"]
+                    entry["surface_area_in2"] = analysis["surface_area_in2"]
+                    entry["features"] = analysis.get("features")
+                journal.write(json.dumps(entry) + "\n")
+                entries[path] = entry
+
+                done_count += 1
+                status = f"error: {entry['error']}" if "error" in entry else "ok"
+                _progress(done_count, total, f"{os.path.basename(path)} {status}")
+            journal.flush()
+
+    return entries
+
+
+def price_files(paths, entries, part_configs, price_breaks=(), simulate=False):
+    """
+    Prices every analyzed file in one vectorized pass, with stock nested
+    across the whole batch, plus the per-part cost at each price-break
+    quantity and, when simulate is set, the simulated P10/P50/P90 batch cost.
+
+    Returns:
+        List of export items ({"name", "config", "result", "price_breaks"},
+        plus "cost_range" when simulating) in path order
+    """
+    names = [os.path.basename(p) for p in paths]
+    if len(set(names)) != len(names):
+        # Same file name in different folders: fall back to relative paths
+        root = os.path.commonpath([os.path.abspath(p) for p in paths])
+        names = [os.path.relpath(os.path.abspath(p), root) for p in paths]
+    configs = [resolve_config(part_configs, name) for name in names]
+    volumes = [entries.get(p, {}).get("volume_in3", 0.0) for p in paths]
+    part_features = [entries.get(p, {}).get("features") for p in paths]
+
+    stock, _ = nesting.plan_stock(names, configs, part_features)
+
+    breakdown, totals = costs.calculate_quote(
+        names, configs, volumes, features=part_features, stock=stock
+    )
+    results = costs.quote_results(breakdown, totals)
+
+    curves = {}
+    if price_breaks:
+        per_part, _ = costs.calculate_price_breaks(
+            names, configs, volumes, price_breaks, features=part_features
+        )
+        curves = per_part.to_dict(orient="index")
+
+    items = [
+        {
+            "name": name,
+            "config": config,
+            "result": results[name],
+            "price_breaks": curves.get(name, {}),
+        }
+        for name, config in zip(names, configs)
+    ]
+
+    if simulate:
+        cost_ranges, _ = costs.simulate_quote(
+            names, configs, volumes, features=part_features, stock=stock
+        )
+        for item, cost_range in zip(items, cost_ranges.to_dict(orient="records")):
+            item["cost_range"] = cost_range
+
+    return items
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="quoteforge", description="Batch quote STEP files without the UI."
+    )
+    parser.add_argument("source", help="Directory of STEP files or a manifest file")
+    parser.add_argument("--configs", help="Part configs as JSON or CSV")
+    parser.add_argument("--csv", dest="csv_path", help="Write the batch CSV here")
+    parser.add_argument("--pdf", dest="pdf_path", help="Write the PDF report here")
+    parser.add_argument("--units", choices=["Imperial", "Metric"], default="Imperial")
+    parser.add_argument(
+        "--price-breaks",
+        help="Comma-separated quantities to add per-part price columns for",
+    )
+    parser.add_argument(
+        "--simulate",
+        action="store_true",
+        help="Add simulated P10/P50/P90 batch cost columns",
+    )
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument(
+        "--timeout", type=float, default=120, help="Seconds allowed per file"
+    )
+    parser.add_argument(
+        "--journal",
+        help="Resume journal path (defaults to quoteforge_journal.jsonl next to the output)",
+    )
+    parser.add_argument(
+        "--no-resume", action="store_true", help="Ignore any existing journal"
+    )
+    args = parser.parse_args(argv)
+
+    if not args.csv_path and not args.pdf_path:
+        parser.error("at least one of --csv or --pdf is required")
+
+    price_breaks = []
+    if args.price_breaks:
+        try:
+            price_breaks = costs.parse_quantities(args.price_breaks)
+        except ValueError as e:
+            parser.error(f"invalid --price-breaks: {e}")
+
+    paths = find_step_files(args.source)
+    if not paths:
+        parser.error(f"no STEP files found in {args.source}")
+
+    output_dir = os.path.dirname(os.path.abspath(args.csv_path or args.pdf_path))
+    journal_path = args.journal or os.path.join(output_dir, "quoteforge_journal.jsonl")
+
+    part_configs = load_part_configs(args.configs)
+    entries = analyze_files(
+        paths,
+        journal_path,
+        workers=args.workers,
+        timeout=args.timeout,
+        resume=not args.no_resume,
+    )
+
+    failed = [p for p in paths if "error" in entries.get(p, {"error": True})]
+    priced_paths = [p for p in paths if p not in failed]
+    export_data = price_files(
+        priced_paths, entries, part_configs, price_breaks, simulate=args.simulate
+    )
+
+    if args.csv_path:
+        with open(args.csv_path, "w", newline="") as f:
+            export.write_batch_export(
+                export_data,
+                f,
+                units=args.units,
+                price_breaks=price_breaks,
+                cost_range=(
+                    list(export_data[0]["cost_range"])
+                    if args.simulate and export_data
+                    else ()
+                ),
+            )
+        print(f"Wrote {args.csv_path}", file=sys.stderr)
+
+    if args.pdf_path:
+        # Thumbnails come straight from the geometry cache
+        analyses = geometry.analyze_many(priced_paths, workers=args.workers)
+        for path, item in zip(priced_paths, export_data):
+            item["thumbnail_svg"] = analyses.get(path, {}).get("thumbnail_svg")
+        export.generate_pdf_export(
+            export_data,
+            units=args.units,
+            output=args.pdf_path,
+            workers=args.workers,
+            progress=lambda stage, done, total: _progress(done, total, stage),
+        )
+        print(f"Wrote {args.pdf_path}", file=sys.stderr)
+
+    if failed:
+        print(f"{len(failed)} file(s) failed analysis:", file=sys.stderr)
+        for path in failed:
+            print(f"  {path}: {entries[path]['error']}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
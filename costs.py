@@ -3,7 +3,109 @@ Cost calculation module for QuoteForge.
 Updated to use Google Sheets data via data_loader instead of SQLite.
 """
 
+import json
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+
 import data_loader
+import nesting
+from utils import instrumentation
+
+# Map boolean config keys to process names
+PROCESS_FLAGS = {
+    "machining": "Machining",
+    "turning": "Turning",
+    "3d_printing": "3D Printing",
+    "forming": "Forming",
+    "threading": "Threading",
+    "welding": "Welding",
+}
+
+
+def default_part_config():
+    """Returns the configuration a newly imported part starts with"""
+    return {
+        "quantity": 1,
+        "material": "Steel ASTM A36",
+        "cutting": None,
+        "machining": False,
+        "turning": False,
+        "3d_printing": False,
+        "forming": False,
+        "threading": False,
+        "welding": False,
+        "finishing": None,
+    }
+
+
+# Feature-based run-time model (minutes per part). Used when a part's
+# geometry features are known; otherwise the sheet's run_time_mins applies.
+# Manual run_time_mins overrides always win.
+CUT_FEED_IN_PER_MIN = 100.0
+PIERCE_SECONDS = 2.0
+MILLING_REMOVAL_IN3_PER_MIN = 1.0
+TURNING_REMOVAL_IN3_PER_MIN = 2.0
+DRILL_MINS_PER_HOLE = 0.5
+TAP_MINS_PER_HOLE = 1.0
+MINS_PER_BEND = 0.5
+PRINT_IN3_PER_HOUR = 1.0
+FINISH_IN2_PER_MIN = 100.0
+
+# Keyed by process role: "cutting", "finishing" or a PROCESS_FLAGS key
+RUN_TIME_MODELS = {
+    "cutting": lambda f: f["cut_length_in"] / CUT_FEED_IN_PER_MIN
+    + f["pierce_count"] * PIERCE_SECONDS / 60.0,
+    "machining": lambda f: f["removed_volume_in3"] / MILLING_REMOVAL_IN3_PER_MIN
+    + f["hole_count"] * DRILL_MINS_PER_HOLE,
+    "turning": lambda f: f["removed_volume_in3"] / TURNING_REMOVAL_IN3_PER_MIN,
+    "3d_printing": lambda f: f["volume_in3"] / PRINT_IN3_PER_HOUR * 60.0,
+    "forming": lambda f: f["bend_count"] * MINS_PER_BEND,
+    "threading": lambda f: f["hole_count"] * TAP_MINS_PER_HOLE,
+    "finishing": lambda f: f["surface_area_in2"] / FINISH_IN2_PER_MIN,
+}
+
+# Route optimizer. A route picks one process per slot a part uses: any
+# Cutting-category process for cut parts, any Finishing-category process for
+# finished parts, and one of ROUTE_SHAPING_FLAGS for parts shaped by exactly
+# one of them. All other processes stay as configured.
+ROUTE_SLOTS = ("cutting", "shaping", "finishing")
+ROUTE_SHAPING_FLAGS = ("machining", "turning", "3d_printing")
+# Turning needs a round envelope section, two of its dimensions within this
+# fraction of the middle one (a bar's width and thickness, or a disc's
+# length and width)...
+TURNING_ROUNDNESS = 0.1
+# ...and at least this share of the surface around the turning axis on
+# coaxial convex cylinders (features' turned_area_fraction)
+TURNING_MIN_AREA_FRACTION = 0.4
+
+# Monte Carlo cost simulation. Rates and times are drawn log-normally around
+# their point values, which stay the medians; a spread is the log-normal
+# sigma (roughly the relative standard deviation). The sheets' optional
+# price_spread (materials), time_spread and rate_spread (processes) columns
+# override these defaults per row.
+DEFAULT_PRICE_SPREAD = 0.10
+DEFAULT_TIME_SPREAD = 0.20
+DEFAULT_RATE_SPREAD = 0.05
+SIMULATION_SAMPLES = 10000
+SIMULATION_PERCENTILES = (10, 50, 90)
+# Samples x (parts + process lines) drawn at once; bounds simulation memory
+SIMULATION_CHUNK_SIZE = 2_000_000
+
+# data_loader cache keys of the rate sheets a quote is priced from
+RATE_SHEETS = ("materials", "processes")
+
+BREAKDOWN_COLUMNS = [
+    "Process",
+    "Rate",
+    "Unit",
+    "Setup Mins",
+    "Run Mins",
+    "Setup Cost",
+    "Run Cost",
+    "Batch Total Cost",
+]
 
 
 def get_material_rate(material_name):
@@ -16,10 +118,7 @@ def get_material_rate(material_name):
     material = data_loader.get_material_by_name(material_name)
 
     if material is not None:
-        # Access DataFrame columns by name
-        density = material["density (lb/in^3)"]
-        cost_per_lb = material["cost_per_lb"]
-        return (density, cost_per_lb)
+        return (material.density, material.cost_per_lb)
 
     return None
 
@@ -34,10 +133,7 @@ def get_process_rates(process_name):
     process = data_loader.get_process_by_name(process_name)
 
     if process is not None:
-        setup_time_mins = process["setup_time_mins"]
-        hourly_rate = process["hourly_rate"]
-        run_time_mins = process.get("run_time_mins", 60.0)  # Default to 60 if missing
-        return (setup_time_mins, hourly_rate, run_time_mins)
+        return (process.setup_time_mins, process.hourly_rate, process.run_time_mins)
 
     return None
 
@@ -113,7 +209,57 @@ def calculate_part_cost(volume_in3, material_info, process_info, manual_override
     }
 
 
-def calculate_part_breakdown(config, volume_in3, overrides=None):
+def get_part_process_roles(config):
+    """
+    Returns (role, process name) pairs a part configuration runs through, in
+    order: cutting, boolean processes, finishing. The role is "cutting",
+    "finishing" or the PROCESS_FLAGS key that enabled the process.
+    """
+    processes = []
+
+    # Cutting
+    if config.get("cutting"):
+        processes.append(("cutting", config["cutting"]))
+
+    # Boolean Processes
+    for key, p_name in PROCESS_FLAGS.items():
+        if config.get(key, False):
+            processes.append((key, p_name))
+
+    # Finishing
+    if config.get("finishing"):
+        processes.append(("finishing", config["finishing"]))
+
+    return processes
+
+
+def get_part_processes(config):
+    """
+    Returns the process names a part configuration runs through, in order:
+    cutting, boolean processes, finishing.
+    """
+    return [p_name for _, p_name in get_part_process_roles(config)]
+
+
+def estimate_run_minutes(role, features):
+    """
+    Estimates run minutes per part for a process role from geometry features.
+
+    Returns:
+        Minutes, or None when there is no model for the role, no features, or
+        the estimate is not positive (the sheet default applies instead)
+    """
+    model = RUN_TIME_MODELS.get(role)
+    if model is None or not features:
+        return None
+    minutes = float(model(features))
+    return minutes if minutes > 0 else None
+
+
+@instrumentation.timed("costs.part_breakdown")
+def calculate_part_breakdown(
+    config, volume_in3, overrides=None, features=None, stock=None
+):
     """
     Calculates detailed cost breakdown for a part based on its configuration.
 
@@ -121,6 +267,10 @@ def calculate_part_breakdown(config, volume_in3, overrides=None):
         config: Dict containing part configuration (qty, material, processes)
         volume_in3: Volume in cubic inches
         overrides: Dict of manual cost overrides
+        features: Optional geometry features (features.extract_features) used
+            to estimate run minutes per process
+        stock: Optional stock allocation for the part (nesting.plan_stock);
+            material is then charged on buy weight instead of net weight
 
     Returns:
         Dict containing full cost breakdown, batch totals, and flat fields for export
@@ -131,6 +281,7 @@ def calculate_part_breakdown(config, volume_in3, overrides=None):
 
     # 1. Material Cost
     weight_lbs = 0.0
+    buy_weight_lbs = 0.0
     material_cost_per_lb = 0.0
     material_cost_batch = 0.0
     density = 0.0
@@ -141,6 +292,8 @@ def calculate_part_breakdown(config, volume_in3, overrides=None):
             density = mat_info[0]
             material_cost_per_lb = mat_info[1]
             weight_lbs = volume_in3 * density
+            buy_volume_in3 = stock["buy_volume_in3"] if stock else volume_in3
+            buy_weight_lbs = buy_volume_in3 * density
 
     # Material Overrides
     mat_key = f"Material: {material_name}"
@@ -149,8 +302,8 @@ def calculate_part_breakdown(config, volume_in3, overrides=None):
 
     cost_details = []
 
-    if material_name and weight_lbs > 0:
-        material_cost_single = weight_lbs * eff_mat_rate
+    if material_name and buy_weight_lbs > 0:
+        material_cost_single = buy_weight_lbs * eff_mat_rate
         material_cost_batch = material_cost_single * quantity
 
         cost_details.append(
@@ -170,7 +323,7 @@ def calculate_part_breakdown(config, volume_in3, overrides=None):
     batch_total_process_cost = 0.0
 
     # helper to process a single process step
-    def process_step(p_name):
+    def process_step(role, p_name):
         nonlocal batch_total_process_cost
 
         # Get base rates
@@ -184,7 +337,12 @@ def calculate_part_breakdown(config, volume_in3, overrides=None):
 
         setup_mins = float(p_ovr.get("setup_time_mins", p_info[0]))
         rate = float(p_ovr.get("rate", p_info[1]))
-        run_mins = float(p_ovr.get("run_time_mins", p_info[2]))
+        estimated_run = estimate_run_minutes(role, features)
+        run_mins = float(
+            p_ovr.get(
+                "run_time_mins", p_info[2] if estimated_run is None else estimated_run
+            )
+        )
 
         setup_cost = (setup_mins * rate) / 60.0
         run_cost_single = (run_mins * rate) / 60.0
@@ -207,36 +365,1205 @@ def calculate_part_breakdown(config, volume_in3, overrides=None):
             }
         )
 
-    # Cutting
-    if config.get("cutting"):
-        process_step(config["cutting"])
-
-    # Boolean Processes
-    # Map config keys to process names
-    config_map = {
-        "machining": "Machining",
-        "turning": "Turning",
-        "3d_printing": "3D Printing",
-        "forming": "Forming",
-        "threading": "Threading",
-        "welding": "Welding",
-    }
-
-    for key, p_name in config_map.items():
-        if config.get(key, False):
-            process_step(p_name)
-
-    # Finishing
-    if config.get("finishing"):
-        process_step(config["finishing"])
+    for role, p_name in get_part_process_roles(config):
+        process_step(role, p_name)
 
     total_cost_batch = material_cost_batch + batch_total_process_cost
     per_part_cost = total_cost_batch / quantity if quantity > 0 else 0.0
 
     return {
         "weight_lbs": weight_lbs,
+        "buy_weight_lbs": buy_weight_lbs,
+        "utilization": stock["utilization"] if stock else None,
+        "stock": stock["stock"] if stock else None,
         "quantity": quantity,
         "per_part_cost": per_part_cost,
         "total_cost_batch": total_cost_batch,
         "breakdown": cost_details,
     }
+
+
+def _gather_quote_inputs(configs, volumes_in3, overrides, features, stock, rates=None):
+    """
+    Resolves rates, overrides, run minutes and stock for a quote into flat
+    arrays: per-part arrays plus one entry per process line item.
+
+    Takes calculate_quote's arguments; overrides, features, stock and rates
+    may be None.
+
+    Returns:
+        Dict of arrays shared by calculate_quote and calculate_price_breaks
+    """
+    n_parts = len(configs)
+    if overrides is None:
+        overrides = [None] * n_parts
+    if features is None:
+        features = [None] * n_parts
+    if stock is None:
+        stock = [None] * n_parts
+
+    if rates is None:
+        rates = (data_loader.get_material_index(), data_loader.get_process_index())
+    material_index, process_index = rates
+
+    quantities = np.empty(n_parts)
+    buy_volumes = np.asarray(volumes_in3, dtype=float).copy()
+    utilizations = np.full(n_parts, np.nan)
+    stock_labels = [None] * n_parts
+    densities = np.zeros(n_parts)
+    material_rates = np.zeros(n_parts)
+    has_material = np.zeros(n_parts, dtype=bool)
+
+    # Process line items, gathered as flat columns
+    proc_part = []
+    proc_names = []
+    proc_setup = []
+    proc_rate = []
+    proc_run = []
+
+    for i, (config, part_overrides, part_features) in enumerate(
+        zip(configs, overrides, features)
+    ):
+        part_overrides = part_overrides or {}
+        quantities[i] = config.get("quantity", 1)
+        if stock[i]:
+            buy_volumes[i] = stock[i]["buy_volume_in3"]
+            if stock[i]["utilization"] is not None:
+                utilizations[i] = stock[i]["utilization"]
+            stock_labels[i] = stock[i]["stock"]
+
+        material_name = config.get("material")
+        material = material_index.get(material_name) if material_name else None
+        if material is not None:
+            has_material[i] = True
+            densities[i] = material.density
+            mat_ovr = part_overrides.get(f"Material: {material_name}", {})
+            material_rates[i] = float(mat_ovr.get("rate", material.cost_per_lb))
+
+        for role, p_name in get_part_process_roles(config):
+            process = process_index.get(p_name)
+            if process is None:
+                continue
+            p_ovr = part_overrides.get(p_name, {})
+            estimated_run = estimate_run_minutes(role, part_features)
+            default_run = (
+                process.run_time_mins if estimated_run is None else estimated_run
+            )
+            proc_part.append(i)
+            proc_names.append(p_name)
+            proc_setup.append(
+                float(p_ovr.get("setup_time_mins", process.setup_time_mins))
+            )
+            proc_rate.append(float(p_ovr.get("rate", process.hourly_rate)))
+            proc_run.append(float(p_ovr.get("run_time_mins", default_run)))
+
+    return {
+        "quantities": quantities,
+        "volumes": np.asarray(volumes_in3, dtype=float),
+        "buy_volumes": buy_volumes,
+        "utilizations": utilizations,
+        "stock_labels": stock_labels,
+        "densities": densities,
+        "material_rates": material_rates,
+        "has_material": has_material,
+        "proc_part": np.asarray(proc_part, dtype=int),
+        "proc_names": proc_names,
+        "proc_setup": np.asarray(proc_setup, dtype=float),
+        "proc_rate": np.asarray(proc_rate, dtype=float),
+        "proc_run": np.asarray(proc_run, dtype=float),
+    }
+
+
+@instrumentation.timed("costs.quote")
+def calculate_quote(
+    part_names,
+    configs,
+    volumes_in3,
+    overrides=None,
+    features=None,
+    stock=None,
+    rates=None,
+):
+    """
+    Calculates cost breakdowns for a whole quote in one vectorized pass.
+
+    Gives the same numbers as calling calculate_part_breakdown per part.
+
+    Args:
+        part_names: Sequence of unique part identifiers
+        configs: Sequence of part configuration dicts, aligned with part_names
+        volumes_in3: Sequence of part volumes in cubic inches
+        overrides: Optional sequence of per-part manual override dicts
+        features: Optional sequence of per-part geometry features (or None)
+        stock: Optional sequence of per-part stock allocations (or None) from
+            nesting.plan_stock
+        rates: Optional (material index, process index) to price with instead
+            of the current data_loader snapshot
+
+    Returns:
+        Tuple of (breakdown, totals) DataFrames. breakdown has one row per
+        line item with a "Part" column plus BREAKDOWN_COLUMNS. totals is
+        indexed by part with quantity, weight_lbs, buy_weight_lbs,
+        utilization, stock, per_part_cost and total_cost_batch.
+    """
+    n_parts = len(part_names)
+    inputs = _gather_quote_inputs(
+        configs, volumes_in3, overrides, features, stock, rates
+    )
+    quantities = inputs["quantities"]
+    volumes = inputs["volumes"]
+    buy_volumes = inputs["buy_volumes"]
+    utilizations = inputs["utilizations"]
+    stock_labels = inputs["stock_labels"]
+    densities = inputs["densities"]
+    material_rates = inputs["material_rates"]
+    has_material = inputs["has_material"]
+    proc_part = inputs["proc_part"]
+    proc_names = inputs["proc_names"]
+    proc_setup = inputs["proc_setup"]
+    proc_rate = inputs["proc_rate"]
+    proc_run = inputs["proc_run"]
+
+    # 1. Material
+    weights = np.where(has_material, volumes * densities, 0.0)
+    buy_weights = np.where(has_material, buy_volumes * densities, 0.0)
+    material_lines = has_material & (buy_weights > 0)
+    material_batch = np.where(
+        material_lines, buy_weights * material_rates * quantities, 0.0
+    )
+
+    # 2. Processes
+    setup_cost = (proc_setup * proc_rate) / 60.0
+    run_cost_single = (proc_run * proc_rate) / 60.0
+    proc_batch = setup_cost + run_cost_single * quantities[proc_part]
+    process_batch = np.bincount(proc_part, weights=proc_batch, minlength=n_parts)
+
+    total_batch = material_batch + process_batch
+    safe_qty = np.where(quantities > 0, quantities, 1.0)
+    per_part = np.where(quantities > 0, total_batch / safe_qty, 0.0)
+
+    totals = pd.DataFrame(
+        {
+            "quantity": quantities,
+            "weight_lbs": weights,
+            "buy_weight_lbs": buy_weights,
+            "utilization": utilizations,
+            "stock": stock_labels,
+            "per_part_cost": per_part,
+            "total_cost_batch": total_batch,
+        },
+        index=pd.Index(list(part_names), name="Part"),
+    )
+
+    # Tidy breakdown: material rows first for each part, then its processes
+    mat_idx = np.flatnonzero(material_lines)
+    n_mat = len(mat_idx)
+    names = np.asarray(list(part_names), dtype=object)
+    material_labels = [f"Material: {configs[i].get('material')}" for i in mat_idx]
+
+    breakdown = pd.DataFrame(
+        {
+            "Part": np.concatenate([names[mat_idx], names[proc_part]]),
+            "Process": material_labels + proc_names,
+            "Rate": np.concatenate([material_rates[mat_idx], proc_rate]),
+            "Unit": ["$/lbs"] * n_mat + ["$/hr"] * len(proc_names),
+            "Setup Mins": np.concatenate([np.full(n_mat, np.nan), proc_setup]),
+            "Run Mins": np.concatenate([np.full(n_mat, np.nan), proc_run]),
+            "Setup Cost": np.concatenate([np.full(n_mat, np.nan), setup_cost]),
+            "Run Cost": np.concatenate([np.full(n_mat, np.nan), run_cost_single]),
+            "Batch Total Cost": np.concatenate([material_batch[mat_idx], proc_batch]),
+            "_order": np.concatenate([mat_idx * 2, proc_part * 2 + 1]),
+        }
+    )
+    # Stable sort keeps process order within each part
+    breakdown = (
+        breakdown.sort_values("_order", kind="stable")
+        .drop(columns="_order")
+        .reset_index(drop=True)
+    )
+
+    return breakdown, totals
+
+
+def quote_results(breakdown, totals):
+    """
+    Converts calculate_quote output into per-part result dicts shaped like
+    calculate_part_breakdown's return value.
+
+    Returns:
+        Dict mapping part name to its result dict
+    """
+    results = {}
+    for part, row in zip(totals.index, totals.itertuples(index=False)):
+        quantity = row.quantity
+        results[part] = {
+            "weight_lbs": float(row.weight_lbs),
+            "buy_weight_lbs": float(row.buy_weight_lbs),
+            "utilization": (
+                None if pd.isna(row.utilization) else float(row.utilization)
+            ),
+            "stock": row.stock if isinstance(row.stock, str) else None,
+            "quantity": int(quantity) if float(quantity).is_integer() else quantity,
+            "per_part_cost": float(row.per_part_cost),
+            "total_cost_batch": float(row.total_cost_batch),
+            "breakdown": [],
+        }
+
+    columns = BREAKDOWN_COLUMNS
+    records = breakdown[["Part"] + columns].astype(object)
+    records = records.where(records.notna(), None)
+    for values in records.itertuples(index=False, name=None):
+        results[values[0]]["breakdown"].append(dict(zip(columns, values[1:])))
+
+    return results
+
+
+def parse_quantities(text):
+    """
+    Parses a comma- or space-separated list of price-break quantities.
+
+    Returns:
+        Sorted list of unique positive ints
+
+    Raises:
+        ValueError: If an entry is not a positive whole number
+    """
+    quantities = set()
+    for token in text.replace(",", " ").split():
+        quantity = int(token)
+        if quantity <= 0:
+            raise ValueError(f"Quantity must be positive: {token}")
+        quantities.add(quantity)
+    return sorted(quantities)
+
+
+@instrumentation.timed("costs.price_breaks")
+def calculate_price_breaks(
+    part_names, configs, volumes_in3, quantities, overrides=None, features=None
+):
+    """
+    Calculates per-part and batch cost curves over an array of quantities.
+
+    Every part is priced at every quantity in one pass: setup is amortized
+    over the batch as arrays, while run time and material scale with it.
+    When features are given, stock is re-nested at each quantity with every
+    part at that quantity, so buy weight per part falls as sheets and bars
+    fill up. At a part's configured quantity the batch cost matches
+    calculate_quote when all parts share that quantity.
+
+    Args:
+        part_names: Sequence of unique part identifiers
+        configs: Sequence of part configuration dicts, aligned with part_names
+        volumes_in3: Sequence of part volumes in cubic inches
+        quantities: Sequence of batch quantities to price, all positive
+        overrides: Optional sequence of per-part manual override dicts
+        features: Optional sequence of per-part geometry features (or None)
+
+    Returns:
+        Tuple of (per_part, batch) DataFrames indexed by part with one column
+        per quantity
+    """
+    breaks = np.asarray(quantities, dtype=float)
+    if breaks.ndim != 1 or (breaks <= 0).any():
+        raise ValueError("Price break quantities must be positive")
+
+    n_parts = len(part_names)
+    inputs = _gather_quote_inputs(configs, volumes_in3, overrides, features, None)
+    proc_part = inputs["proc_part"]
+    proc_rate = inputs["proc_rate"]
+
+    # Setup is paid once per batch; run time and material are paid per part
+    setup_batch = np.bincount(
+        proc_part, weights=inputs["proc_setup"] * proc_rate / 60.0, minlength=n_parts
+    )
+    run_single = np.bincount(
+        proc_part, weights=inputs["proc_run"] * proc_rate / 60.0, minlength=n_parts
+    )
+    material_per_in3 = np.where(
+        inputs["has_material"], inputs["densities"] * inputs["material_rates"], 0.0
+    )
+
+    buy_volumes = np.repeat(inputs["buy_volumes"][:, None], len(breaks), axis=1)
+    if features is not None and any(features):
+        nested = nesting.plan_buy_volumes(configs, features, quantities)
+        buy_volumes = np.where(np.isnan(nested), buy_volumes, nested)
+
+    unit_cost = run_single[:, None] + buy_volumes * material_per_in3[:, None]
+    batch = setup_batch[:, None] + unit_cost * breaks
+    per_part = batch / breaks
+
+    index = pd.Index(list(part_names), name="Part")
+    columns = pd.Index(list(quantities), name="Quantity")
+    return (
+        pd.DataFrame(per_part, index=index, columns=columns),
+        pd.DataFrame(batch, index=index, columns=columns),
+    )
+
+
+@instrumentation.timed("costs.material_matrix")
+def material_cost_matrix(part_names, volumes_in3, stock=None, materials=None):
+    """
+    Prices the material of every part in every catalog material at once.
+
+    One broadcast of buy volumes against density x cost_per_lb. Buy volume
+    comes from each part's stock allocation when given (kept as is for other
+    materials), otherwise from its net volume.
+
+    Args:
+        part_names: Sequence of unique part identifiers
+        volumes_in3: Sequence of part volumes in cubic inches
+        stock: Optional sequence of per-part stock allocations (or None)
+        materials: Catalog DataFrame; defaults to data_loader.get_materials()
+
+    Returns:
+        DataFrame of material cost per part, indexed by part with one column
+        per material in catalog order
+    """
+    if materials is None:
+        materials = data_loader.get_materials()
+    # Keep the first row for duplicate names, like the material index
+    materials = materials.drop_duplicates("name")
+
+    buy_volumes = np.asarray(volumes_in3, dtype=float).copy()
+    if stock is not None:
+        for i, allocation in enumerate(stock):
+            if allocation:
+                buy_volumes[i] = allocation["buy_volume_in3"]
+
+    cost_per_in3 = materials["density (lb/in^3)"].to_numpy(dtype=float) * materials[
+        "cost_per_lb"
+    ].to_numpy(dtype=float)
+    return pd.DataFrame(
+        np.multiply.outer(buy_volumes, cost_per_in3),
+        index=pd.Index(list(part_names), name="Part"),
+        columns=pd.Index(materials["name"].tolist(), name="Material"),
+    )
+
+
+def cheapest_materials(matrix, n=3):
+    """
+    Picks the n cheapest materials per part from a material_cost_matrix.
+
+    Returns:
+        Dict mapping part to a list of (material, cost per part), cheapest
+        first
+    """
+    values = matrix.to_numpy()
+    n = min(n, values.shape[1])
+    if n <= 0:
+        return {part: [] for part in matrix.index}
+
+    # Partition for the n smallest, then sort only those
+    top = np.argpartition(values, n - 1, axis=1)[:, :n]
+    order = np.argsort(np.take_along_axis(values, top, axis=1), axis=1, kind="stable")
+    top = np.take_along_axis(top, order, axis=1)
+
+    names = matrix.columns.to_numpy()
+    return {
+        part: list(zip(names[row].tolist(), values[i, row].tolist()))
+        for i, (part, row) in enumerate(zip(matrix.index, top))
+    }
+
+
+class RouteOptions(NamedTuple):
+    """
+    Priced process routes for a quote, from calculate_route_options.
+
+    choices maps each of ROUTE_SLOTS to its options (None leaves the part as
+    configured). cost and minutes map each slot to a (parts, options) array
+    of batch cost and shop minutes, inf where the option does not fit the
+    part. fixed_cost and fixed_minutes cover the processes no slot changes,
+    and current maps each slot to the configured option index per part (-1
+    when the configured process is not in the rate sheet).
+    """
+
+    part_names: list
+    choices: dict
+    cost: dict
+    minutes: dict
+    fixed_cost: np.ndarray
+    fixed_minutes: np.ndarray
+    current: dict
+
+
+def _shaping_flag(config):
+    """Returns the one ROUTE_SHAPING_FLAGS key a part is shaped by, or None"""
+    flags = [flag for flag in ROUTE_SHAPING_FLAGS if config.get(flag, False)]
+    return flags[0] if len(flags) == 1 else None
+
+
+def _is_turnable(part_features):
+    """
+    True when the part is mostly cylinders around one axis: a shaft along its
+    long side, or a disc or flange across its thin side. The envelope check
+    is only a cheap pre-filter; square plates, bars and blocks fail on the
+    cylinder area.
+    """
+    if not part_features:
+        return False
+    length, width, thickness = sorted(part_features["stock_envelope_in"], reverse=True)
+    if min(length - width, width - thickness) > TURNING_ROUNDNESS * width:
+        return False
+    return part_features.get("turned_area_fraction", 0.0) >= TURNING_MIN_AREA_FRACTION
+
+
+def _with_shaping(config, shaping_flag):
+    """Returns a copy of config shaped by shaping_flag alone"""
+    updated = dict(config)
+    for flag in ROUTE_SHAPING_FLAGS:
+        updated[flag] = flag == shaping_flag
+    return updated
+
+
+def apply_route(config, route):
+    """
+    Returns a copy of a part configuration switched to a route.
+
+    Args:
+        config: Part configuration dict
+        route: Dict with cutting, shaping and finishing choices
+    """
+    if route["shaping"]:
+        updated = _with_shaping(config, route["shaping"])
+    else:
+        updated = dict(config)
+    updated["cutting"] = route["cutting"]
+    updated["finishing"] = route["finishing"]
+    return updated
+
+
+@instrumentation.timed("costs.route_options")
+def calculate_route_options(
+    part_names, configs, volumes_in3, overrides=None, features=None
+):
+    """
+    Prices every process option of every route slot for a whole quote.
+
+    Slot options are priced as arrays over all parts at once, with overrides
+    and feature-based run minutes applied as in calculate_quote. Route cost
+    and shop minutes add up over slots, so any route is the sum of one option
+    per slot plus the fixed part. Material follows the shaping option: stock
+    is nested once per shaping process with every switchable part using it,
+    while the configured option keeps the quote's current nesting.
+
+    Args:
+        part_names: Sequence of unique part identifiers
+        configs: Sequence of part configuration dicts, aligned with part_names
+        volumes_in3: Sequence of part volumes in cubic inches
+        overrides: Optional sequence of per-part manual override dicts
+        features: Optional sequence of per-part geometry features (or None)
+
+    Returns:
+        RouteOptions
+    """
+    n_parts = len(part_names)
+    if overrides is None:
+        overrides = [None] * n_parts
+    if features is None:
+        features = [None] * n_parts
+
+    process_index = data_loader.get_process_index()
+    by_category = {}
+    for process in process_index.values():
+        by_category.setdefault(process.category, []).append(process.name)
+    choices = {
+        "cutting": [None] + by_category.get("Cutting", []),
+        "shaping": [None]
+        + [
+            flag for flag in ROUTE_SHAPING_FLAGS if PROCESS_FLAGS[flag] in process_index
+        ],
+        "finishing": [None] + by_category.get("Finishing", []),
+    }
+
+    # Processes outside the slots, and the material rate, as configured
+    shaping = [_shaping_flag(config) for config in configs]
+    fixed_configs = []
+    for config, flag in zip(configs, shaping):
+        fixed_config = dict(config, cutting=None, finishing=None)
+        if flag:
+            fixed_config[flag] = False
+        fixed_configs.append(fixed_config)
+    inputs = _gather_quote_inputs(fixed_configs, volumes_in3, overrides, features, None)
+    quantities = inputs["quantities"]
+    proc_part = inputs["proc_part"]
+    proc_run_batch = inputs["proc_run"] * quantities[proc_part]
+    fixed_cost = np.bincount(
+        proc_part,
+        weights=(inputs["proc_setup"] + proc_run_batch) * inputs["proc_rate"] / 60.0,
+        minlength=n_parts,
+    )
+    fixed_minutes = np.bincount(
+        proc_part, weights=inputs["proc_setup"] + proc_run_batch, minlength=n_parts
+    )
+    material_per_in3 = np.where(
+        inputs["has_material"], inputs["densities"] * inputs["material_rates"], 0.0
+    )
+    material_batch_per_in3 = material_per_in3 * quantities
+
+    def buy_volumes(route_configs):
+        volumes = np.asarray(volumes_in3, dtype=float).copy()
+        if any(features):
+            stock, _ = nesting.plan_stock(part_names, route_configs, features)
+            for i, allocation in enumerate(stock):
+                if allocation:
+                    volumes[i] = allocation["buy_volume_in3"]
+        return volumes
+
+    current_volumes = buy_volumes(configs)
+
+    configured = {
+        "cutting": [config.get("cutting") or None for config in configs],
+        "shaping": shaping,
+        "finishing": [config.get("finishing") or None for config in configs],
+    }
+    current = {
+        slot: np.array(
+            [
+                choices[slot].index(value) if value in choices[slot] else -1
+                for value in configured[slot]
+            ],
+            dtype=int,
+        )
+        for slot in ROUTE_SLOTS
+    }
+
+    # Sparse override lookup: only parts that have any
+    overridden = [(i, o) for i, o in enumerate(overrides) if o]
+    cost = {}
+    minutes = {}
+    for slot in ROUTE_SLOTS:
+        used = np.array([value is not None for value in configured[slot]], dtype=bool)
+        slot_cost = np.full((n_parts, len(choices[slot])), np.inf)
+        slot_minutes = np.full((n_parts, len(choices[slot])), np.inf)
+
+        for k, choice in enumerate(choices[slot]):
+            if choice is None:
+                feasible = ~used
+                setup = run = rate = np.zeros(n_parts)
+            else:
+                feasible = used.copy()
+                if slot == "shaping":
+                    role, process = choice, process_index[PROCESS_FLAGS[choice]]
+                else:
+                    role, process = slot, process_index[choice]
+                if choice == "turning":
+                    feasible &= np.array(
+                        [
+                            flag == "turning" or _is_turnable(part_features)
+                            for flag, part_features in zip(shaping, features)
+                        ],
+                        dtype=bool,
+                    )
+                estimated = np.array(
+                    [estimate_run_minutes(role, f) for f in features], dtype=float
+                )
+                setup = np.full(n_parts, float(process.setup_time_mins))
+                rate = np.full(n_parts, float(process.hourly_rate))
+                run = np.where(
+                    np.isnan(estimated), float(process.run_time_mins), estimated
+                )
+                for i, part_overrides in overridden:
+                    p_ovr = part_overrides.get(process.name)
+                    if p_ovr:
+                        setup[i] = float(p_ovr.get("setup_time_mins", setup[i]))
+                        rate[i] = float(p_ovr.get("rate", rate[i]))
+                        run[i] = float(p_ovr.get("run_time_mins", run[i]))
+
+            option_minutes = setup + run * quantities
+            option_cost = option_minutes * rate / 60.0
+            if slot == "shaping":
+                # The configured option keeps the quote's current nesting
+                volumes = current_volumes
+                if choice is not None:
+                    volumes = np.where(
+                        current[slot] == k,
+                        current_volumes,
+                        buy_volumes(
+                            [
+                                _with_shaping(config, choice) if flag else config
+                                for config, flag in zip(configs, shaping)
+                            ]
+                        ),
+                    )
+                option_cost = option_cost + volumes * material_batch_per_in3
+
+            slot_cost[:, k] = np.where(feasible, option_cost, np.inf)
+            slot_minutes[:, k] = np.where(feasible, option_minutes, np.inf)
+
+        cost[slot] = slot_cost
+        minutes[slot] = slot_minutes
+
+    return RouteOptions(
+        list(part_names), choices, cost, minutes, fixed_cost, fixed_minutes, current
+    )
+
+
+def _route_dict(choices, indices):
+    return {slot: choices[slot][k] for slot, k in zip(ROUTE_SLOTS, indices)}
+
+
+def cheapest_routes(route_options):
+    """
+    Picks the cheapest route per part from calculate_route_options output.
+
+    Slots add up independently, so the cheapest route is the cheapest option
+    of each slot; ties keep the configured option.
+
+    Returns:
+        DataFrame indexed by part with cutting, shaping, finishing,
+        total_cost_batch, shop_minutes, current_cost_batch, current_minutes
+        and savings. Routes are NaN/None for parts with no feasible route.
+    """
+    n_parts = len(route_options.part_names)
+    rows = np.arange(n_parts)
+    total_cost = route_options.fixed_cost.astype(float)
+    total_minutes = route_options.fixed_minutes.astype(float)
+    current_cost = route_options.fixed_cost.astype(float)
+    current_minutes = route_options.fixed_minutes.astype(float)
+    best = {}
+    for slot in ROUTE_SLOTS:
+        cost = route_options.cost[slot]
+        minutes = route_options.minutes[slot]
+        current = route_options.current[slot]
+        has_current = current >= 0
+        safe_current = np.where(has_current, current, 0)
+
+        cheapest = np.argmin(cost, axis=1)
+        configured_cost = np.where(has_current, cost[rows, safe_current], np.inf)
+        keep = has_current & (configured_cost <= cost[rows, cheapest])
+        best[slot] = np.where(keep, safe_current, cheapest)
+
+        total_cost += cost[rows, best[slot]]
+        total_minutes += minutes[rows, best[slot]]
+        current_cost += configured_cost
+        current_minutes += np.where(has_current, minutes[rows, safe_current], np.inf)
+
+    feasible = np.isfinite(total_cost)
+    current_cost = np.where(np.isfinite(current_cost), current_cost, np.nan)
+    total_cost = np.where(feasible, total_cost, np.nan)
+    table = {
+        slot: [
+            route_options.choices[slot][k] if ok else None
+            for k, ok in zip(best[slot], feasible)
+        ]
+        for slot in ROUTE_SLOTS
+    }
+    table.update(
+        {
+            "total_cost_batch": total_cost,
+            "shop_minutes": np.where(feasible, total_minutes, np.nan),
+            "current_cost_batch": current_cost,
+            "current_minutes": np.where(
+                np.isfinite(current_minutes), current_minutes, np.nan
+            ),
+            "savings": current_cost - total_cost,
+        }
+    )
+    return pd.DataFrame(table, index=pd.Index(route_options.part_names, name="Part"))
+
+
+def _dominated(cost, minutes):
+    """(parts, options) mask of options another option beats on both counts"""
+    c_other, c_self = cost[:, None, :], cost[:, :, None]
+    m_other, m_self = minutes[:, None, :], minutes[:, :, None]
+    beats = (
+        (c_other <= c_self)
+        & (m_other <= m_self)
+        & ((c_other < c_self) | (m_other < m_self))
+    )
+    return beats.any(axis=2)
+
+
+@instrumentation.timed("costs.pareto_routes")
+def pareto_routes(route_options):
+    """
+    Finds each part's Pareto-best routes by batch cost and shop minutes.
+
+    Options dominated within their own slot cannot be part of a Pareto-best
+    route because slots add up, so they are pruned (and options no part keeps
+    are dropped) before the remaining routes are combined and ranked.
+
+    Returns:
+        Dict mapping part to a list of route dicts (cutting, shaping,
+        finishing, total_cost_batch, shop_minutes), cheapest first
+    """
+    kept = []
+    for slot in ROUTE_SLOTS:
+        cost = route_options.cost[slot]
+        minutes = route_options.minutes[slot]
+        cost = np.where(_dominated(cost, minutes), np.inf, cost)
+        columns = np.flatnonzero(np.isfinite(cost).any(axis=0))
+        kept.append((columns, cost[:, columns], minutes[:, columns]))
+
+    n_parts = len(route_options.part_names)
+    cut_cols, cut_cost, cut_min = kept[0]
+    shape_cols, shape_cost, shape_min = kept[1]
+    finish_cols, finish_cost, finish_min = kept[2]
+    shape = (len(cut_cols), len(shape_cols), len(finish_cols))
+    total_cost = (
+        route_options.fixed_cost[:, None, None, None]
+        + cut_cost[:, :, None, None]
+        + shape_cost[:, None, :, None]
+        + finish_cost[:, None, None, :]
+    ).reshape(n_parts, -1)
+    total_minutes = (
+        route_options.fixed_minutes[:, None, None, None]
+        + cut_min[:, :, None, None]
+        + shape_min[:, None, :, None]
+        + finish_min[:, None, None, :]
+    ).reshape(n_parts, -1)
+
+    # Cheapest first (faster first on ties); a route is on the front when it
+    # is faster than every cheaper one
+    order = np.lexsort((total_minutes, total_cost), axis=1)
+    sorted_cost = np.take_along_axis(total_cost, order, axis=1)
+    sorted_minutes = np.take_along_axis(total_minutes, order, axis=1)
+    fastest_before = np.minimum.accumulate(sorted_minutes, axis=1)
+    fastest_before = np.concatenate(
+        [np.full((n_parts, 1), np.inf), fastest_before[:, :-1]], axis=1
+    )
+    on_front = np.isfinite(sorted_cost) & (sorted_minutes < fastest_before)
+
+    columns = (cut_cols, shape_cols, finish_cols)
+    fronts = {}
+    for i, part in enumerate(route_options.part_names):
+        routes = []
+        for j in np.flatnonzero(on_front[i]):
+            indices = np.unravel_index(order[i, j], shape)
+            route = _route_dict(
+                route_options.choices,
+                [cols[k] for cols, k in zip(columns, indices)],
+            )
+            route["total_cost_batch"] = float(sorted_cost[i, j])
+            route["shop_minutes"] = float(sorted_minutes[i, j])
+            routes.append(route)
+        fronts[part] = routes
+    return fronts
+
+
+def _spread(value, default):
+    return default if value is None else value
+
+
+@instrumentation.timed("costs.simulate")
+def simulate_quote(
+    part_names,
+    configs,
+    volumes_in3,
+    overrides=None,
+    features=None,
+    stock=None,
+    n_samples=SIMULATION_SAMPLES,
+    percentiles=SIMULATION_PERCENTILES,
+    seed=0,
+):
+    """
+    Simulates the batch cost of every part and of the whole quote.
+
+    Material prices and process rates are drawn once per sample and shared
+    by all parts using them, so a price rise moves the whole quote; setup and
+    run minutes are drawn per line item. Draws are batched over all samples
+    for chunks of parts sized by SIMULATION_CHUNK_SIZE, and quote totals are
+    accumulated per sample. A fixed seed keeps results stable across reruns.
+
+    Args:
+        part_names: Sequence of unique part identifiers
+        configs: Sequence of part configuration dicts, aligned with part_names
+        volumes_in3: Sequence of part volumes in cubic inches
+        overrides: Optional sequence of per-part manual override dicts
+        features: Optional sequence of per-part geometry features (or None)
+        stock: Optional sequence of per-part stock allocations (or None) from
+            nesting.plan_stock
+        n_samples: Number of Monte Carlo samples
+        percentiles: Percentiles to report, e.g. (10, 50, 90)
+        seed: Random seed
+
+    Returns:
+        Tuple of (parts, quote). parts is a DataFrame indexed by part with a
+        "P<n>" batch cost column per percentile; quote maps the same keys to
+        the quote total.
+    """
+    n_parts = len(part_names)
+    columns = [f"P{p:g}" for p in percentiles]
+    inputs = _gather_quote_inputs(configs, volumes_in3, overrides, features, stock)
+    quantities = inputs["quantities"]
+    proc_part = inputs["proc_part"]
+    rng = np.random.default_rng(seed)
+
+    # Shared draws: one column per material and per process in the quote
+    material_index = data_loader.get_material_index()
+    process_index = data_loader.get_process_index()
+    material_names = [
+        config.get("material") if has_material else None
+        for config, has_material in zip(configs, inputs["has_material"])
+    ]
+    material_list = sorted({m for m in material_names if m is not None})
+    material_column = {name: k for k, name in enumerate(material_list)}
+    part_material = np.array(
+        [material_column.get(m, 0) for m in material_names], dtype=int
+    )
+    material_sigma = np.array(
+        [
+            _spread(material_index[m].price_spread, DEFAULT_PRICE_SPREAD)
+            for m in material_list
+        ]
+        or [0.0]
+    )
+    process_list = sorted(set(inputs["proc_names"]))
+    process_column = {name: k for k, name in enumerate(process_list)}
+    line_process = np.array(
+        [process_column[p] for p in inputs["proc_names"]], dtype=int
+    )
+    rate_sigma = np.array(
+        [
+            _spread(process_index[p].rate_spread, DEFAULT_RATE_SPREAD)
+            for p in process_list
+        ]
+        or [0.0]
+    )
+    line_time_sigma = np.array(
+        [
+            _spread(process_index[p].time_spread, DEFAULT_TIME_SPREAD)
+            for p in inputs["proc_names"]
+        ],
+        dtype=float,
+    )
+    material_factors = np.exp(
+        rng.standard_normal((n_samples, len(material_sigma))) * material_sigma
+    )
+    rate_factors = np.exp(
+        rng.standard_normal((n_samples, len(rate_sigma))) * rate_sigma
+    )
+
+    # Point values the factors scale
+    material_batch = np.where(
+        inputs["has_material"],
+        inputs["buy_volumes"]
+        * inputs["densities"]
+        * inputs["material_rates"]
+        * quantities,
+        0.0,
+    )
+    line_batch = (
+        (inputs["proc_setup"] + inputs["proc_run"] * quantities[proc_part])
+        * inputs["proc_rate"]
+        / 60.0
+    )
+
+    # Lines are gathered in part order, so a part range maps to a line range
+    line_starts = np.searchsorted(proc_part, np.arange(n_parts + 1))
+    weight = np.arange(n_parts + 1) + line_starts
+    parts_batch = np.empty((len(percentiles), n_parts))
+    quote_samples = np.zeros(n_samples)
+    budget = max(1, SIMULATION_CHUNK_SIZE // n_samples)
+    start = 0
+    while start < n_parts:
+        end = int(np.searchsorted(weight, weight[start] + budget, side="right")) - 1
+        end = min(max(end, start + 1), n_parts)
+        lines = slice(line_starts[start], line_starts[end])
+
+        samples = (
+            material_batch[start:end] * material_factors[:, part_material[start:end]]
+        )
+        line_samples = (
+            line_batch[lines]
+            * np.exp(
+                rng.standard_normal((n_samples, lines.stop - lines.start))
+                * line_time_sigma[lines]
+            )
+            * rate_factors[:, line_process[lines]]
+        )
+        # Sum each part's lines: (samples, lines) @ (lines, parts) one-hot
+        owner = np.zeros((lines.stop - lines.start, end - start))
+        owner[np.arange(lines.stop - lines.start), proc_part[lines] - start] = 1.0
+        samples += line_samples @ owner
+
+        parts_batch[:, start:end] = np.percentile(samples, percentiles, axis=0)
+        quote_samples += samples.sum(axis=1)
+        start = end
+
+    parts = pd.DataFrame(
+        parts_batch.T,
+        index=pd.Index(list(part_names), name="Part"),
+        columns=columns,
+    )
+    quote = dict(zip(columns, np.percentile(quote_samples, percentiles).tolist()))
+    return parts, quote
+
+
+def rate_users(part_names, configs):
+    """
+    Indexes the parts of a quote by the rates they are priced from.
+
+    Returns:
+        Dict with "materials" and "processes", each mapping a material or
+        process name to the names of the parts that use it
+    """
+    users = {sheet: {} for sheet in RATE_SHEETS}
+    for name, config in zip(part_names, configs):
+        if config.get("material"):
+            users["materials"].setdefault(config["material"], []).append(name)
+        for process in dict.fromkeys(get_part_processes(config)):
+            users["processes"].setdefault(process, []).append(name)
+    return users
+
+
+def changed_rate_names(change_set):
+    """Returns the names a data_loader change set touches, in sheet order"""
+    return list(
+        dict.fromkeys(
+            change_set["added"]
+            + change_set["removed"]
+            + [change["name"] for change in change_set["changes"]]
+        )
+    )
+
+
+def _rate_changes_frame(change_sets):
+    """Flattens change sets into one row per changed cell, added or removed row"""
+    rows = []
+    for sheet, sheet_changes in change_sets.items():
+        for change_set in sheet_changes:
+            for name in change_set["added"]:
+                rows.append((sheet, name, "(added)", None, None))
+            for name in change_set["removed"]:
+                rows.append((sheet, name, "(removed)", None, None))
+            for change in change_set["changes"]:
+                rows.append(
+                    (
+                        sheet,
+                        change["name"],
+                        change["column"],
+                        change["old"],
+                        change["new"],
+                    )
+                )
+    changes = pd.DataFrame(rows, columns=["Sheet", "Name", "Field", "Old", "New"])
+    old = pd.to_numeric(changes["Old"], errors="coerce")
+    new = pd.to_numeric(changes["New"], errors="coerce")
+    changes["Change (%)"] = ((new - old) / old.where(old != 0) * 100).round(1)
+    return changes
+
+
+def _rate_report(change_sets, before, results, quote_before, part_names):
+    """
+    Builds IncrementalQuote.rate_report.
+
+    Args:
+        change_sets: Change sets per rate sheet, or None when unknown
+        before: Part name -> batch cost at the previous rates, with the
+            part's current inputs, for every part a rate change affected
+        results: Part name -> current result
+        quote_before: Previous total of the parts still in the quote
+        part_names: Parts in the quote
+
+    Returns:
+        Dict with changes (DataFrame of rate changes, None when the change
+        history was incomplete), parts (DataFrame indexed by Part with
+        before/after batch cost), quote_before and quote_after. The quote
+        totals also include any other edits made since the last call.
+    """
+    names = list(before)
+    before_costs = np.array([before[name] for name in names])
+    after_costs = np.array([results[name]["total_cost_batch"] for name in names])
+    delta = after_costs - before_costs
+    parts = pd.DataFrame(
+        {
+            "Before ($)": before_costs,
+            "After ($)": after_costs,
+            "Change ($)": delta,
+            "Change (%)": np.round(
+                np.divide(
+                    delta * 100,
+                    before_costs,
+                    out=np.full(len(names), np.nan),
+                    where=before_costs != 0,
+                ),
+                1,
+            ),
+        },
+        index=pd.Index(names, name="Part"),
+    )
+    quote_after = sum(results[name]["total_cost_batch"] for name in part_names)
+    return {
+        "changes": None if change_sets is None else _rate_changes_frame(change_sets),
+        "parts": parts,
+        "quote_before": quote_before,
+        "quote_after": quote_after,
+    }
+
+
+class IncrementalQuote:
+    """
+    Memoizes per-part cost results and re-prices only parts whose inputs changed.
+
+    Each part result depends on its config, volume, manual overrides, geometry
+    features and stock allocation, which are fingerprinted on every call, and
+    on the rates of its material and processes. Clean parts are served from
+    memory and dirty parts are priced together in one calculate_quote pass.
+
+    When the rate sheets change, their change sets are looked up through the
+    rate_users index so only parts using a changed material or process are
+    re-priced; rate_report then holds the rate changes and the before/after
+    cost of those parts until the next rate change, or until parts are edited,
+    added or removed. Parts edited in the same call as a rate change are also
+    priced at the previous rates, so the report covers them too. If the
+    change history has a gap, every part is re-priced.
+
+    Stock is nested across the whole quote on every call, so a change to one
+    part re-prices the parts it shares sheets or bars with. The resulting
+    stock groups are kept in stock_groups.
+    """
+
+    def __init__(self):
+        self._fingerprints = {}
+        self._results = {}
+        self._rates_version = None
+        # (material index, process index) the memoized results were priced at
+        self._rates = None
+        self.last_recomputed = []
+        self.stock_groups = []
+        self.rate_report = None
+
+    def _fingerprint(self, config, volume_in3, overrides, part_features, part_stock):
+        return (
+            json.dumps(config, sort_keys=True, default=str),
+            float(volume_in3),
+            json.dumps(overrides or {}, sort_keys=True, default=str),
+            json.dumps(part_features, sort_keys=True, default=str),
+            json.dumps(part_stock, sort_keys=True, default=str),
+        )
+
+    def _rate_changes(self, rates_version):
+        """
+        Returns the change sets since the last call, per rate sheet, or None
+        when they are unknown and every part must be re-priced
+        """
+        change_sets = {}
+        versions = zip(RATE_SHEETS, self._rates_version, rates_version)
+        for sheet, seen, current in versions:
+            if seen == current:
+                change_sets[sheet] = []
+                continue
+            change_sets[sheet] = data_loader.get_change_sets(sheet, seen)
+            if change_sets[sheet] is None:
+                return None
+        return change_sets
+
+    def price(self, part_names, configs, volumes_in3, overrides=None, features=None):
+        """
+        Returns cost results for every part, recomputing only dirty ones.
+
+        Takes the same arguments as calculate_quote, except that stock is
+        planned here from the features, and returns a dict mapping part name
+        to a calculate_part_breakdown-shaped result. Results are shared with
+        the memo and must not be mutated.
+        """
+        if overrides is None:
+            overrides = [None] * len(part_names)
+        if features is None:
+            features = [None] * len(part_names)
+
+        # Version first: a refresh landing in between then reprices next call
+        rates_version = data_loader.get_rates_version()
+        rates = (data_loader.get_material_index(), data_loader.get_process_index())
+        stock, self.stock_groups = nesting.plan_stock(part_names, configs, features)
+
+        # Parts whose material or process rates changed since the last call
+        rate_dirty = set()
+        change_sets = {}
+        if self._rates_version is not None and rates_version != self._rates_version:
+            change_sets = self._rate_changes(rates_version)
+            if change_sets is None:
+                rate_dirty = set(part_names)
+            else:
+                users = rate_users(part_names, configs)
+                for sheet, sheet_changes in change_sets.items():
+                    for change_set in sheet_changes:
+                        for name in changed_rate_names(change_set):
+                            rate_dirty.update(users[sheet].get(name, ()))
+        self._rates_version = rates_version
+        previous_rates, self._rates = self._rates, rates
+
+        dirty = []
+        fingerprints = {}
+        for i, name in enumerate(part_names):
+            fingerprint = self._fingerprint(
+                configs[i], volumes_in3[i], overrides[i], features[i], stock[i]
+            )
+            fingerprints[name] = fingerprint
+            if self._fingerprints.get(name) != fingerprint or name in rate_dirty:
+                dirty.append(i)
+
+        # Batch costs at the previous rates for parts a rate change affected:
+        # memoized when only the rates changed, re-priced when also edited
+        quote_before = sum(
+            self._results[name]["total_cost_batch"]
+            for name in part_names
+            if name in self._results
+        )
+        rate_before = {}
+        edited = []
+        for i in dirty:
+            name = part_names[i]
+            if name not in rate_dirty or name not in self._results:
+                continue
+            if self._fingerprints[name] == fingerprints[name]:
+                rate_before[name] = self._results[name]["total_cost_batch"]
+            else:
+                rate_before[name] = None
+                edited.append(i)
+        if edited:
+            _, old_totals = calculate_quote(
+                [part_names[i] for i in edited],
+                [configs[i] for i in edited],
+                [volumes_in3[i] for i in edited],
+                [overrides[i] for i in edited],
+                [features[i] for i in edited],
+                [stock[i] for i in edited],
+                previous_rates,
+            )
+            for name, cost in old_totals["total_cost_batch"].items():
+                rate_before[name] = float(cost)
+
+        if dirty:
+            breakdown, totals = calculate_quote(
+                [part_names[i] for i in dirty],
+                [configs[i] for i in dirty],
+                [volumes_in3[i] for i in dirty],
+                [overrides[i] for i in dirty],
+                [features[i] for i in dirty],
+                [stock[i] for i in dirty],
+                rates,
+            )
+            self._results.update(quote_results(breakdown, totals))
+            for i in dirty:
+                self._fingerprints[part_names[i]] = fingerprints[part_names[i]]
+
+        # Forget parts that are no longer in the quote
+        removed = set(self._results) - set(fingerprints)
+        for name in removed:
+            del self._results[name]
+            del self._fingerprints[name]
+
+        # The report's totals only hold until the quote changes another way
+        if rate_before:
+            self.rate_report = _rate_report(
+                change_sets, rate_before, self._results, quote_before, part_names
+            )
+        elif removed or dirty:
+            self.rate_report = None
+
+        self.last_recomputed = [part_names[i] for i in dirty]
+        instrumentation.count("costs.parts_recomputed", len(dirty))
+        instrumentation.count("costs.parts_reused", len(part_names) - len(dirty))
+        return {name: self._results[name] for name in part_names}
+
+    def invalidate(self, part_name=None):
+        """Drops one memoized part, or everything when part_name is None"""
+        if part_name is None:
+            self._fingerprints.clear()
+            self._results.clear()
+        else:
+            self._fingerprints.pop(part_name, None)
+            self._results.pop(part_name, None)
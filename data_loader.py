@@ -1,19 +1,82 @@
 """
 Data loader module for QuoteForge.
 Fetches materials and processes data from Google Sheets CSV endpoints.
-Implements time-based caching to reduce network requests.
+Implements time-based caching to reduce network requests. Expired data keeps
+being served while a background thread revalidates it with a conditional GET.
+The last good snapshot is persisted locally so a cold start needs no network.
 """
 
+import io
 import json
+import pickle
+import tempfile
+import threading
+import urllib.error
+import urllib.request
 import pandas as pd
 from datetime import datetime, timedelta
-from typing import Optional, Dict
+from types import MappingProxyType
+from typing import Callable, Dict, List, Mapping, NamedTuple, Optional
 import os
+from utils import instrumentation
 
 # In-memory cache
 _cache: Dict[str, dict] = {}
 _config: Optional[dict] = None
 
+# Background refreshes, at most one in flight per cache key
+_refresh_lock = threading.Lock()
+_refresh_threads: Dict[str, threading.Thread] = {}
+_refresh_errors: Dict[str, Exception] = {}
+
+# Bumped whenever a cache key receives new data, so dependents can tell
+# whether rates changed without comparing frames
+_data_versions: Dict[str, int] = {}
+
+# Recent change sets per cache key, oldest first, for dependents catching up
+# on several updates at once
+_change_sets: Dict[str, list] = {}
+CHANGE_SET_HISTORY = 20
+
+FETCH_TIMEOUT_SECONDS = 30
+# Wait this long before retrying a failed background refresh
+RETRY_DELAY = timedelta(minutes=1)
+
+# Bump when the layout of persisted rate snapshots changes
+SNAPSHOT_SCHEMA_VERSION = 1
+
+
+class MaterialRecord(NamedTuple):
+    """
+    Compact material row used for cost lookups.
+
+    price_spread is the optional sheet column giving the price uncertainty
+    used by cost simulation; None when the sheet leaves it out or blank.
+    """
+
+    name: str
+    density: float
+    cost_per_lb: float
+    price_spread: Optional[float] = None
+
+
+class ProcessRecord(NamedTuple):
+    """
+    Compact process row used for cost lookups.
+
+    time_spread and rate_spread are the optional sheet columns giving the
+    setup/run time and hourly rate uncertainty used by cost simulation; None
+    when the sheet leaves them out or blank.
+    """
+
+    name: str
+    category: Optional[str]
+    setup_time_mins: float
+    hourly_rate: float
+    run_time_mins: float
+    time_spread: Optional[float] = None
+    rate_spread: Optional[float] = None
+
 
 def load_config() -> dict:
     """Load configuration from config.json"""
@@ -25,10 +88,76 @@ def load_config() -> dict:
     return _config
 
 
+def get_cache_dir(*parts: str) -> str:
+    """Returns (and creates) a directory under the configured local cache root"""
+    directory = load_config().get("cache", {}).get("directory", ".cache")
+    if not os.path.isabs(directory):
+        directory = os.path.join(os.path.dirname(__file__), directory)
+    directory = os.path.join(directory, *parts)
+    os.makedirs(directory, exist_ok=True)
+    return directory
+
+
+def _snapshot_path(cache_key: str) -> str:
+    return os.path.join(get_cache_dir("rates"), f"{cache_key}.pkl")
+
+
+def _save_snapshot(url: str, cache_key: str, entry: dict) -> None:
+    """Persists a cache entry so the next process can start without network"""
+    df = entry["data"]
+    snapshot = {
+        "schema_version": SNAPSHOT_SCHEMA_VERSION,
+        "url": url,
+        "timestamp": entry["timestamp"],
+        "etag": entry.get("etag"),
+        "last_modified": entry.get("last_modified"),
+        # Plain lists keep the file readable across pandas versions
+        "columns": list(df.columns),
+        "values": df.to_dict(orient="list"),
+    }
+    path = _snapshot_path(cache_key)
+    try:
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            pickle.dump(snapshot, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+    except Exception as e:
+        print(f"[Data Loader] Failed to persist {cache_key} snapshot: {e}")
+
+
+def _load_snapshot(url: str, cache_key: str) -> Optional[dict]:
+    """Loads a persisted cache entry for url, or None if unusable"""
+    try:
+        with open(_snapshot_path(cache_key), "rb") as f:
+            snapshot = pickle.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        print(f"[Data Loader] Ignoring unreadable {cache_key} snapshot: {e}")
+        return None
+
+    if snapshot.get("schema_version") != SNAPSHOT_SCHEMA_VERSION:
+        return None
+    if snapshot.get("url") != url:
+        return None
+
+    return {
+        "data": pd.DataFrame(snapshot["values"], columns=snapshot["columns"]),
+        "timestamp": snapshot["timestamp"],
+        "etag": snapshot.get("etag"),
+        "last_modified": snapshot.get("last_modified"),
+    }
+
+
+@instrumentation.timed("data_loader.fetch_csv_data")
 def fetch_csv_data(url: str, cache_key: str) -> pd.DataFrame:
     """
     Fetch CSV data from URL with time-based caching.
 
+    Fresh data is returned directly. Expired data is still returned while a
+    background thread fetches the next snapshot. Only a cold cache blocks,
+    and concurrent callers share that single fetch.
+
     Args:
         url: URL to fetch CSV from
         cache_key: Key for caching this data
@@ -39,6 +168,14 @@ def fetch_csv_data(url: str, cache_key: str) -> pd.DataFrame:
     config = load_config()
     refresh_minutes = config.get("refresh_rate_minutes", 15)
 
+    # Cold process: start from the persisted snapshot, if any
+    if cache_key not in _cache:
+        snapshot = _load_snapshot(url, cache_key)
+        if snapshot is not None:
+            _cache[cache_key] = snapshot
+            _bump_version(cache_key)
+            print(f"[Data Loader] Loaded {cache_key} snapshot from disk")
+
     # Check cache
     if cache_key in _cache:
         cached_data = _cache[cache_key]
@@ -47,27 +184,219 @@ def fetch_csv_data(url: str, cache_key: str) -> pd.DataFrame:
         # Return cached data if fresh enough
         if cache_age < timedelta(minutes=refresh_minutes):
             print(f"[Data Loader] Using cached {cache_key} (age: {cache_age.seconds}s)")
+            instrumentation.count("data_loader.cache_fresh")
             return cached_data["data"]
 
-    # Fetch fresh data
+        # Serve stale data and revalidate in the background
+        retry_at = cached_data.get("retry_at")
+        if retry_at is None or datetime.now() >= retry_at:
+            _start_refresh(url, cache_key)
+        print(f"[Data Loader] Serving stale {cache_key} while refreshing")
+        instrumentation.count("data_loader.cache_stale")
+        return cached_data["data"]
+
+    # Nothing cached yet, so wait for the (possibly shared) fetch
+    instrumentation.count("data_loader.cache_cold")
+    _start_refresh(url, cache_key).join()
+
+    if cache_key in _cache:
+        return _cache[cache_key]["data"]
+
+    error = _refresh_errors.get(cache_key)
+    print(f"[Data Loader] Fetch failed with no cache available: {error}")
+    raise error if error else RuntimeError(f"Failed to fetch {cache_key}")
+
+
+def seed_cache(cache_key: str, df: pd.DataFrame) -> None:
+    """
+    Installs a frame as fresh cached data without fetching, e.g. fixed rate
+    tables for benchmarks or offline runs. It is replaced by the next refresh.
+    """
+    _replace_entry(cache_key, {"data": df, "timestamp": datetime.now()})
+
+
+def _bump_version(cache_key: str) -> None:
+    _data_versions[cache_key] = _data_versions.get(cache_key, 0) + 1
+
+
+def _plain(value):
+    """Converts a frame cell to a plain Python value, None for missing"""
+    if pd.isna(value):
+        return None
+    return value.item() if hasattr(value, "item") else value
+
+
+def diff_snapshots(old: pd.DataFrame, new: pd.DataFrame) -> dict:
+    """
+    Compares two snapshots of a rate sheet row by row, matched by name.
+
+    Duplicate names keep their first row, like the name indexes.
+
+    Returns:
+        Dict with added and removed (names, in sheet order) and changes: one
+        dict with name, column, old and new per changed cell, in the new
+        sheet's row order
+    """
+    old_rows = old.drop_duplicates("name").set_index("name")
+    new_rows = new.drop_duplicates("name").set_index("name")
+    common = new_rows.index[new_rows.index.isin(old_rows.index)]
+    columns = list(dict.fromkeys(list(new_rows.columns) + list(old_rows.columns)))
+
+    changes = []
+    for column in columns:
+        missing = pd.Series(None, index=common, dtype=object)
+        before = old_rows[column].reindex(common) if column in old_rows else missing
+        after = new_rows[column].reindex(common) if column in new_rows else missing
+        same = (before == after) | (before.isna() & after.isna())
+        for name in common[~same.to_numpy(dtype=bool)]:
+            changes.append(
+                {
+                    "name": name,
+                    "column": column,
+                    "old": _plain(before[name]),
+                    "new": _plain(after[name]),
+                }
+            )
+    row_order = {name: i for i, name in enumerate(common)}
+    changes.sort(key=lambda change: row_order[change["name"]])
+
+    return {
+        "added": [n for n in new_rows.index if n not in old_rows.index],
+        "removed": [n for n in old_rows.index if n not in new_rows.index],
+        "changes": changes,
+    }
+
+
+def _replace_entry(cache_key: str, entry: dict) -> None:
+    """
+    Installs new data for a cache key, bumps its version and records the
+    change set against the data it replaces. Replacing the entry also drops
+    the stale name index.
+    """
+    previous = _cache.get(cache_key)
+    _cache[cache_key] = entry
+    _bump_version(cache_key)
+    if previous is None:
+        return
+
+    try:
+        change_set = diff_snapshots(previous["data"], entry["data"])
+    except Exception as e:
+        # Dependents see a gap in the history and treat everything as changed
+        print(f"[Data Loader] Could not diff {cache_key} snapshots: {e}")
+        return
+    change_set["sheet"] = cache_key
+    change_set["version"] = _data_versions[cache_key]
+    change_set["timestamp"] = entry["timestamp"]
+    history = _change_sets.setdefault(cache_key, [])
+    history.append(change_set)
+    del history[:-CHANGE_SET_HISTORY]
+
+
+def get_change_sets(cache_key: str, since_version: int) -> Optional[List[dict]]:
+    """
+    Returns the change sets a cache key went through after since_version.
+
+    Args:
+        cache_key: "materials" or "processes"
+        since_version: Version the caller last saw, from get_rates_version
+
+    Returns:
+        List of change sets (see diff_snapshots, plus sheet, version and
+        timestamp), oldest first and empty when nothing changed, or None when
+        some update has no change set (history trimmed, or data loaded
+        without a previous snapshot to compare with)
+    """
+    current = _data_versions.get(cache_key, 0)
+    history = [
+        change_set
+        for change_set in _change_sets.get(cache_key, [])
+        if change_set["version"] > since_version
+    ]
+    if [c["version"] for c in history] != list(range(since_version + 1, current + 1)):
+        return None
+    return history
+
+
+def get_rates_version() -> tuple:
+    """Returns a value that changes whenever materials or processes data changes"""
+    return (_data_versions.get("materials", 0), _data_versions.get("processes", 0))
+
+
+def wait_for_refresh(cache_key: str, timeout: Optional[float] = None) -> None:
+    """Blocks until any in-flight refresh for cache_key has finished"""
+    with _refresh_lock:
+        thread = _refresh_threads.get(cache_key)
+    if thread is not None:
+        thread.join(timeout)
+
+
+def _start_refresh(url: str, cache_key: str) -> threading.Thread:
+    """Starts a background refresh unless one is already running"""
+    with _refresh_lock:
+        thread = _refresh_threads.get(cache_key)
+        if thread is None or not thread.is_alive():
+            thread = threading.Thread(
+                target=_refresh,
+                args=(url, cache_key),
+                name=f"data-loader-{cache_key}",
+                daemon=True,
+            )
+            _refresh_threads[cache_key] = thread
+            thread.start()
+        return thread
+
+
+@instrumentation.timed("data_loader.refresh")
+def _refresh(url: str, cache_key: str) -> None:
+    cached_data = _cache.get(cache_key)
+    etag = cached_data.get("etag") if cached_data else None
+    last_modified = cached_data.get("last_modified") if cached_data else None
+
     try:
         print(f"[Data Loader] Fetching fresh {cache_key} from Google Sheets...")
-        df = pd.read_csv(url)
+        request = urllib.request.Request(url)
+        if cached_data is not None:
+            if etag:
+                request.add_header("If-None-Match", etag)
+            if last_modified:
+                request.add_header("If-Modified-Since", last_modified)
 
-        # Update cache
-        _cache[cache_key] = {"data": df, "timestamp": datetime.now()}
+        try:
+            with urllib.request.urlopen(request, timeout=FETCH_TIMEOUT_SECONDS) as resp:
+                body = resp.read()
+                etag = resp.headers.get("ETag")
+                last_modified = resp.headers.get("Last-Modified")
+        except urllib.error.HTTPError as e:
+            if e.code == 304 and cached_data is not None:
+                # Unchanged upstream: keep the parsed frame and its index
+                cached_data["timestamp"] = datetime.now()
+                cached_data.pop("retry_at", None)
+                _save_snapshot(url, cache_key, cached_data)
+                print(f"[Data Loader] {cache_key} not modified")
+                return
+            raise
+
+        df = pd.read_csv(io.BytesIO(body))
+
+        entry = {
+            "data": df,
+            "timestamp": datetime.now(),
+            "etag": etag,
+            "last_modified": last_modified,
+        }
+        _replace_entry(cache_key, entry)
+        _refresh_errors.pop(cache_key, None)
+        _save_snapshot(url, cache_key, entry)
 
         print(f"[Data Loader] Successfully loaded {len(df)} {cache_key} rows")
-        return df
 
     except Exception as e:
-        # If fetch fails and we have cached data, return it
-        if cache_key in _cache:
+        _refresh_errors[cache_key] = e
+        if cached_data is not None:
+            # Keep serving the stale snapshot and back off before retrying
+            cached_data["retry_at"] = datetime.now() + RETRY_DELAY
             print(f"[Data Loader] Fetch failed, using stale cached {cache_key}: {e}")
-            return _cache[cache_key]["data"]
-        else:
-            print(f"[Data Loader] Fetch failed with no cache available: {e}")
-            raise
 
 
 def get_materials() -> pd.DataFrame:
@@ -84,29 +413,110 @@ def get_processes() -> pd.DataFrame:
     return fetch_csv_data(url, "processes")
 
 
-def get_material_by_name(name: str) -> Optional[pd.Series]:
+def _optional_column(df: pd.DataFrame, column: str) -> list:
+    """Returns a numeric column as floats, with None where missing or blank"""
+    if column not in df.columns:
+        return [None] * len(df)
+    values = pd.to_numeric(df[column], errors="coerce")
+    return [None if pd.isna(v) else float(v) for v in values.tolist()]
+
+
+def _build_material_index(df: pd.DataFrame) -> Mapping[str, MaterialRecord]:
+    index: Dict[str, MaterialRecord] = {}
+    for name, density, cost_per_lb, price_spread in zip(
+        df["name"].tolist(),
+        df["density (lb/in^3)"].tolist(),
+        df["cost_per_lb"].tolist(),
+        _optional_column(df, "price_spread"),
+    ):
+        # Keep the first row for duplicate names, matching the old mask lookup
+        if name not in index:
+            index[name] = MaterialRecord(
+                name, float(density), float(cost_per_lb), price_spread
+            )
+    return MappingProxyType(index)
+
+
+def _build_process_index(df: pd.DataFrame) -> Mapping[str, ProcessRecord]:
+    n_rows = len(df)
+    categories = (
+        df["category"].tolist() if "category" in df.columns else [None] * n_rows
+    )
+    # Default to 60 if missing
+    run_times = (
+        df["run_time_mins"].tolist()
+        if "run_time_mins" in df.columns
+        else [60.0] * n_rows
+    )
+
+    index: Dict[str, ProcessRecord] = {}
+    for (
+        name,
+        category,
+        setup_mins,
+        hourly_rate,
+        run_mins,
+        time_spread,
+        rate_spread,
+    ) in zip(
+        df["name"].tolist(),
+        categories,
+        df["setup_time_mins"].tolist(),
+        df["hourly_rate"].tolist(),
+        run_times,
+        _optional_column(df, "time_spread"),
+        _optional_column(df, "rate_spread"),
+    ):
+        if name not in index:
+            index[name] = ProcessRecord(
+                name,
+                category,
+                float(setup_mins),
+                float(hourly_rate),
+                float(run_mins),
+                time_spread,
+                rate_spread,
+            )
+    return MappingProxyType(index)
+
+
+def _get_index(cache_key: str, build: Callable[[pd.DataFrame], Mapping]) -> Mapping:
+    """Returns the name index for a cached frame, building it once per refresh"""
+    entry = _cache[cache_key]
+    index = entry.get("index")
+    if index is None:
+        index = build(entry["data"])
+        entry["index"] = index
+    return index
+
+
+def get_material_index() -> Mapping[str, MaterialRecord]:
+    """Get a read-only name -> MaterialRecord mapping for the current snapshot"""
+    get_materials()
+    return _get_index("materials", _build_material_index)
+
+
+def get_process_index() -> Mapping[str, ProcessRecord]:
+    """Get a read-only name -> ProcessRecord mapping for the current snapshot"""
+    get_processes()
+    return _get_index("processes", _build_process_index)
+
+
+def get_material_by_name(name: str) -> Optional[MaterialRecord]:
     """
     Get a specific material by name.
 
     Returns:
-        Series with material data or None if not found
+        MaterialRecord or None if not found
     """
-    materials = get_materials()
-    result = materials[materials["name"] == name]
-    if len(result) > 0:
-        return result.iloc[0]
-    return None
+    return get_material_index().get(name)
 
 
-def get_process_by_name(name: str) -> Optional[pd.Series]:
+def get_process_by_name(name: str) -> Optional[ProcessRecord]:
     """
     Get a specific process by name.
 
     Returns:
-        Series with process data or None if not found
+        ProcessRecord or None if not found
     """
-    processes = get_processes()
-    result = processes[processes["name"] == name]
-    if len(result) > 0:
-        return result.iloc[0]
-    return None
+    return get_process_index().get(name)
@@ -0,0 +1,212 @@
+"""
+Geometry feature recognition for QuoteForge.
+Derives the manufacturing features that drive run-time estimates (holes,
+cut profile length, bends, stock envelope and removed volume) from a loaded
+GeometryAnalyzer. Extraction walks each face once using analytic surface
+data, so it adds milliseconds to an analysis; results are stored with the
+analysis in the geometry cache, keyed by file hash.
+
+All lengths are in inches, areas in square inches and volumes in cubic
+inches, matching the rest of the costing inputs.
+"""
+
+import math
+
+import cadquery as cq  # type: ignore
+from OCP.BRepAdaptor import BRepAdaptor_Surface  # type: ignore
+from OCP.GeomAbs import GeomAbs_Cylinder, GeomAbs_Plane  # type: ignore
+from OCP.TopAbs import TopAbs_REVERSED  # type: ignore
+from OCP.gp import gp_Pnt, gp_Vec  # type: ignore
+
+MM_PER_IN = 25.4
+
+# Coaxial cylinder faces (e.g. the two halves OCCT splits a hole into) are
+# grouped by axis and radius rounded to this many millimeter decimals
+AXIS_DECIMALS = 2
+
+# Bend pairs: inner and outer radius differ by the sheet thickness within this
+BEND_THICKNESS_TOLERANCE = 0.1
+
+# A cylinder axis runs along a bounding box side when their directions'
+# dot product is at least this
+AXIS_ALIGNMENT = 0.99
+
+
+def _surface_frame(face):
+    """Returns (adaptor, point, outward normal) at the face's UV midpoint"""
+    adaptor = BRepAdaptor_Surface(face.wrapped)
+    u = (adaptor.FirstUParameter() + adaptor.LastUParameter()) / 2
+    v = (adaptor.FirstVParameter() + adaptor.LastVParameter()) / 2
+    point, du, dv = gp_Pnt(), gp_Vec(), gp_Vec()
+    adaptor.D1(u, v, point, du, dv)
+    normal = du.Crossed(dv)
+    if face.wrapped.Orientation() == TopAbs_REVERSED:
+        normal.Reverse()
+    return adaptor, point, normal
+
+
+def _axis_key(axis, radius):
+    """Identifies a cylinder by its axis line and radius, independent of sign"""
+    direction = axis.Direction()
+    d = [direction.X(), direction.Y(), direction.Z()]
+    # Canonical sign so opposite directions map to the same line
+    for component in d:
+        if abs(component) > 1e-9:
+            if component < 0:
+                d = [-c for c in d]
+            break
+    location = axis.Location()
+    p = [location.X(), location.Y(), location.Z()]
+    along = sum(pc * dc for pc, dc in zip(p, d))
+    # Point on the axis closest to the origin
+    foot = [pc - along * dc for pc, dc in zip(p, d)]
+    line = tuple(round(c, AXIS_DECIMALS) + 0.0 for c in d + foot)
+    return line, round(radius, AXIS_DECIMALS)
+
+
+def extract_features(analyzer):
+    """
+    Recognizes manufacturing features on an analyzer's shape.
+
+    Returns:
+        Dict with hole_count, hole_diameters_in, cut_length_in, pierce_count,
+        bend_count, stock_envelope_in (largest first), stock_volume_in3,
+        volume_in3, removed_volume_in3, removed_fraction, surface_area_in2,
+        face_count and turned_area_fraction (share of the surface around
+        the turning axis on its largest group of coaxial convex cylinders,
+        0.0 when there is none)
+    """
+    shape = cq.Compound.makeCompound(
+        [v for v in analyzer.shape.vals() if isinstance(v, cq.Shape)]
+    )
+    metrics = analyzer.metrics()
+    envelope_in = sorted(metrics.bounding_box_in, reverse=True)
+    # Wall thickness of a thin part: its area is about twice one side's, so
+    # volume / (area / 2). Works for bent sheet, unlike the bounding box.
+    thickness_mm = (
+        2 * metrics.volume_in3 / metrics.surface_area_in2 * MM_PER_IN
+        if metrics.surface_area_in2
+        else 0.0
+    )
+
+    # Thin axis of the bounding box, in model coordinates
+    bbox = metrics.bounding_box_in
+    thin_axis = [0.0, 0.0, 0.0]
+    thin_axis[list(bbox).index(min(bbox))] = 1.0
+    # Turning axis: the envelope side across which the section is round, as
+    # in nesting.choose_stock. That is the long side of a bar or shaft, and
+    # the thin side of a disc or flange.
+    long_axis, middle_axis, short_axis = sorted(
+        range(3), key=lambda k: bbox[k], reverse=True
+    )
+    if bbox[long_axis] - bbox[middle_axis] < bbox[middle_axis] - bbox[short_axis]:
+        turning_axis = short_axis
+    else:
+        turning_axis = long_axis
+
+    # Concave cylinder groups -> swept angle; a hole sweeps the full circle
+    concave_sweep = {}
+    convex_cylinders = {}
+    concave_cylinders = {}
+    # Convex cylinder area per axis line along the turning axis, and the area
+    # of the flat ends facing along it
+    turned_area_mm2 = {}
+    end_area_mm2 = 0.0
+    profile_face = None
+    profile_area = 0.0
+    face_count = 0
+
+    for face in shape.Faces():
+        face_count += 1
+        adaptor, point, normal = _surface_frame(face)
+        surface_type = adaptor.GetType()
+
+        if surface_type == GeomAbs_Cylinder:
+            cylinder = adaptor.Cylinder()
+            axis = cylinder.Axis()
+            location = axis.Location()
+            direction = gp_Vec(axis.Direction())
+            radial = gp_Vec(location, point)
+            radial.Subtract(direction.Multiplied(radial.Dot(direction)))
+            key = _axis_key(axis, cylinder.Radius())
+            # A normal pointing at the axis means material surrounds the face
+            if normal.Dot(radial) < 0:
+                sweep = adaptor.LastUParameter() - adaptor.FirstUParameter()
+                concave_sweep[key] = concave_sweep.get(key, 0.0) + sweep
+                concave_cylinders.setdefault(key[0], set()).add(key[1])
+            else:
+                convex_cylinders.setdefault(key[0], set()).add(key[1])
+                if abs(key[0][turning_axis]) >= AXIS_ALIGNMENT:
+                    turned_area_mm2[key[0]] = (
+                        turned_area_mm2.get(key[0], 0.0) + face.Area()
+                    )
+
+        elif surface_type == GeomAbs_Plane:
+            plane_normal = adaptor.Plane().Axis().Direction()
+            components = (plane_normal.X(), plane_normal.Y(), plane_normal.Z())
+            if abs(components[turning_axis]) >= AXIS_ALIGNMENT:
+                end_area_mm2 += face.Area()
+            alignment = abs(
+                plane_normal.X() * thin_axis[0]
+                + plane_normal.Y() * thin_axis[1]
+                + plane_normal.Z() * thin_axis[2]
+            )
+            if alignment > 0.99:
+                area = face.Area()
+                if area > profile_area:
+                    profile_face, profile_area = face, area
+
+    # Bends: coaxial concave/convex radii one sheet thickness apart
+    bends = set()
+    for line, inner_radii in concave_cylinders.items():
+        outer_radii = convex_cylinders.get(line, ())
+        for inner in inner_radii:
+            if any(
+                abs((outer - inner) - thickness_mm)
+                <= thickness_mm * BEND_THICKNESS_TOLERANCE
+                for outer in outer_radii
+            ):
+                bends.add((line, inner))
+    bend_count = len(bends)
+
+    # Full-circle concave cylinders are holes; partial ones are fillets or slots
+    hole_radii = [
+        key[1]
+        for key, sweep in concave_sweep.items()
+        if sweep >= 2 * math.pi * 0.99 and key not in bends
+    ]
+
+    cut_length_mm = 0.0
+    pierce_count = 0
+    if profile_face is not None:
+        cut_length_mm = sum(edge.Length() for edge in profile_face.Edges())
+        pierce_count = 1 + len(profile_face.innerWires())
+
+    stock_volume_in3 = math.prod(envelope_in)
+    # Faces and shoulders are turned too, so only the surface around the
+    # axis is compared; otherwise thin discs could never qualify
+    around_area_mm2 = metrics.surface_area_in2 * MM_PER_IN**2 - end_area_mm2
+    turned_area_fraction = (
+        min(1.0, max(turned_area_mm2.values()) / around_area_mm2)
+        if turned_area_mm2 and around_area_mm2 > 0
+        else 0.0
+    )
+    removed_volume_in3 = max(0.0, stock_volume_in3 - metrics.volume_in3)
+
+    return {
+        "hole_count": len(hole_radii),
+        "hole_diameters_in": sorted(2 * r / MM_PER_IN for r in hole_radii),
+        "cut_length_in": cut_length_mm / MM_PER_IN,
+        "pierce_count": pierce_count,
+        "bend_count": bend_count,
+        "stock_envelope_in": envelope_in,
+        "stock_volume_in3": stock_volume_in3,
+        "volume_in3": metrics.volume_in3,
+        "removed_volume_in3": removed_volume_in3,
+        "removed_fraction": (
+            removed_volume_in3 / stock_volume_in3 if stock_volume_in3 else 0.0
+        ),
+        "surface_area_in2": metrics.surface_area_in2,
+        "face_count": face_count,
+        "turned_area_fraction": turned_area_fraction,
+    }
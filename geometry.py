@@ -6,88 +6,529 @@ except ImportError as e:
     print(f"DEBUG: Failed to import cadquery in geometry.py: {e}")
     print(f"DEBUG: sys.path: {sys.path}")
     raise e
-import tempfile
+from OCP.GProp import GProp_GProps  # type: ignore
+from OCP.BRepGProp import BRepGProp  # type: ignore
+from OCP.Bnd import Bnd_Box  # type: ignore
+from OCP.BRepBndLib import BRepBndLib  # type: ignore
+from OCP.BRepTools import BRepTools  # type: ignore
+from cadquery.occ_impl.exporters.svg import getSVG  # type: ignore
 import os
+import re
+import time
+from collections import OrderedDict
+import multiprocessing
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+import data_loader
+import features
+import mesh
+from utils import instrumentation
+from utils.cache import DiskCache, file_sha256
+
+# Bump when the shape of cached analysis results changes
+GEOMETRY_CACHE_VERSION = 4
+
+_geometry_cache = None
+_mesh_store = None
+
+# Background analyses by path; finished futures stay until collected
+_background_jobs = {}
+_background_lock = threading.Lock()
+
+# Camera presets for thumbnails: projection direction plus an in-plane rotation
+# (degrees about the projection direction) applied to a copy of the shape
+THUMBNAIL_VIEWS = {
+    "iso": {"projection_dir": (1, -1, 1), "rotation": -60},
+    "top": {"projection_dir": (0, 0, 1), "rotation": 0},
+    "front": {"projection_dir": (0, -1, 0), "rotation": 0},
+    "right": {"projection_dir": (1, 0, 0), "rotation": 0},
+}
+
+# Projections are rendered once at this size; other sizes rescale via viewBox
+THUMBNAIL_BASE_SIZE = 200
+
+# In-memory thumbnail cache keyed by (file hash, view, size)
+_thumbnail_cache = OrderedDict()
+_THUMBNAIL_CACHE_MAX_ENTRIES = 512
+
+
+MM3_PER_IN3 = 16387.064
+MM2_PER_IN2 = 645.16
+MM_PER_IN = 25.4
+
+
+class MassProperties:
+    """Mass properties of a part in inch units, computed in a single pass"""
+
+    __slots__ = (
+        "volume_in3",
+        "surface_area_in2",
+        "bounding_box_in",
+        "centroid_in",
+        "inertia_in5",
+    )
+
+    def __init__(
+        self, volume_in3, surface_area_in2, bounding_box_in, centroid_in, inertia_in5
+    ):
+        self.volume_in3 = volume_in3
+        self.surface_area_in2 = surface_area_in2
+        # (dx, dy, dz)
+        self.bounding_box_in = bounding_box_in
+        # (x, y, z)
+        self.centroid_in = centroid_in
+        # 3x3 matrix of inertia about the centroid for unit density
+        self.inertia_in5 = inertia_in5
+
+    @classmethod
+    def empty(cls):
+        zero3 = (0.0, 0.0, 0.0)
+        return cls(0.0, 0.0, zero3, zero3, (zero3, zero3, zero3))
+
+    def mass(self, density_lbs_in3):
+        """Returns mass in lbs"""
+        return self.volume_in3 * density_lbs_in3
 
 
 class GeometryAnalyzer:
     def __init__(self, step_file_path):
         self.file_path = step_file_path
         self.shape = None
+        self._metrics = None
+        self._file_hash = None
         self._load_file()
 
+    @instrumentation.timed("geometry.load_file")
     def _load_file(self):
         try:
             self.shape = cq.importers.importStep(self.file_path)
         except Exception as e:
             raise ValueError(f"Failed to load STEP file: {e}")
 
+    def metrics(self):
+        """
+        Computes volume, surface area, bounding box, centroid and inertia
+        in one pass over the B-rep and memoizes the result.
+
+        Returns:
+            MassProperties in inch units (assuming file is in mm)
+        """
+        if self._metrics is not None:
+            return self._metrics
+
+        if not self.shape:
+            self._metrics = MassProperties.empty()
+            return self._metrics
+
+        wrapped = self.shape.val().wrapped
+
+        volume_props = GProp_GProps()
+        BRepGProp.VolumeProperties_s(wrapped, volume_props)
+        surface_props = GProp_GProps()
+        BRepGProp.SurfaceProperties_s(wrapped, surface_props)
+
+        bbox = Bnd_Box()
+        BRepBndLib.AddOptimal_s(wrapped, bbox)
+        xmin, ymin, zmin, xmax, ymax, zmax = bbox.Get()
+
+        center = volume_props.CentreOfMass()
+        inertia = volume_props.MatrixOfInertia()
+        mm5_per_in5 = MM_PER_IN**5
+
+        self._metrics = MassProperties(
+            volume_in3=volume_props.Mass() / MM3_PER_IN3,
+            surface_area_in2=surface_props.Mass() / MM2_PER_IN2,
+            bounding_box_in=(
+                (xmax - xmin) / MM_PER_IN,
+                (ymax - ymin) / MM_PER_IN,
+                (zmax - zmin) / MM_PER_IN,
+            ),
+            centroid_in=(
+                center.X() / MM_PER_IN,
+                center.Y() / MM_PER_IN,
+                center.Z() / MM_PER_IN,
+            ),
+            inertia_in5=tuple(
+                tuple(inertia.Value(row, col) / mm5_per_in5 for col in (1, 2, 3))
+                for row in (1, 2, 3)
+            ),
+        )
+        return self._metrics
+
     def get_volume(self):
         """Returns volume in cubic inches (assuming file is in mm)"""
-        # 1 cubic inch = 16387.064 mm^3
-        if self.shape:
-            return self.shape.val().Volume() / 16387.064
-        return 0.0
+        return self.metrics().volume_in3
 
     def get_bounding_box(self):
         """Returns (dx, dy, dz) in inches (assuming file is in mm)"""
-        if self.shape:
-            bb = self.shape.val().BoundingBox()
-            return (bb.xlen / 25.4, bb.ylen / 25.4, bb.zlen / 25.4)
-        return (0.0, 0.0, 0.0)
+        return self.metrics().bounding_box_in
 
     def get_surface_area(self):
         """Returns surface area in square inches (assuming file is in mm)"""
-        # 1 square inch = 645.16 mm^2
-        if self.shape:
-            return self.shape.val().Area() / 645.16
-        return 0.0
+        return self.metrics().surface_area_in2
 
     def get_mass(self, density_lbs_in3):
         """Returns mass in lbs"""
-        volume_in3 = self.get_volume()
-        return volume_in3 * density_lbs_in3
-
-    def export_stl(self):
-        """Exports to a temporary STL file for visualization"""
-        if self.shape:
-            with tempfile.NamedTemporaryFile(suffix=".stl", delete=False) as tmp:
-                cq.exporters.export(self.shape, tmp.name)
-                return tmp.name
-        return None
-
-    def get_thumbnail_svg(self):
+        return self.metrics().mass(density_lbs_in3)
+
+    def export_stl(self, output, lod="fine"):
+        """
+        Writes a binary STL of the part (millimeters) from the mesh store.
+
+        Args:
+            output: File path or binary file-like object
+            lod: Level of detail from mesh.LOD_TOLERANCES
+        """
+        mesh.write_stl(self.get_mesh(lod), output)
+
+    def get_mesh(self, lod=mesh.PREVIEW_LOD):
+        """Returns the mesh for a level of detail, tessellating only on a store miss"""
+        store = get_mesh_store()
+        cached = store.get(self.file_hash, lod)
+        if cached is not None:
+            return cached
+        part_mesh = self.tessellate(lod)
+        store.put(self.file_hash, lod, part_mesh)
+        return part_mesh
+
+    @instrumentation.timed("geometry.tessellate")
+    def tessellate(self, lod):
+        """Triangulates the shape at a level of detail, bypassing the store"""
+        if lod not in mesh.LOD_TOLERANCES:
+            raise ValueError(f"Unknown level of detail: {lod}")
+        tolerance, angular_tolerance = mesh.LOD_TOLERANCES[lod]
+
+        shape = cq.Compound.makeCompound(
+            [v for v in self.shape.vals() if isinstance(v, cq.Shape)]
+        )
+        # OCCT keeps an existing finer triangulation, so drop it to get this LOD
+        BRepTools.Clean_s(shape.wrapped)
+        vertices, triangles = shape.tessellate(tolerance, angular_tolerance)
+        return mesh.mesh_from_tessellation(vertices, triangles)
+
+    @property
+    def file_hash(self):
+        """SHA-256 of the STEP file contents"""
+        if self._file_hash is None:
+            self._file_hash = file_sha256(self.file_path)
+        return self._file_hash
+
+    @instrumentation.timed("geometry.thumbnail_svg")
+    def get_thumbnail_svg(self, view="iso", size=THUMBNAIL_BASE_SIZE):
         """Generates an SVG thumbnail and returns the content as a string"""
-        if self.shape:
-            # Define the view vector
-            view_vector = (1, -1, 1)
-
-            # Rotate the geometry
-            # we rotate the object around teh view vector
-            angle_degrees = -60
-
-            # rotate the geometry
-            self.shape = self.shape.rotate((0, 0, 0), view_vector, angle_degrees)
-            with tempfile.NamedTemporaryFile(suffix=".svg", delete=False) as tmp:
-                cq.exporters.export(
-                    self.shape,
-                    tmp.name,
-                    opt={
-                        "width": 200,
-                        "height": 200,
-                        "marginLeft": 2,
-                        "marginTop": 2,
-                        "showAxes": False,
-                        "projectionDir": view_vector,
-                        "strokeWidth": 1,
-                        "strokeColor": (255, 255, 255),
-                        "hiddenColor": (150, 150, 150),
-                        "showHidden": False,
-                    },
-                )
-                tmp.close()
-                with open(tmp.name, "r") as f:
-                    svg_content = f.read()
-                os.unlink(tmp.name)
-                return svg_content
-        return None
+        return self.get_thumbnails(views=(view,), sizes=(size,)).get((view, size))
+
+    def get_thumbnails(self, views=("iso",), sizes=(THUMBNAIL_BASE_SIZE,)):
+        """
+        Renders thumbnails for several views and sizes.
+
+        Each view is projected once; every requested size is derived from that
+        projection. The analyzer's shape is never modified.
+
+        Args:
+            views: Names from THUMBNAIL_VIEWS
+            sizes: Square pixel sizes
+
+        Returns:
+            Dict mapping (view, size) to SVG content
+        """
+        if not self.shape:
+            return {}
+
+        thumbnails = {}
+        for view in views:
+            if view not in THUMBNAIL_VIEWS:
+                raise ValueError(f"Unknown thumbnail view: {view}")
+
+            missing = []
+            for size in sizes:
+                cached = _thumbnail_cache.get((self.file_hash, view, size))
+                if cached is not None:
+                    _thumbnail_cache.move_to_end((self.file_hash, view, size))
+                    thumbnails[(view, size)] = cached
+                else:
+                    missing.append(size)
+
+            if not missing:
+                continue
+
+            base_svg = self._render_view(view)
+            for size in missing:
+                svg_content = _resize_svg(base_svg, size)
+                _remember_thumbnail((self.file_hash, view, size), svg_content)
+                thumbnails[(view, size)] = svg_content
+
+        return thumbnails
+
+    def _render_view(self, view):
+        preset = THUMBNAIL_VIEWS[view]
+        view_vector = preset["projection_dir"]
+
+        shape = cq.Compound.makeCompound(
+            [v for v in self.shape.vals() if isinstance(v, cq.Shape)]
+        )
+        if preset["rotation"]:
+            # rotate a copy of the geometry around the view vector
+            shape = shape.rotate(
+                cq.Vector(0, 0, 0), cq.Vector(*view_vector), preset["rotation"]
+            )
+
+        return getSVG(
+            shape,
+            opts={
+                "width": THUMBNAIL_BASE_SIZE,
+                "height": THUMBNAIL_BASE_SIZE,
+                "marginLeft": 2,
+                "marginTop": 2,
+                "showAxes": False,
+                "projectionDir": view_vector,
+                "strokeWidth": 1,
+                "strokeColor": (255, 255, 255),
+                "hiddenColor": (150, 150, 150),
+                "showHidden": False,
+            },
+        )
+
+
+def _resize_svg(svg_content, size):
+    """Rescales a base-size thumbnail by rewriting the root element's viewport"""
+    if size == THUMBNAIL_BASE_SIZE:
+        return svg_content
+    return re.sub(
+        r'width="[^"]*"\s+height="[^"]*"',
+        f'width="{float(size)}" height="{float(size)}" '
+        f'viewBox="0 0 {THUMBNAIL_BASE_SIZE} {THUMBNAIL_BASE_SIZE}"',
+        svg_content,
+        count=1,
+    )
+
+
+def _remember_thumbnail(key, svg_content):
+    _thumbnail_cache[key] = svg_content
+    _thumbnail_cache.move_to_end(key)
+    while len(_thumbnail_cache) > _THUMBNAIL_CACHE_MAX_ENTRIES:
+        _thumbnail_cache.popitem(last=False)
+
+
+def get_geometry_cache():
+    """Returns the shared on-disk cache for geometry analysis results"""
+    global _geometry_cache
+    if _geometry_cache is None:
+        cache_config = data_loader.load_config().get("cache", {})
+        max_bytes = int(cache_config.get("max_size_mb", 256) * 1024 * 1024)
+        _geometry_cache = DiskCache(data_loader.get_cache_dir("geometry"), max_bytes)
+    return _geometry_cache
+
+
+def get_mesh_store():
+    """Returns the shared on-disk store for tessellated meshes"""
+    global _mesh_store
+    if _mesh_store is None:
+        cache_config = data_loader.load_config().get("cache", {})
+        max_bytes = int(cache_config.get("mesh_max_size_mb", 512) * 1024 * 1024)
+        _mesh_store = mesh.MeshStore(data_loader.get_cache_dir("meshes"), max_bytes)
+    return _mesh_store
+
+
+def get_mesh(file_path, lod=mesh.PREVIEW_LOD):
+    """
+    Returns a part's mesh, loading the STEP file only when the store has no
+    mesh for this file's contents at that level of detail.
+    """
+    cached = get_mesh_store().get(file_sha256(file_path), lod)
+    if cached is not None:
+        return cached
+    return GeometryAnalyzer(file_path).get_mesh(lod)
+
+
+def analyze_file(file_path, use_cache=True):
+    """
+    Analyzes a STEP file, reusing cached results for identical file contents.
+
+    Args:
+        file_path: Path to the STEP file
+        use_cache: Skip the on-disk cache lookup when False
+
+    Returns:
+        Dict with volume_in3, bounding_box_in, surface_area_in2, thumbnail_svg,
+        features (see features.extract_features, None if recognition failed)
+        and the file_hash the result is stored under
+    """
+    file_hash = file_sha256(file_path)
+    cache_key = f"{file_hash}-v{GEOMETRY_CACHE_VERSION}"
+    cache = get_geometry_cache()
+
+    if use_cache:
+        cached = cache.get(cache_key)
+        if cached is not None:
+            instrumentation.count("geometry.cache_hit")
+            return cached
+    instrumentation.count("geometry.cache_miss")
+
+    analyzer = GeometryAnalyzer(file_path)
+    metrics = analyzer.metrics()
+    result = {
+        "file_hash": file_hash,
+        "volume_in3": metrics.volume_in3,
+        "bounding_box_in": list(metrics.bounding_box_in),
+        "surface_area_in2": metrics.surface_area_in2,
+        "thumbnail_svg": analyzer.get_thumbnail_svg(),
+        "features": None,
+    }
+    try:
+        with instrumentation.span("geometry.features"):
+            result["features"] = features.extract_features(analyzer)
+    except Exception as e:
+        print(f"Feature recognition failed for {file_path}: {e}")
+    # The preview mesh is cheap while the shape is loaded, so it is ready
+    # before anyone asks for it
+    try:
+        analyzer.get_mesh(mesh.PREVIEW_LOD)
+    except Exception as e:
+        print(f"Preview mesh failed for {file_path}: {e}")
+    cache.put(cache_key, result)
+    return result
+
+
+def _analyze_worker(file_path):
+    """Process pool entry point; runs in a fresh interpreter"""
+    return analyze_file(file_path)
+
+
+@instrumentation.timed("geometry.analyze_many")
+def analyze_many(file_paths, workers=None, timeout=120):
+    """
+    Analyzes several STEP files in parallel worker processes.
+
+    Files already in the geometry cache are served without starting a worker.
+    A failure or timeout in one file does not affect the others.
+
+    Args:
+        file_paths: Iterable of STEP file paths
+        workers: Number of worker processes (defaults to the CPU count)
+        timeout: Seconds a single file may run before it is abandoned
+
+    Returns:
+        Dict mapping each path to its analyze_file result, or to
+        {"error": message} if that file failed
+    """
+    results = {}
+    pending_paths = []
+    cache = get_geometry_cache()
+
+    for path in dict.fromkeys(file_paths):
+        try:
+            cache_key = f"{file_sha256(path)}-v{GEOMETRY_CACHE_VERSION}"
+        except OSError as e:
+            results[path] = {"error": f"Failed to read file: {e}"}
+            continue
+        cached = cache.get(cache_key)
+        if cached is not None:
+            instrumentation.count("geometry.cache_hit")
+            results[path] = cached
+        else:
+            instrumentation.count("geometry.cache_miss")
+            pending_paths.append(path)
+
+    if not pending_paths:
+        return results
+
+    workers = workers or os.cpu_count() or 1
+    workers = max(1, min(workers, len(pending_paths)))
+
+    # Only `workers` files are submitted at a time so each timeout clock
+    # starts when the file actually begins running
+    queue = list(pending_paths)
+    in_flight = {}
+    executor = _new_analysis_executor(workers)
+
+    try:
+        while queue or in_flight:
+            while queue and len(in_flight) < workers:
+                path = queue.pop(0)
+                future = executor.submit(_analyze_worker, path)
+                in_flight[future] = (path, time.monotonic())
+
+            done, _ = wait(in_flight, timeout=0.5, return_when=FIRST_COMPLETED)
+            for future in done:
+                path, _ = in_flight.pop(future)
+                try:
+                    results[path] = future.result()
+                except Exception as e:
+                    results[path] = {"error": str(e)}
+
+            now = time.monotonic()
+            expired = [f for f, (_, t) in in_flight.items() if now - t > timeout]
+            if expired:
+                for future in expired:
+                    path, _ = in_flight.pop(future)
+                    results[path] = {"error": f"Analysis timed out after {timeout}s"}
+
+                # Stuck OCC calls cannot be interrupted, so the pool is replaced
+                # and any other in-flight files are retried on the new one
+                queue = [path for path, _ in in_flight.values()] + queue
+                in_flight.clear()
+                _terminate_executor(executor)
+                executor = _new_analysis_executor(workers)
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    return results
+
+
+def analyze_in_background(file_paths, workers=None, timeout=600):
+    """
+    Starts analyze_many on a background thread so large files do not block
+    the caller. Paths already queued are skipped. Collect results with
+    background_result.
+    """
+    with _background_lock:
+        paths = [p for p in dict.fromkeys(file_paths) if p not in _background_jobs]
+        futures = {path: Future() for path in paths}
+        _background_jobs.update(futures)
+    if not paths:
+        return
+
+    def run():
+        try:
+            results = analyze_many(paths, workers=workers, timeout=timeout)
+        except Exception as e:
+            results = {path: {"error": str(e)} for path in paths}
+        for path, future in futures.items():
+            future.set_result(results.get(path, {"error": "not analyzed"}))
+
+    threading.Thread(target=run, name="geometry-background", daemon=True).start()
+
+
+def background_pending(file_path):
+    """True while a background analysis of file_path is still running"""
+    future = _background_jobs.get(file_path)
+    return future is not None and not future.done()
+
+
+def background_result(file_path):
+    """
+    Returns and forgets the finished background result for file_path
+    (analyze_many shaped), or None if it is still running or was never queued.
+    """
+    with _background_lock:
+        future = _background_jobs.get(file_path)
+        if future is None or not future.done():
+            return None
+        del _background_jobs[file_path]
+    return future.result()
+
+
+def _new_analysis_executor(workers):
+    # spawn avoids forking a process that already holds Streamlit/OCC threads
+    return ProcessPoolExecutor(
+        max_workers=workers, mp_context=multiprocessing.get_context("spawn")
+    )
+
+
+def _terminate_executor(executor):
+    processes = getattr(executor, "_processes", None) or {}
+    for process in list(processes.values()):
+        process.terminate()
+    executor.shutdown(wait=False, cancel_futures=True)
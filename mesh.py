@@ -0,0 +1,197 @@
+"""
+Mesh storage for QuoteForge.
+Tessellated meshes are kept as NumPy vertex/face arrays on disk, one pair of
+``.npy`` files per file hash and level of detail, and are memory-mapped on
+read so serving a cached mesh costs no parsing and little memory.
+Coordinates are in millimeters, the unit OCCT imports STEP geometry in.
+"""
+
+import os
+import tempfile
+import time
+from typing import Dict, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+# Bump when the stored array layout or tessellation settings change
+MESH_CACHE_VERSION = 1
+
+# Level of detail -> (linear tolerance in mm, angular tolerance in radians)
+LOD_TOLERANCES: Dict[str, Tuple[float, float]] = {
+    "coarse": (0.5, 0.5),
+    "medium": (0.1, 0.3),
+    "fine": (0.01, 0.1),
+}
+
+PREVIEW_LOD = "coarse"
+
+# Temp files older than this are leftovers from an interrupted write
+STALE_TEMP_SECONDS = 3600
+
+
+class Mesh(NamedTuple):
+    """Triangle mesh: float32 (N, 3) vertices and uint32 (M, 3) vertex indices"""
+
+    vertices: np.ndarray
+    faces: np.ndarray
+
+
+def mesh_from_tessellation(vertices, triangles) -> Mesh:
+    """Converts CadQuery tessellate() output (Vectors, index tuples) to arrays"""
+    vertex_array = np.array([v.toTuple() for v in vertices], dtype=np.float32)
+    face_array = np.array(triangles, dtype=np.uint32)
+    return Mesh(vertex_array.reshape(-1, 3), face_array.reshape(-1, 3))
+
+
+def write_stl(mesh: Mesh, output) -> None:
+    """
+    Writes a binary STL.
+
+    Args:
+        mesh: Mesh to write
+        output: File path or binary file-like object
+    """
+    triangles = mesh.vertices[mesh.faces].astype(np.float32)
+    normals = np.cross(
+        triangles[:, 1] - triangles[:, 0], triangles[:, 2] - triangles[:, 0]
+    )
+    lengths = np.linalg.norm(normals, axis=1, keepdims=True)
+    normals = np.divide(normals, lengths, out=np.zeros_like(normals), where=lengths > 0)
+
+    records = np.zeros(
+        len(triangles),
+        dtype=[("normal", "<f4", (3,)), ("vertices", "<f4", (3, 3)), ("attr", "<u2")],
+    )
+    records["normal"] = normals
+    records["vertices"] = triangles
+
+    header = b"QuoteForge mesh".ljust(80, b"\0")
+    if isinstance(output, (str, os.PathLike)):
+        with open(output, "wb") as f:
+            _write_stl_records(f, header, records)
+    else:
+        _write_stl_records(output, header, records)
+
+
+def _write_stl_records(fh, header, records):
+    fh.write(header)
+    fh.write(np.uint32(len(records)).tobytes())
+    fh.write(records.tobytes())
+
+
+class MeshStore:
+    """
+    Size-bounded store of meshes keyed by file hash and level of detail.
+
+    Each mesh is ``<key>.vertices.npy`` plus ``<key>.faces.npy`` inside
+    ``directory``. Reads memory-map the arrays and refresh their modification
+    time; writes evict the least recently used meshes once the directory grows
+    past ``max_bytes``. Leftover temp files from interrupted writes are
+    removed when the store is opened.
+    """
+
+    ARRAYS = ("vertices", "faces")
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(self.directory, exist_ok=True)
+        self._remove_stale_temp_files()
+
+    def _key(self, file_hash: str, lod: str) -> str:
+        return f"{file_hash}-{lod}-v{MESH_CACHE_VERSION}"
+
+    def _array_path(self, key: str, array: str) -> str:
+        return os.path.join(self.directory, f"{key}.{array}.npy")
+
+    def get(self, file_hash: str, lod: str) -> Optional[Mesh]:
+        """Returns the memory-mapped mesh or None on a miss"""
+        key = self._key(file_hash, lod)
+        arrays = []
+        for array in self.ARRAYS:
+            path = self._array_path(key, array)
+            try:
+                arrays.append(np.load(path, mmap_mode="r"))
+            except (OSError, ValueError):
+                return None
+
+        # Mark as recently used for LRU eviction
+        for array in self.ARRAYS:
+            try:
+                os.utime(self._array_path(key, array), None)
+            except OSError:
+                pass
+        return Mesh(*arrays)
+
+    def put(self, file_hash: str, lod: str, mesh: Mesh) -> None:
+        """Stores a mesh, then trims the store to its size bound"""
+        key = self._key(file_hash, lod)
+        # Faces are written last so a reader never pairs new vertices with
+        # missing faces; a half-written pair simply reads as a miss
+        for array, values in zip(self.ARRAYS, mesh):
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    np.save(f, np.ascontiguousarray(values))
+                os.replace(tmp_path, self._array_path(key, array))
+            except Exception:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+
+        self._evict()
+
+    def clear(self) -> None:
+        """Removes every stored mesh"""
+        for name in os.listdir(self.directory):
+            if name.endswith((".npy", ".tmp")):
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                except OSError:
+                    pass
+
+    def _remove_stale_temp_files(self) -> None:
+        cutoff = time.time() - STALE_TEMP_SECONDS
+        for name in os.listdir(self.directory):
+            if not name.endswith(".tmp"):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                if os.stat(path).st_mtime < cutoff:
+                    os.remove(path)
+            except OSError:
+                pass
+
+    def _evict(self) -> None:
+        # Group both arrays of a mesh so they are evicted together
+        meshes: Dict[str, list] = {}
+        total_bytes = 0
+        for name in os.listdir(self.directory):
+            if not name.endswith(".npy"):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            key = name.split(".", 1)[0]
+            entry = meshes.setdefault(key, [0.0, 0, []])
+            entry[0] = max(entry[0], stat.st_mtime)
+            entry[1] += stat.st_size
+            entry[2].append(path)
+            total_bytes += stat.st_size
+
+        if total_bytes <= self.max_bytes:
+            return
+
+        # Oldest first
+        for _, size, paths in sorted(meshes.values()):
+            if total_bytes <= self.max_bytes:
+                break
+            try:
+                for path in paths:
+                    os.remove(path)
+                total_bytes -= size
+            except OSError:
+                # Still mapped somewhere (e.g. on Windows); try again next time
+                pass
@@ -0,0 +1,558 @@
+"""
+Stock selection and nesting for QuoteForge.
+Picks a standard stock size for every part from its bounding envelope and
+packs the whole quote onto it: flat parts are shelf-packed onto sheets (2D),
+long parts are cut from bars (1D first-fit decreasing). Parts of the same
+material and stock size share sheets and bars, so the purchased weight and
+utilization reflect the whole quote rather than one part at a time.
+
+Packing works on part counts rather than individual copies: identical sheets,
+shelves and bars are kept as one entry with a multiplicity, so a 500-part
+quote with large quantities plans in milliseconds.
+
+Purchased stock is charged as whole sheets and bars, except the least-used
+one in each group, which is charged cut to the size it uses (rounded up to
+REMNANT_INCREMENT_IN) as suppliers cut drops to size. All dimensions are
+inches.
+"""
+
+import math
+
+import numpy as np
+
+from utils import instrumentation
+
+# Standard plate thicknesses
+PLATE_THICKNESSES_IN = (
+    0.036,
+    0.048,
+    0.06,
+    0.075,
+    0.105,
+    0.135,
+    0.1875,
+    0.25,
+    0.3125,
+    0.375,
+    0.5,
+    0.625,
+    0.75,
+    1.0,
+    1.25,
+    1.5,
+    2.0,
+    2.5,
+    3.0,
+    4.0,
+)
+# Standard sheet sizes as (width, length)
+SHEET_SIZES_IN = ((48.0, 96.0), (48.0, 120.0), (60.0, 120.0), (60.0, 144.0))
+# Standard bar widths, thicknesses and round bar diameters
+BAR_SIZES_IN = (
+    0.25,
+    0.375,
+    0.5,
+    0.625,
+    0.75,
+    0.875,
+    1.0,
+    1.25,
+    1.5,
+    1.75,
+    2.0,
+    2.5,
+    3.0,
+    3.5,
+    4.0,
+    5.0,
+    6.0,
+    8.0,
+    10.0,
+    12.0,
+)
+BAR_LENGTH_IN = 144.0
+
+# A part is cut from plate when its thickness is a standard plate thickness
+# and it is at least this many times wider than thick
+PLATE_ASPECT_RATIO = 3.0
+# Envelopes this much over a standard size still use it (CAD round-off)
+SIZE_TOLERANCE_IN = 0.005
+
+# Kerf plus web between nested plate parts, and the unusable sheet border
+PART_SPACING_IN = 0.25
+SHEET_MARGIN_IN = 0.5
+# Saw kerf plus facing stock per bar cut, and the unusable end of each bar
+BAR_CUT_ALLOWANCE_IN = 0.25
+BAR_END_ALLOWANCE_IN = 2.0
+# The least-used sheet or bar of a group is charged cut to size, rounded up
+# to this increment; all others are charged whole
+REMNANT_INCREMENT_IN = 1.0
+
+# Processes that never start from purchased stock
+NO_STOCK_FLAGS = ("3d_printing",)
+
+_EPSILON = 1e-9
+
+
+def _standard_size(size, sizes):
+    """Returns the smallest standard size that covers size, or None"""
+    for standard in sizes:
+        if standard >= size - SIZE_TOLERANCE_IN:
+            return standard
+    return None
+
+
+def _format_size(value):
+    return f"{value:g}"
+
+
+def choose_stock(config, envelope_in):
+    """
+    Picks the stock form and size a part is made from.
+
+    Args:
+        config: Part configuration dict
+        envelope_in: Bounding envelope (length, width, thickness), largest first
+
+    Returns:
+        Dict with form ("plate", "bar", "round_bar" or "block"), the size
+        fields for that form and a human-readable "stock" label, or None for
+        parts that do not start from stock (e.g. 3D printed)
+    """
+    if any(config.get(flag, False) for flag in NO_STOCK_FLAGS):
+        return None
+    length, width, thickness = sorted(envelope_in, reverse=True)
+    if length <= 0:
+        return None
+
+    if config.get("turning", False):
+        # The two closest dimensions are the turned diameter
+        if length - width < width - thickness:
+            diameter, bar_length = length, thickness
+        else:
+            diameter, bar_length = width, length
+        standard = _standard_size(diameter, BAR_SIZES_IN)
+        if standard is not None:
+            return {
+                "form": "round_bar",
+                "diameter": standard,
+                "length": bar_length,
+                "stock": f"{_format_size(standard)} in round bar",
+            }
+
+    plate_thickness = _standard_size(thickness, PLATE_THICKNESSES_IN)
+    is_flat = width >= PLATE_ASPECT_RATIO * thickness
+    if plate_thickness is not None and (config.get("cutting") or is_flat):
+        return {
+            "form": "plate",
+            "thickness": plate_thickness,
+            "footprint": (length, width),
+            "stock": f"{_format_size(plate_thickness)} in plate",
+        }
+
+    bar_width = _standard_size(width, BAR_SIZES_IN)
+    bar_thickness = _standard_size(thickness, BAR_SIZES_IN)
+    if bar_width is not None and bar_thickness is not None:
+        return {
+            "form": "bar",
+            "section": (bar_width, bar_thickness),
+            "length": length,
+            "stock": (
+                f"{_format_size(bar_width)} x {_format_size(bar_thickness)} in bar"
+            ),
+        }
+
+    return {
+        "form": "block",
+        "size": (length, width, thickness),
+        "stock": "Custom block",
+    }
+
+
+def _first_fit(bins, size, count, capacity, extent=0.0):
+    """
+    First-fit places count items of one size into bins, opening new ones.
+
+    bins is a list of [remaining capacity, multiplicity, extent] entries that
+    is updated in place; entries are split when only some of a group of
+    identical bins receive items. A bin's extent is the largest extent of the
+    items placed in it (e.g. the widest shelf on a sheet).
+
+    Returns:
+        New entries opened for the overflow (also appended to bins)
+    """
+    i = 0
+    while count and i < len(bins):
+        remaining, multiplicity, bin_extent = bins[i]
+        per_bin = int((remaining + _EPSILON) // size)
+        if not per_bin:
+            i += 1
+            continue
+        filled_extent = max(bin_extent, extent)
+        full = min(multiplicity, count // per_bin)
+        if full:
+            bins[i] = [remaining - per_bin * size, full, filled_extent]
+            count -= full * per_bin
+            multiplicity -= full
+            if multiplicity:
+                i += 1
+                bins.insert(i, [remaining, multiplicity, bin_extent])
+        if count and multiplicity and count < per_bin:
+            # Fewer items left than one bin holds: part-fill a single bin
+            bins[i] = [remaining - count * size, 1, filled_extent]
+            if multiplicity > 1:
+                bins.insert(i + 1, [remaining, multiplicity - 1, bin_extent])
+            count = 0
+        i += 1
+
+    opened = []
+    if count:
+        per_bin = int((capacity + _EPSILON) // size)
+        full, leftover = divmod(count, per_bin)
+        if full:
+            opened.append([capacity - per_bin * size, full, extent])
+        if leftover:
+            opened.append([capacity - leftover * size, 1, extent])
+        bins.extend(opened)
+    return opened
+
+
+def _round_up(length, limit):
+    """Rounds a cut length up to REMNANT_INCREMENT_IN, capped at limit"""
+    steps = math.ceil(length / REMNANT_INCREMENT_IN - _EPSILON)
+    return min(limit, steps * REMNANT_INCREMENT_IN)
+
+
+def _least_used(bins):
+    """Returns the entry with the most capacity left"""
+    return max(bins, key=lambda entry: entry[0])
+
+
+def _pack_sheets(items, sheet_width, sheet_length):
+    """
+    Nests plate parts onto sheets with hybrid first-fit: parts are first
+    shelf-packed (first-fit decreasing height) into shelves spanning the sheet
+    width, then the shelves are packed onto sheets by first-fit decreasing.
+
+    Args:
+        items: List of (key, footprint length, footprint width, quantity)
+
+    Returns:
+        (charged area in2, sheet count, {key: nested footprint area in2}), or
+        None if some part fits no orientation on this sheet
+    """
+    margin = 2 * SHEET_MARGIN_IN - PART_SPACING_IN
+    usable_width = sheet_width - margin
+    usable_length = sheet_length - margin
+
+    placed = []
+    for key, length, width, quantity in items:
+        # Use the orientation that fits the most copies on one sheet
+        best = None
+        for across, height in (
+            (length + PART_SPACING_IN, width + PART_SPACING_IN),
+            (width + PART_SPACING_IN, length + PART_SPACING_IN),
+        ):
+            per_sheet = int((usable_width + _EPSILON) // across) * int(
+                (usable_length + _EPSILON) // height
+            )
+            if per_sheet and (best is None or (per_sheet, -height) > best[0]):
+                best = ((per_sheet, -height), across, height)
+        if best is None:
+            return None
+        _, across, height = best
+        placed.append((height, across, key, quantity))
+    placed.sort(key=lambda item: (-item[0], -item[1]))
+
+    # Shelves carry their height as extent; heights only decrease, so every
+    # open shelf is tall enough for the part being placed
+    shelves = []
+    areas = {}
+    for height, across, key, quantity in placed:
+        _first_fit(shelves, across, quantity, usable_width, extent=height)
+        areas[key] = areas.get(key, 0.0) + across * height * quantity
+
+    # Sheets carry the widest shelf on them as extent
+    sheets = []
+    for remaining, multiplicity, height in sorted(shelves, key=lambda s: -s[2]):
+        _first_fit(
+            sheets, height, multiplicity, usable_length, usable_width - remaining
+        )
+
+    sheet_count = sum(multiplicity for _, multiplicity, _ in sheets)
+    remaining, _, used_width = _least_used(sheets)
+    remnant = _round_up(usable_length - remaining + margin, sheet_length) * _round_up(
+        used_width + margin, sheet_width
+    )
+    charged_area = (sheet_count - 1) * sheet_width * sheet_length + remnant
+    return charged_area, sheet_count, areas
+
+
+def _pack_bars(items, usable_length):
+    """
+    Cuts bar parts from stock lengths (first-fit decreasing).
+
+    Args:
+        items: List of (key, part length, quantity)
+
+    Returns:
+        (charged length, bar count, {key: cut length}) for the parts that fit a
+        stock bar, and the keys of parts longer than one
+    """
+    cuts = []
+    too_long = []
+    for key, length, quantity in items:
+        cut = length + BAR_CUT_ALLOWANCE_IN
+        if cut > usable_length + _EPSILON:
+            too_long.append(key)
+        else:
+            cuts.append((cut, key, quantity))
+    cuts.sort(key=lambda item: -item[0])
+
+    bars = []
+    lengths = {}
+    for cut, key, quantity in cuts:
+        _first_fit(bars, cut, quantity, usable_length)
+        lengths[key] = lengths.get(key, 0.0) + cut * quantity
+
+    if not bars:
+        return 0.0, 0, lengths, too_long
+    bar_count = sum(multiplicity for _, multiplicity, _ in bars)
+    remaining, _, _ = _least_used(bars)
+    remnant = _round_up(usable_length - remaining + BAR_END_ALLOWANCE_IN, BAR_LENGTH_IN)
+    charged_length = (bar_count - 1) * BAR_LENGTH_IN + remnant
+    return charged_length, bar_count, lengths, too_long
+
+
+def _plan_plates(material, thickness, members):
+    """Nests one material/thickness group on the cheapest standard sheet"""
+    items = [
+        (i, stock["footprint"][0], stock["footprint"][1], quantity)
+        for i, stock, quantity, _ in members
+    ]
+    best = None
+    for sheet_width, sheet_length in SHEET_SIZES_IN:
+        packed = _pack_sheets(items, sheet_width, sheet_length)
+        if packed is not None and (best is None or packed[0] < best[0][0]):
+            best = (packed, (sheet_width, sheet_length))
+
+    if best is None:
+        # Too large for any standard sheet: buy each part's own plate
+        return [
+            _plan_single(material, stock, quantity, volume, i)
+            for i, stock, quantity, volume in members
+        ]
+
+    (charged_area, sheet_count, areas), (sheet_width, sheet_length) = best
+    label = (
+        f"{_format_size(thickness)} in plate, "
+        f"{_format_size(sheet_width)} x {_format_size(sheet_length)} in"
+    )
+    return [
+        _allocate(
+            material,
+            label,
+            "plate",
+            charged_area * thickness,
+            sheet_count,
+            [(i, quantity, volume, areas[i]) for i, _, quantity, volume in members],
+        )
+    ]
+
+
+def _plan_bars(material, form, section_area, label, members):
+    """Cuts one material/section group from standard bar lengths"""
+    usable_length = BAR_LENGTH_IN - BAR_END_ALLOWANCE_IN
+    items = [(i, stock["length"], quantity) for i, stock, quantity, _ in members]
+    charged_length, bar_count, lengths, too_long = _pack_bars(items, usable_length)
+
+    groups = []
+    if lengths:
+        groups.append(
+            _allocate(
+                material,
+                f"{label}, {_format_size(BAR_LENGTH_IN)} in lengths",
+                form,
+                charged_length * section_area,
+                bar_count,
+                [
+                    (i, quantity, volume, lengths[i])
+                    for i, _, quantity, volume in members
+                    if i in lengths
+                ],
+            )
+        )
+    for i, stock, quantity, volume in members:
+        if i in too_long:
+            groups.append(_plan_single(material, stock, quantity, volume, i))
+    return groups
+
+
+def _plan_single(material, stock, quantity, volume, index):
+    """Buys stock for one part on its own: a block or an oversized piece"""
+    if stock["form"] == "plate":
+        length, width = stock["footprint"]
+        piece = (length + 2 * SHEET_MARGIN_IN) * (width + 2 * SHEET_MARGIN_IN)
+        piece *= stock["thickness"]
+        label = f"{_format_size(stock['thickness'])} in plate, cut to size"
+    elif stock["form"] in ("bar", "round_bar"):
+        piece = _section_area(stock) * (stock["length"] + BAR_CUT_ALLOWANCE_IN)
+        label = f"{stock['stock']}, cut to length"
+    else:
+        allowance = 2 * BAR_CUT_ALLOWANCE_IN
+        piece = math.prod(size + allowance for size in stock["size"])
+        label = stock["stock"]
+    return _allocate(
+        material,
+        label,
+        stock["form"],
+        piece * quantity,
+        quantity,
+        [(index, quantity, volume, 1.0)],
+    )
+
+
+def _section_area(stock):
+    if stock["form"] == "round_bar":
+        return math.pi * stock["diameter"] ** 2 / 4
+    return stock["section"][0] * stock["section"][1]
+
+
+def _allocate(material, label, form, buy_volume, stock_count, shares):
+    """
+    Builds a group record, splitting its buy volume across parts in
+    proportion to the stock each part's copies take up.
+
+    Args:
+        shares: List of (part index, quantity, part volume, stock used)
+    """
+    total_share = sum(share for _, _, _, share in shares)
+    part_volume = sum(quantity * volume for _, quantity, volume, _ in shares)
+    parts = {}
+    for index, quantity, volume, share in shares:
+        part_buy = buy_volume * share / total_share / quantity if total_share else 0.0
+        parts[index] = {
+            "stock": label,
+            "form": form,
+            "buy_volume_in3": part_buy,
+            "utilization": volume / part_buy if part_buy else None,
+        }
+    return {
+        "material": material,
+        "stock": label,
+        "form": form,
+        "stock_count": stock_count,
+        "buy_volume_in3": buy_volume,
+        "part_volume_in3": part_volume,
+        "utilization": part_volume / buy_volume if buy_volume else None,
+        "parts": parts,
+    }
+
+
+def _group_parts(configs, features, quantities):
+    """
+    Chooses stock for every part and groups parts that can share it.
+
+    Returns:
+        (plates, bars, blocks): plates keyed by (material, thickness), bars
+        by (material, form, label), each a list of (part index, stock, part
+        volume); blocks is a list of (material, part index, stock, volume)
+    """
+    plates = {}
+    bars = {}
+    blocks = []
+    for i, (config, part_features) in enumerate(zip(configs, features)):
+        material = config.get("material")
+        if not part_features or not material or quantities[i] <= 0:
+            continue
+        stock = choose_stock(config, part_features["stock_envelope_in"])
+        if stock is None:
+            continue
+        volume = part_features["volume_in3"]
+        if stock["form"] == "plate":
+            plates.setdefault((material, stock["thickness"]), []).append(
+                (i, stock, volume)
+            )
+        elif stock["form"] == "block":
+            blocks.append((material, i, stock, volume))
+        else:
+            key = (material, stock["form"], stock["stock"])
+            bars.setdefault(key, []).append((i, stock, volume))
+    return plates, bars, blocks
+
+
+def _nest_groups(plates, bars, blocks, quantities):
+    """Nests grouped parts at the given per-part quantities"""
+    groups = []
+    for (material, thickness), members in plates.items():
+        members = [(i, stock, quantities[i], volume) for i, stock, volume in members]
+        groups.extend(_plan_plates(material, thickness, members))
+    for (material, form, label), members in bars.items():
+        members = [(i, stock, quantities[i], volume) for i, stock, volume in members]
+        section_area = _section_area(members[0][1])
+        groups.extend(_plan_bars(material, form, section_area, label, members))
+    for material, i, stock, volume in blocks:
+        groups.append(_plan_single(material, stock, quantities[i], volume, i))
+    return groups
+
+
+@instrumentation.timed("nesting.plan")
+def plan_stock(part_names, configs, features):
+    """
+    Chooses stock for every part and nests the quote onto it.
+
+    Args:
+        part_names: Sequence of unique part identifiers
+        configs: Sequence of part configuration dicts, aligned with part_names
+        features: Sequence of per-part geometry features (or None); the
+            stock envelope and volume come from here
+
+    Returns:
+        Tuple of (stock, groups). stock is aligned with part_names and holds,
+        per part, a dict with stock, form, buy_volume_in3 (per part) and
+        utilization, or None for parts without features, material or stock.
+        groups lists one dict per purchased stock line with material, stock,
+        form, stock_count, buy_volume_in3, part_volume_in3, utilization and
+        parts (part names).
+    """
+    quantities = [config.get("quantity", 1) for config in configs]
+    groups = _nest_groups(*_group_parts(configs, features, quantities), quantities)
+
+    stock = [None] * len(part_names)
+    for group in groups:
+        for index, allocation in group["parts"].items():
+            stock[index] = allocation
+        group["parts"] = [part_names[index] for index in group["parts"]]
+    return stock, groups
+
+
+@instrumentation.timed("nesting.plan_curve")
+def plan_buy_volumes(configs, features, quantities):
+    """
+    Nests the quote once per batch quantity, with every part at that quantity.
+
+    Stock is chosen once; only the packing is repeated per quantity.
+
+    Args:
+        configs: Sequence of part configuration dicts
+        features: Sequence of per-part geometry features (or None)
+        quantities: Sequence of positive batch quantities
+
+    Returns:
+        (n_parts, n_quantities) array of per-part buy volume in cubic inches,
+        NaN for parts that are not cut from stock
+    """
+    n_parts = len(configs)
+    plates, bars, blocks = _group_parts(configs, features, [1] * n_parts)
+    buy_volumes = np.full((n_parts, len(quantities)), np.nan)
+
+    # Blocks are bought one piece per part whatever the quantity
+    for group in _nest_groups({}, {}, blocks, [1] * n_parts):
+        for index, allocation in group["parts"].items():
+            buy_volumes[index, :] = allocation["buy_volume_in3"]
+
+    for j, quantity in enumerate(quantities):
+        for group in _nest_groups(plates, bars, [], [quantity] * n_parts):
+            for index, allocation in group["parts"].items():
+                buy_volumes[index, j] = allocation["buy_volume_in3"]
+    return buy_volumes
@@ -0,0 +1,243 @@
+"""
+Fast STEP pre-scan for QuoteForge.
+Streams a STEP (ISO 10303-21) file once without building any B-rep, reading
+the HEADER section and counting DATA entities by type. This is enough to list
+files instantly, spot multi-body or very large parts and report the length
+unit the file was authored in.
+
+OCCT converts STEP geometry to millimeters on import whatever the file's own
+unit is, so the reported unit is informational; volumes from geometry.py are
+already correct for inch files.
+"""
+
+import os
+import re
+from collections import Counter
+
+CHUNK_SIZE = 1024 * 1024
+
+SOLID_ENTITIES = ("MANIFOLD_SOLID_BREP", "BREP_WITH_VOIDS", "FACETED_BREP")
+FACE_ENTITIES = ("ADVANCED_FACE", "FACE_SURFACE")
+
+# Parts above these limits are analyzed in the background
+BACKGROUND_FACE_COUNT = 5000
+BACKGROUND_FILE_BYTES = 20 * 1024 * 1024
+
+# Millimeters per unit
+SI_PREFIX_MM = {
+    None: 1000.0,
+    "KILO": 1e6,
+    "DECI": 100.0,
+    "CENTI": 10.0,
+    "MILLI": 1.0,
+    "MICRO": 1e-3,
+    "NANO": 1e-6,
+}
+CONVERSION_UNIT_MM = {"INCH": 25.4, "FOOT": 304.8, "YARD": 914.4, "MIL": 0.0254}
+UNIT_NAMES = {
+    1.0: "mm",
+    10.0: "cm",
+    1000.0: "m",
+    25.4: "in",
+    304.8: "ft",
+    1e-3: "um",
+}
+
+_COMMENT_RE = re.compile(r"/\*.*?\*/", re.S)
+_SIMPLE_ENTITY_RE = re.compile(r"#\d+\s*=\s*([A-Z][A-Z0-9_]*)\s*\(")
+_COMPLEX_ENTITY_RE = re.compile(r"#(\d+)\s*=\s*\(([^;]*);")
+_COMPLEX_PART_RE = re.compile(r"([A-Z][A-Z0-9_]*)\s*\(")
+_MEASURE_RE = re.compile(
+    r"#(\d+)\s*=\s*LENGTH_MEASURE_WITH_UNIT\s*\(\s*LENGTH_MEASURE\s*\(\s*"
+    r"([-+0-9.Ee]+)\s*\)\s*,\s*#(\d+)"
+)
+_SI_UNIT_RE = re.compile(r"SI_UNIT\s*\(\s*(?:\.([A-Z]+)\.|\$|\*)\s*,\s*\.METRE\.")
+_CONVERSION_UNIT_RE = re.compile(r"CONVERSION_BASED_UNIT\s*\(\s*'([^']*)'\s*,\s*#(\d+)")
+_HEADER_RECORD_RE = re.compile(r"\b(FILE_DESCRIPTION|FILE_NAME|FILE_SCHEMA)\s*\(")
+_TOKEN_RE = re.compile(r"'((?:[^']|'')*)'|([(),])|([^\s(),']+)")
+
+
+def _parse_parameters(text, start):
+    """
+    Parses a parenthesized STEP parameter list beginning at text[start] == "(".
+
+    Returns:
+        (nested list of str values, index after the closing parenthesis)
+    """
+    stack = [[]]
+    pos = start
+    while True:
+        match = _TOKEN_RE.search(text, pos)
+        if match is None:
+            return stack[0], len(text)
+        pos = match.end()
+        string, punct, bare = match.groups()
+        if string is not None:
+            stack[-1].append(string.replace("''", "'"))
+        elif punct == "(":
+            stack.append([])
+        elif punct == ")":
+            values = stack.pop()
+            if len(stack) == 1:
+                return values, pos
+            stack[-1].append(values)
+        elif bare is not None:
+            stack[-1].append(bare)
+
+
+def _first(values, index):
+    """Returns values[index], unwrapping single-item lists, or None"""
+    if index >= len(values):
+        return None
+    value = values[index]
+    while isinstance(value, list):
+        value = value[0] if value else None
+    return value
+
+
+def _parse_header(header_text):
+    text = _COMMENT_RE.sub("", header_text)
+    records = {}
+    for match in _HEADER_RECORD_RE.finditer(text):
+        values, _ = _parse_parameters(text, match.end() - 1)
+        records[match.group(1)] = values
+
+    description = records.get("FILE_DESCRIPTION", [])
+    file_name = records.get("FILE_NAME", [])
+    schema = records.get("FILE_SCHEMA", [])
+    return {
+        "description": _first(description, 0),
+        "file_name": _first(file_name, 0),
+        "time_stamp": _first(file_name, 1),
+        "preprocessor_version": _first(file_name, 4),
+        "originating_system": _first(file_name, 5),
+        "schema": _first(schema, 0),
+    }
+
+
+def _resolve_length_unit(unit_entities, measures):
+    """
+    Works out the file's length unit from its LENGTH_UNIT entities.
+
+    Units that only serve as the base of a conversion (e.g. the metre an inch
+    is defined against) are ignored.
+
+    Returns:
+        (millimeters per unit or None, unit name)
+    """
+
+    def unit_mm(entity_id, depth=0):
+        body = unit_entities.get(entity_id)
+        if body is None or depth > 4:
+            return None
+        si = _SI_UNIT_RE.search(body)
+        if si:
+            return SI_PREFIX_MM.get(si.group(1))
+        conversion = _CONVERSION_UNIT_RE.search(body)
+        if conversion:
+            name, measure_id = conversion.group(1).strip().upper(), conversion.group(2)
+            measure = measures.get(measure_id)
+            if measure is not None:
+                value, base_id = measure
+                base_mm = unit_mm(base_id, depth + 1)
+                if base_mm is not None:
+                    return value * base_mm
+            return CONVERSION_UNIT_MM.get(name)
+        return None
+
+    base_ids = {base_id for _, base_id in measures.values()}
+    scales = {
+        unit_mm(entity_id) for entity_id in unit_entities if entity_id not in base_ids
+    }
+    scales.discard(None)
+
+    if not scales:
+        return None, "unknown"
+    if len(scales) > 1:
+        return None, "mixed"
+    scale = scales.pop()
+    for known, name in UNIT_NAMES.items():
+        if abs(scale - known) <= known * 1e-6:
+            return scale, name
+    return scale, f"{scale:g} mm"
+
+
+def scan_step(file_path, chunk_size=CHUNK_SIZE):
+    """
+    Reads a STEP file's header, entity counts and length unit in one pass.
+
+    Entity counting matches "#id = TYPE(" patterns rather than parsing every
+    record, so a ";" inside a string can at worst skew the counts slightly.
+
+    Args:
+        file_path: Path to the STEP file
+        chunk_size: Bytes read per chunk
+
+    Returns:
+        Dict with file_size, description, file_name, time_stamp,
+        preprocessor_version, originating_system, schema, entity_count,
+        entity_counts (type -> count), solid_count, face_count,
+        length_unit, length_unit_mm and is_inch
+    """
+    counts = Counter()
+    unit_entities = {}
+    measures = {}
+    header = None
+    buffer = ""
+
+    def scan_data(text):
+        counts.update(_SIMPLE_ENTITY_RE.findall(text))
+        for entity_id, body in _COMPLEX_ENTITY_RE.findall(text):
+            counts.update(_COMPLEX_PART_RE.findall(body))
+            if "LENGTH_UNIT" in body:
+                unit_entities[entity_id] = body
+        if "LENGTH_MEASURE_WITH_UNIT" in text:
+            for entity_id, value, base_id in _MEASURE_RE.findall(text):
+                measures[entity_id] = (float(value), base_id)
+
+    with open(file_path, "rb") as f:
+        for raw in iter(lambda: f.read(chunk_size), b""):
+            buffer += raw.decode("latin-1")
+
+            if header is None:
+                end = buffer.find("ENDSEC;")
+                if end < 0:
+                    continue
+                header = _parse_header(buffer[:end])
+                buffer = buffer[end + len("ENDSEC;") :]
+
+            # Only scan complete records; the tail waits for the next chunk
+            cut = buffer.rfind(";") + 1
+            if cut:
+                scan_data(buffer[:cut])
+                buffer = buffer[cut:]
+
+    if header is None:
+        header = _parse_header(buffer)
+    elif buffer:
+        scan_data(buffer)
+
+    length_unit_mm, length_unit = _resolve_length_unit(unit_entities, measures)
+    result = {"file_size": os.path.getsize(file_path)}
+    result.update(header)
+    result.update(
+        {
+            "entity_count": sum(counts.values()),
+            "entity_counts": dict(counts.most_common()),
+            "solid_count": sum(counts[name] for name in SOLID_ENTITIES),
+            "face_count": sum(counts[name] for name in FACE_ENTITIES),
+            "length_unit": length_unit,
+            "length_unit_mm": length_unit_mm,
+            "is_inch": length_unit == "in",
+        }
+    )
+    return result
+
+
+def needs_background(scan):
+    """True for multi-body or very large files that should not block the UI"""
+    return (
+        scan["solid_count"] > 1
+        or scan["face_count"] > BACKGROUND_FACE_COUNT
+        or scan["file_size"] > BACKGROUND_FILE_BYTES
+    )
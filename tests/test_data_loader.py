@@ -0,0 +1,134 @@
+"""Background rate refresh against a local HTTP stand-in for Google Sheets."""
+
+import http.server
+import threading
+from datetime import timedelta
+
+import pytest
+
+import data_loader
+
+CACHE_KEY = "materials"
+
+MATERIALS_V1 = "name,density (lb/in^3),cost_per_lb\nSteel,0.284,1.0\n"
+MATERIALS_V2 = "name,density (lb/in^3),cost_per_lb\nSteel,0.284,1.5\n"
+
+
+class SheetHandler(http.server.BaseHTTPRequestHandler):
+    """Serves the server's CSV with an ETag and honors If-None-Match"""
+
+    def do_GET(self):
+        sheet = self.server.sheet
+        sheet["requests"].append(dict(self.headers))
+        if self.headers.get("If-None-Match") == sheet["etag"]:
+            self.send_response(304)
+            self.end_headers()
+            return
+        body = sheet["csv"].encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/csv")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("ETag", sheet["etag"])
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    httpd = http.server.ThreadingHTTPServer(("127.0.0.1", 0), SheetHandler)
+    httpd.sheet = {"csv": MATERIALS_V1, "etag": '"v1"', "requests": []}
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+@pytest.fixture(autouse=True)
+def loader_state(monkeypatch, tmp_path):
+    """Fresh module state, with snapshots written under tmp_path"""
+    monkeypatch.setattr(
+        data_loader,
+        "_config",
+        {"refresh_rate_minutes": 15, "cache": {"directory": str(tmp_path)}},
+    )
+    for name in (
+        "_cache",
+        "_refresh_threads",
+        "_refresh_errors",
+        "_data_versions",
+        "_change_sets",
+    ):
+        monkeypatch.setattr(data_loader, name, {})
+
+
+def _url(httpd):
+    return f"http://127.0.0.1:{httpd.server_address[1]}/materials.csv"
+
+
+def _fetch_stale(url):
+    """Expires the cached entry, fetches and waits for the background refresh"""
+    data_loader._cache[CACHE_KEY]["timestamp"] -= timedelta(hours=1)
+    served = data_loader.fetch_csv_data(url, CACHE_KEY)
+    data_loader.wait_for_refresh(CACHE_KEY, timeout=10)
+    return served
+
+
+def test_not_modified_keeps_snapshot(server):
+    url = _url(server)
+    first = data_loader.fetch_csv_data(url, CACHE_KEY)
+    version = data_loader.get_rates_version()
+
+    served = _fetch_stale(url)
+
+    assert served is first
+    assert server.sheet["requests"][-1].get("If-None-Match") == '"v1"'
+    entry = data_loader._cache[CACHE_KEY]
+    assert entry["data"] is first
+    assert entry["etag"] == '"v1"'
+    assert data_loader.get_rates_version() == version
+    # Revalidated, so fresh again without another request
+    requests = len(server.sheet["requests"])
+    assert data_loader.fetch_csv_data(url, CACHE_KEY) is first
+    assert len(server.sheet["requests"]) == requests
+
+
+def test_changed_sheet_replaces_snapshot(server):
+    url = _url(server)
+    first = data_loader.fetch_csv_data(url, CACHE_KEY)
+    materials_version, _ = data_loader.get_rates_version()
+    server.sheet.update(csv=MATERIALS_V2, etag='"v2"')
+
+    served = _fetch_stale(url)
+
+    # The stale frame is served while the refresh runs
+    assert served is first
+    entry = data_loader._cache[CACHE_KEY]
+    assert entry["data"]["cost_per_lb"].tolist() == [1.5]
+    assert entry["etag"] == '"v2"'
+    assert data_loader.get_rates_version()[0] == materials_version + 1
+    (change_set,) = data_loader.get_change_sets(CACHE_KEY, materials_version)
+    assert change_set["changes"] == [
+        {"name": "Steel", "column": "cost_per_lb", "old": 1.0, "new": 1.5}
+    ]
+
+
+def test_network_error_serves_stale_data(server):
+    url = _url(server)
+    first = data_loader.fetch_csv_data(url, CACHE_KEY)
+    version = data_loader.get_rates_version()
+    server.shutdown()
+    server.server_close()
+
+    served = _fetch_stale(url)
+
+    assert served is first
+    assert data_loader._cache[CACHE_KEY]["data"] is first
+    assert data_loader.get_rates_version() == version
+    assert CACHE_KEY in data_loader._refresh_errors
+    # Backs off instead of refetching on every call
+    assert data_loader._cache[CACHE_KEY]["retry_at"] is not None
+    assert data_loader.fetch_csv_data(url, CACHE_KEY) is first
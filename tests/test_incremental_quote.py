@@ -0,0 +1,63 @@
+"""Rate change reports from the incremental quote memo."""
+
+import pytest
+
+import costs
+import data_loader
+import nesting
+from benchmarks import corpus
+
+
+@pytest.fixture(autouse=True)
+def rates(monkeypatch):
+    for name in ("_cache", "_data_versions", "_change_sets"):
+        monkeypatch.setattr(data_loader, name, {})
+    corpus.install_rate_fixtures()
+
+
+def _full_quote(names, configs, volumes, part_features, rates=None):
+    stock, _ = nesting.plan_stock(names, configs, part_features)
+    _, totals = costs.calculate_quote(
+        names, configs, volumes, features=part_features, stock=stock, rates=rates
+    )
+    return totals["total_cost_batch"]
+
+
+def test_rate_change_with_edits_in_the_same_call():
+    names, configs, volumes = corpus.make_part_batch(40)
+    part_features = corpus.make_part_features(volumes)
+    memo = costs.IncrementalQuote()
+    previous = memo.price(names, configs, volumes, features=part_features)
+    old_rates = (data_loader.get_material_index(), data_loader.get_process_index())
+
+    # Raise one material's price, then edit a part using it and one that doesn't
+    target = configs[0]["material"]
+    materials = data_loader.get_materials().copy()
+    materials.loc[materials["name"] == target, "cost_per_lb"] *= 1.5
+    data_loader.seed_cache("materials", materials)
+    configs[0]["quantity"] += 3
+    other = next(i for i, c in enumerate(configs) if c["material"] != target)
+    configs[other]["quantity"] += 2
+
+    results = memo.price(names, configs, volumes, features=part_features)
+    report = memo.rate_report
+
+    assert report["quote_before"] == pytest.approx(
+        sum(result["total_cost_batch"] for result in previous.values())
+    )
+    assert report["quote_after"] == pytest.approx(
+        sum(result["total_cost_batch"] for result in results.values())
+    )
+    users = costs.rate_users(names, configs)["materials"][target]
+    assert sorted(report["parts"].index) == sorted(users)
+    # Every affected part, edited or not, at old and new rates with its new inputs
+    at_old_rates = _full_quote(names, configs, volumes, part_features, old_rates)
+    at_new_rates = _full_quote(names, configs, volumes, part_features)
+    for name, row in report["parts"].iterrows():
+        assert row["Before ($)"] == pytest.approx(at_old_rates[name])
+        assert row["After ($)"] == pytest.approx(at_new_rates[name])
+
+    # A later edit makes the report's totals stale
+    configs[other]["quantity"] += 1
+    memo.price(names, configs, volumes, features=part_features)
+    assert memo.rate_report is None
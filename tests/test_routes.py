@@ -0,0 +1,68 @@
+"""Turning routes are offered only for parts with cylindrical geometry."""
+
+import cadquery as cq  # type: ignore
+import numpy as np
+import pytest
+
+import costs
+import features
+import geometry
+from benchmarks import corpus
+
+MM_PER_IN = 25.4
+
+# Test parts, modeled in inches and scaled to millimeters for export
+SHAPES = {
+    "square_plate": lambda: cq.Workplane("XY").box(10, 10, 1),
+    "square_block": lambda: cq.Workplane("XY").box(3, 3, 1),
+    "square_bar": lambda: cq.Workplane("XY").box(1, 1, 10),
+    "round_bar": lambda: cq.Workplane("XY").circle(0.5).extrude(10),
+    "disc": lambda: cq.Workplane("XY").circle(2).extrude(0.5),
+    "flange": lambda: (
+        cq.Workplane("XY")
+        .circle(3)
+        .circle(1)
+        .extrude(0.75)
+        .faces(">Z")
+        .workplane()
+        .polarArray(2, 0, 360, 6)
+        .hole(0.375)
+    ),
+}
+
+
+@pytest.fixture(scope="module", autouse=True)
+def rates():
+    corpus.install_rate_fixtures()
+
+
+def _features(tmp_path, name):
+    shape = SHAPES[name]().val().scale(MM_PER_IN)
+    path = str(tmp_path / f"{name}.step")
+    cq.exporters.export(cq.Workplane("XY").add(shape), path)
+    return features.extract_features(geometry.GeometryAnalyzer(path))
+
+
+@pytest.mark.parametrize(
+    "name, turnable",
+    [
+        ("square_plate", False),
+        ("square_block", False),
+        ("square_bar", False),
+        ("round_bar", True),
+        ("disc", True),
+        ("flange", True),
+    ],
+)
+def test_turning_route_needs_a_cylinder(tmp_path, name, turnable):
+    part_features = _features(tmp_path, name)
+    config = dict(costs.default_part_config(), material="Aluminum 6061")
+    config["machining"] = True
+
+    options = costs.calculate_route_options(
+        [name], [config], [part_features["volume_in3"]], features=[part_features]
+    )
+
+    turning = options.choices["shaping"].index("turning")
+    assert np.isfinite(options.cost["shaping"][0, turning]) == turnable
+    assert costs._is_turnable(part_features) == turnable
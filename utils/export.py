@@ -1,7 +1,11 @@
 import pandas as pd
+import csv
 import os
-import tempfile
 import io
+import hashlib
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
 from reportlab.lib import colors  # type: ignore
 from reportlab.lib.pagesizes import letter  # type: ignore
 from reportlab.lib.styles import getSampleStyleSheet  # type: ignore
@@ -12,9 +16,14 @@ from reportlab.platypus import (  # type: ignore
     Table,
     TableStyle,
 )
-from svglib.svglib import svg2rlg  # type: ignore
+from svglib.svglib import SvgRenderer, load_svg_file  # type: ignore
+from lxml import etree  # type: ignore
 
+import data_loader
+from utils import instrumentation
 
+
+@instrumentation.timed("export.csv")
 def generate_csv_export(cost_results, part_name):
     """
     Generates a CSV string from the cost results dictionary. (Imperial Units)
@@ -39,6 +48,130 @@ def generate_csv_export(cost_results, part_name):
     return df.to_csv(index=False)
 
 
+BATCH_CONFIG_COLUMNS = [
+    "Cutting",
+    "Machining",
+    "Turning",
+    "3D Printing",
+    "Forming",
+    "Threading",
+    "Welding",
+    "Finishing",
+]
+
+
+def _batch_base_columns(units):
+    weight_col = "Weight (kg)" if units == "Metric" else "Weight (lbs)"
+    buy_weight_col = "Buy Weight (kg)" if units == "Metric" else "Buy Weight (lbs)"
+    return [
+        "Part Name",
+        "Quantity",
+        "Material",
+        weight_col,
+        "Stock",
+        buy_weight_col,
+        "Utilization (%)",
+        "Material Cost (#)",
+        "Per Part Cost ($)",
+        "Total Cost ($)",
+    ] + BATCH_CONFIG_COLUMNS
+
+
+def _process_cost_column(process_name):
+    return f"Cost: {process_name} ($)"
+
+
+def _price_break_column(quantity):
+    return f"Price @ {quantity} ($)"
+
+
+def _cost_range_column(label):
+    return f"{label} Total Cost ($)"
+
+
+def batch_export_columns(
+    process_names, units="Imperial", price_breaks=(), cost_range=()
+):
+    """
+    Returns the batch CSV header: standard columns, one "<P> Total Cost ($)"
+    column per simulated percentile label (e.g. "P10"), one "Price @ <qty>
+    ($)" per-part price column per price-break quantity, then one
+    alphabetically sorted "Cost: <Process> ($)" column per process.
+    """
+    range_cols = [_cost_range_column(label) for label in cost_range]
+    break_cols = [_price_break_column(q) for q in sorted(set(price_breaks))]
+    cost_cols = sorted({_process_cost_column(p) for p in process_names})
+    return _batch_base_columns(units) + range_cols + break_cols + cost_cols
+
+
+def _batch_row(item, units):
+    """Flattens one part's config and cost result into a batch CSV row dict"""
+    p_file_name = item["name"]
+    # Use display name (no file extension)
+    p_name = os.path.splitext(p_file_name)[0].replace("_", "-")
+    config = item["config"]
+    res = item["result"]
+
+    material_cost_total = 0.0
+
+    if units == "Metric":
+        # Conversion factors
+        LBS_TO_KG = 0.453592
+        weight_col = "Weight (kg)"
+        weight_val = res.get("weight_lbs", 0) * LBS_TO_KG
+        buy_weight_col = "Buy Weight (kg)"
+        buy_weight_val = res.get("buy_weight_lbs", 0) * LBS_TO_KG
+    else:
+        weight_col = "Weight (lbs)"
+        weight_val = res.get("weight_lbs", 0)
+        buy_weight_col = "Buy Weight (lbs)"
+        buy_weight_val = res.get("buy_weight_lbs", 0)
+
+    utilization = res.get("utilization")
+
+    row = {
+        "Part Name": p_name,
+        "Quantity": config.get("quantity", 1),
+        "Material": config.get("material"),
+        weight_col: weight_val,
+        "Stock": res.get("stock") or "",
+        buy_weight_col: buy_weight_val,
+        "Utilization (%)": utilization * 100 if utilization is not None else "",
+        "Per Part Cost ($)": res.get("per_part_cost", 0),
+        "Total Cost ($)": res.get("total_cost_batch", 0),
+        # Config Columns
+        "Cutting": config.get("cutting", "None"),
+        "Machining": config.get("machining", False),
+        "Turning": config.get("turning", False),
+        "3D Printing": config.get("3d_printing", False),
+        "Forming": config.get("forming", False),
+        "Threading": config.get("threading", False),
+        "Welding": config.get("welding", False),
+        "Finishing": config.get("finishing", "None"),
+    }
+
+    # Consolidate material costs and add other process costs
+    # Total cost ($) doesn't change with units, so no conversion is needed
+    for entry in res.get("breakdown", []):
+        proc_name = entry["Process"]
+        cost = entry["Batch Total Cost"]
+        if proc_name.startswith("Material:"):
+            material_cost_total += cost
+        else:
+            row[_process_cost_column(proc_name)] = cost
+
+    row["Material Cost (#)"] = material_cost_total
+
+    for label, cost in item.get("cost_range", {}).items():
+        row[_cost_range_column(label)] = cost
+
+    for quantity, price in item.get("price_breaks", {}).items():
+        row[_price_break_column(quantity)] = price
+
+    return row
+
+
+@instrumentation.timed("export.batch_csv")
 def generate_batch_export(parts_data, units="Imperial"):
     """
     Generates a CSV string for a batch of parts.
@@ -48,138 +181,39 @@ def generate_batch_export(parts_data, units="Imperial"):
             - name: Part Name
             - config: Configuration dict
             - result: Result from costs.calculate_part_breakdown
+            - price_breaks: Optional dict of quantity -> per part cost
+            - cost_range: Optional dict of percentile label (e.g. "P10") ->
+              simulated batch cost, from costs.simulate_quote
 
     Returns:
         CSV string
     """
-    rows = []
-
-    for item in parts_data:
-        p_file_name = item["name"]
-        # Use display name (no file extension)
-        p_name = os.path.splitext(p_file_name)[0].replace("_", "-")
-        config = item["config"]
-        res = item["result"]
-
-        material_cost_total = 0.0
-
-        if units == "Metric":
-            # Conversion factors
-            LBS_TO_KG = 0.453592
-
-            weight_val = res.get("weight_lbs", 0) * LBS_TO_KG
-
-            row = {
-                "Part Name": p_name,
-                "Quantity": config.get("quantity", 1),
-                "Material": config.get("material"),
-                "Weight (kg)": weight_val,
-                "Per Part Cost ($)": res.get("per_part_cost", 0),
-                "Total Cost ($)": res.get("total_cost_batch", 0),
-                # Config Columns
-                "Cutting": config.get("cutting", "None"),
-                "Machining": config.get("machining", False),
-                "Turning": config.get("turning", False),
-                "3D Printing": config.get("3d_printing", False),
-                "Forming": config.get("forming", False),
-                "Threading": config.get("threading", False),
-                "Welding": config.get("welding", False),
-                "Finishing": config.get("finishing", "None"),
-            }
-        else:
-            row = {
-                "Part Name": p_name,
-                "Quantity": config.get("quantity", 1),
-                "Material": config.get("material"),
-                "Weight (lbs)": res.get("weight_lbs", 0),
-                "Per Part Cost ($)": res.get("per_part_cost", 0),
-                "Total Cost ($)": res.get("total_cost_batch", 0),
-                # Config Columns
-                "Cutting": config.get("cutting", "None"),
-                "Machining": config.get("machining", False),
-                "Turning": config.get("turning", False),
-                "3D Printing": config.get("3d_printing", False),
-                "Forming": config.get("forming", False),
-                "Threading": config.get("threading", False),
-                "Welding": config.get("welding", False),
-                "Finishing": config.get("finishing", "None"),
-            }
-
-        # Consolidate material costs and add other process costs
-        for entry in res.get("breakdown", []):
-            proc_name = entry["Process"]
-            cost = entry["Batch Total Cost"]
-            if proc_name.startswith("Material:"):
-                material_cost_total += cost
-            else:
-                if units == "Metric" and entry.get("Unit") == "$/lbs":
-                    # Convert Material Cost Rate
-                    # Wait, entry["Rate"] is base Imperial ($/lb).
-                    # Need to check original Unit from the cost result?
-                    # costs.py calculates and returns breakdown.
-                    # But the result passed here is straight from costs.py which is Imperial.
-                    # So we convert here.
-                    cost = entry[
-                        "Batch Total Cost"
-                    ]  # Total cost ($) doesn't change with units
-
-                # However, if we want to show rates in a breakdown column, we are flattening here.
-                # The current code puts "Cost: <Process>" -> Total Cost.
-                # So we don't need to convert Rate for these flattened columns.
-
-                col_key = f"Cost: {proc_name} ($)"
-                row[col_key] = cost
-
-        row["Material Cost (#)"] = material_cost_total
-
-        rows.append(row)
+    rows = [_batch_row(item, units) for item in parts_data]
 
     df = pd.DataFrame(rows)
 
-    # Reorder columns to put standard ones first
-    if units == "Metric":
-        base_cols = [
-            "Part Name",
-            "Quantity",
-            "Material",
-            "Weight (kg)",
-            "Material Cost (#)",
-            "Per Part Cost ($)",
-            "Total Cost ($)",
-            "Cutting",
-            "Machining",
-            "Turning",
-            "3D Printing",
-            "Forming",
-            "Threading",
-            "Welding",
-            "Finishing",
-        ]
-    else:
-        base_cols = [
-            "Part Name",
-            "Quantity",
-            "Material",
-            "Weight (lbs)",
-            "Material Cost (#)",
-            "Per Part Cost ($)",
-            "Total Cost ($)",
-            "Cutting",
-            "Machining",
-            "Turning",
-            "3D Printing",
-            "Forming",
-            "Threading",
-            "Welding",
-            "Finishing",
-        ]
+    # Reorder columns to put standard ones first, then the simulated cost
+    # range and price breaks by quantity
+    base_cols = _batch_base_columns(units)
+    range_labels = list(
+        dict.fromkeys(
+            label for item in parts_data for label in item.get("cost_range", {})
+        )
+    )
+    range_cols = [_cost_range_column(label) for label in range_labels]
+    break_quantities = sorted(
+        {q for item in parts_data for q in item.get("price_breaks", {})}
+    )
+    break_cols = [_price_break_column(q) for q in break_quantities]
 
     # Identify dynamic cost columns
     existing_cols = list(df.columns)
-    cost_cols = [c for c in existing_cols if c not in base_cols]
+    cost_cols = [
+        c for c in existing_cols if c not in base_cols + range_cols + break_cols
+    ]
     cost_cols.sort()  # Alphabetical sort for cost columns
 
-    final_cols = base_cols + cost_cols
+    final_cols = base_cols + range_cols + break_cols + cost_cols
     # Ensure all base_cols exist (in case of empty data)
     for c in base_cols:
         if c not in df.columns:
@@ -190,19 +224,429 @@ def generate_batch_export(parts_data, units="Imperial"):
     return df.to_csv(index=False)
 
 
-def generate_pdf_export(parts_data, units="Imperial"):
+def iter_batch_export(
+    parts_data, process_names=None, units="Imperial", price_breaks=(), cost_range=()
+):
+    """
+    Streams a batch CSV one line at a time.
+
+    The column set is fixed up front, so parts_data can be any iterable
+    (including a generator) and is consumed lazily in constant memory.
+
+    Args:
+        parts_data: Iterable of dicts shaped like generate_batch_export's input
+        process_names: Processes to emit cost columns for. Defaults to every
+            process in the current catalog.
+        units: "Imperial" or "Metric"
+        price_breaks: Quantities to emit price-break columns for, matching
+            the keys of each item's "price_breaks"
+        cost_range: Percentile labels to emit simulated cost columns for,
+            matching the keys of each item's "cost_range"
+
+    Yields:
+        CSV text chunks: the header first, then one chunk per part
+    """
+    if process_names is None:
+        process_names = data_loader.get_processes()["name"].tolist()
+
+    buffer = io.StringIO()
+    # "\n" line endings match DataFrame.to_csv in generate_batch_export
+    writer = csv.DictWriter(
+        buffer,
+        fieldnames=batch_export_columns(process_names, units, price_breaks, cost_range),
+        lineterminator="\n",
+    )
+
+    writer.writeheader()
+    yield buffer.getvalue()
+
+    for item in parts_data:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerow(_batch_row(item, units))
+        yield buffer.getvalue()
+
+
+@instrumentation.timed("export.batch_csv")
+def write_batch_export(
+    parts_data, fh, process_names=None, units="Imperial", price_breaks=(), cost_range=()
+):
+    """
+    Writes a batch CSV incrementally to a text file-like object.
+
+    See iter_batch_export for the arguments.
+
+    Returns:
+        Number of part rows written
+    """
+    count = -1  # the first chunk is the header
+    for chunk in iter_batch_export(
+        parts_data, process_names, units, price_breaks, cost_range
+    ):
+        fh.write(chunk)
+        count += 1
+    return count
+
+
+# Reports with fewer thumbnails than this convert them in-process
+PARALLEL_THUMBNAIL_MIN = 8
+
+# Stroke colors to swap per theme. Thumbnails are rendered white-on-transparent
+# for the app's dark mode; "light" recolors them for white PDF pages.
+THUMBNAIL_THEMES = {
+    "dark": {},
+    "light": {
+        "rgb(255,255,255)": "rgb(0,0,0)",
+        "#ffffff": "#000000",
+        "#fff": "#000",
+        "white": "black",
+    },
+}
+
+# Converted drawings keyed by (SVG hash, theme, width); survives across exports
+_drawing_cache = OrderedDict()
+_DRAWING_CACHE_MAX_ENTRIES = 256
+
+
+def _thumbnail_key(svg_content, theme, width):
+    digest = hashlib.sha256(svg_content.encode("utf-8")).hexdigest()
+    return (digest, theme, width)
+
+
+def _convert_thumbnail(svg_content, theme="light", width=200):
+    """
+    Converts a thumbnail SVG into a ReportLab Drawing scaled to width.
+
+    Runs in worker processes, so it returns (drawing, error message) instead
+    of printing.
+    """
+    try:
+        # Parse from memory rather than a temp file
+        svg_root = load_svg_file(io.BytesIO(svg_content.encode("utf-8")))
+        if svg_root is None:
+            return None, "SVG could not be parsed"
+
+        # Recolor strokes for the theme in a single pass over the XML tree
+        recolor = THUMBNAIL_THEMES[theme]
+        if recolor:
+            for node in svg_root.iter(etree.Element):
+                stroke = node.get("stroke")
+                if stroke:
+                    replacement = recolor.get(stroke.replace(" ", "").lower())
+                    if replacement:
+                        node.set("stroke", replacement)
+
+        drawing = SvgRenderer("thumbnail.svg").render(svg_root)
+
+        if drawing:
+            # Resize drawing to fit nicely (e.g., width 200)
+            scale_factor = width / drawing.width
+            drawing.width *= scale_factor
+            drawing.height *= scale_factor
+            drawing.scale(scale_factor, scale_factor)
+        return drawing, None
+    except Exception as e:
+        return None, str(e)
+
+
+def _remember_drawing(key, drawing):
+    _drawing_cache[key] = drawing
+    _drawing_cache.move_to_end(key)
+    while len(_drawing_cache) > _DRAWING_CACHE_MAX_ENTRIES:
+        _drawing_cache.popitem(last=False)
+
+
+def svg_to_drawing(svg_content, theme="light", width=200):
+    """
+    Returns a memoized ReportLab Drawing for a thumbnail SVG.
+
+    The Drawing is shared between callers and must be treated as read-only.
+
+    Args:
+        svg_content: SVG text as produced by GeometryAnalyzer.get_thumbnail_svg
+        theme: Key of THUMBNAIL_THEMES ("light" for white pages)
+        width: Target width in points
+
+    Returns:
+        Drawing, or None if the SVG could not be converted
+    """
+    key = _thumbnail_key(svg_content, theme, width)
+    if key in _drawing_cache:
+        _drawing_cache.move_to_end(key)
+        return _drawing_cache[key]
+
+    drawing, error = _convert_thumbnail(svg_content, theme, width)
+    if error:
+        print(f"Error processing SVG: {error}")
+    if drawing is not None:
+        _remember_drawing(key, drawing)
+    return drawing
+
+
+@instrumentation.timed("export.pdf_thumbnails")
+def _prepare_thumbnails(svgs, workers=None, progress=None, theme="light"):
+    """
+    Converts thumbnail SVGs (None entries allowed) to Drawings. Cached
+    drawings are reused; the rest are converted once per distinct SVG, in a
+    process pool when there are enough of them. Results keep the input order.
+    """
+    results = [(None, None)] * len(svgs)
+
+    # Group parts by thumbnail so identical SVGs are converted once
+    pending = OrderedDict()
+    for i, svg in enumerate(svgs):
+        if not svg:
+            continue
+        key = _thumbnail_key(svg, theme, 200)
+        if key in _drawing_cache:
+            _drawing_cache.move_to_end(key)
+            results[i] = (_drawing_cache[key], None)
+        else:
+            pending.setdefault(key, (svg, []))[1].append(i)
+
+    total = len(pending)
+
+    def store(done, key, result):
+        if result[0] is not None:
+            _remember_drawing(key, result[0])
+        for i in pending[key][1]:
+            results[i] = result
+        if progress:
+            progress("thumbnails", done, total)
+
+    workers = workers or os.cpu_count() or 1
+    if workers > 1 and total >= PARALLEL_THUMBNAIL_MIN:
+        # spawn avoids forking a process that already holds Streamlit threads
+        with ProcessPoolExecutor(
+            max_workers=min(workers, total),
+            mp_context=multiprocessing.get_context("spawn"),
+        ) as executor:
+            converted = executor.map(
+                _convert_thumbnail,
+                [svg for svg, _ in pending.values()],
+                [theme] * total,
+                chunksize=4,
+            )
+            for done, (key, result) in enumerate(zip(pending, converted), start=1):
+                store(done, key, result)
+    else:
+        for done, (key, (svg, _)) in enumerate(pending.items(), start=1):
+            store(done, key, _convert_thumbnail(svg, theme))
+
+    return results
+
+
+def _part_story(item, drawing, units, styles):
+    """Builds the flowables for one part's report section"""
+    h2_style, h3_style, normal_style = styles
+
+    p_file_name = item["name"]
+    p_name = os.path.splitext(p_file_name)[0].replace("_", "-")
+    config = item["config"]
+    res = item["result"]
+
+    story = []
+
+    # Part Header
+    story.append(Paragraph(f"Part: {p_name}", h2_style))
+    story.append(Spacer(1, 2))
+
+    # --- Top Section: Thumbnail + Specs ---
+
+    # 2. Prepare Specs Table
+    if units == "Metric":
+        LBS_TO_KG = 0.453592
+        weight_val = res.get("weight_lbs", 0) * LBS_TO_KG
+        specs_data = [
+            ["Quantity:", str(config.get("quantity", 1))],
+            ["Material:", str(config.get("material", "-"))],
+            ["Weight:", f"{weight_val:.2f} kg"],
+            [
+                "Buy Weight:",
+                f"{res.get('buy_weight_lbs', 0) * LBS_TO_KG:.2f} kg",
+            ],
+            ["Per Part Cost:", f"${res.get('per_part_cost', 0):.2f}"],
+            ["Total Cost:", f"${res.get('total_cost_batch', 0):.2f}"],
+        ]
+    else:
+        specs_data = [
+            ["Quantity:", str(config.get("quantity", 1))],
+            ["Material:", str(config.get("material", "-"))],
+            ["Weight:", f"{res.get('weight_lbs', 0):.2f} lbs"],
+            ["Buy Weight:", f"{res.get('buy_weight_lbs', 0):.2f} lbs"],
+            ["Per Part Cost:", f"${res.get('per_part_cost', 0):.2f}"],
+            ["Total Cost:", f"${res.get('total_cost_batch', 0):.2f}"],
+        ]
+
+    if res.get("stock"):
+        specs_data.insert(3, ["Stock:", res["stock"]])
+        if res.get("utilization") is not None:
+            specs_data.insert(5, ["Utilization:", f"{res['utilization']:.0%}"])
+
+    for label, cost in item.get("cost_range", {}).items():
+        specs_data.append([f"{label} Total Cost:", f"${cost:.2f}"])
+
+    specs_table = Table(specs_data, colWidths=[100, 150])
+    specs_table.setStyle(
+        TableStyle(
+            [
+                ("FONTNAME", (0, 0), (0, -1), "Helvetica-Bold"),
+                ("ALIGN", (0, 0), (-1, -1), "LEFT"),
+                ("VALIGN", (0, 0), (-1, -1), "TOP"),
+                ("GRID", (0, 0), (-1, -1), 0.5, colors.lightgrey),
+            ]
+        )
+    )
+
+    # Layout for Top Section
+    # If we have a drawing, use a 2-column layout. If not, just specs.
+    if drawing:
+        # svglib returns a Drawing, which is a Flowable.
+        # Create a table with 2 columns: [Drawing, SpecsTable]
+        top_data = [[drawing, specs_table]]
+        top_layout = Table(top_data, colWidths=[250, 260])
+        top_layout.setStyle(
+            TableStyle(
+                [
+                    ("VALIGN", (0, 0), (-1, -1), "TOP"),
+                    ("ALIGN", (0, 0), (0, 0), "CENTER"),  # Center image
+                ]
+            )
+        )
+        story.append(top_layout)
+    else:
+        story.append(specs_table)
+
+    story.append(Spacer(1, 5))
+
+    # --- Price Breaks ---
+    price_breaks = item.get("price_breaks")
+    if price_breaks:
+        story.append(Paragraph("Price Breaks", h3_style))
+        quantities = sorted(price_breaks)
+        breaks_data = [
+            ["Quantity"] + [str(q) for q in quantities],
+            ["Per Part $"] + [f"${price_breaks[q]:.2f}" for q in quantities],
+            ["Total $"] + [f"${price_breaks[q] * q:.2f}" for q in quantities],
+        ]
+        label_width = 70
+        col_width = min(80, (510 - label_width) / len(quantities))
+        breaks_table = Table(
+            breaks_data, colWidths=[label_width] + [col_width] * len(quantities)
+        )
+        breaks_table.setStyle(
+            TableStyle(
+                [
+                    ("BACKGROUND", (0, 0), (-1, 0), colors.HexColor("#f0f2f6")),
+                    ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
+                    ("FONTNAME", (0, 0), (0, -1), "Helvetica-Bold"),
+                    ("ALIGN", (1, 0), (-1, -1), "CENTER"),
+                    ("FONTSIZE", (0, 0), (-1, -1), 9),
+                    ("GRID", (0, 0), (-1, -1), 0.5, colors.grey),
+                ]
+            )
+        )
+        story.append(breaks_table)
+        story.append(Spacer(1, 5))
+
+    # --- Bottom Section: Cost Breakdown ---
+    story.append(Paragraph("Cost Breakdown", h3_style))
+    # (Spacer removed as style has spaceBefore/spaceAfter)
+
+    breakdown_list = res.get("breakdown", [])
+    if breakdown_list:
+        # Table Header
+        table_data = [
+            [
+                "Process",
+                "Rate",
+                "Setup (mins)",
+                "Run (mins)",
+                "Setup $",
+                "Run $",
+                "Batch Total $",
+            ]
+        ]
+
+        for row in breakdown_list:
+            rate = row.get("Rate", 0)
+            unit_str = row.get("Unit", "").lower()
+
+            if units == "Metric" and "lbs" in unit_str:
+                # Convert $/lb to $/kg
+                LB_TO_KG_PRICE = 2.20462
+                rate = rate * LB_TO_KG_PRICE
+
+            table_data.append(
+                [
+                    row.get("Process", ""),
+                    f"{rate:.2f}",
+                    f"{row.get('Setup Mins', 0):.1f}"
+                    if row.get("Setup Mins") is not None
+                    else "-",
+                    f"{row.get('Run Mins', 0):.1f}"
+                    if row.get("Run Mins") is not None
+                    else "-",
+                    f"${row.get('Setup Cost', 0):.2f}"
+                    if row.get("Setup Cost") is not None
+                    else "-",
+                    f"${row.get('Run Cost', 0):.2f}"
+                    if row.get("Run Cost") is not None
+                    else "-",
+                    f"${row.get('Batch Total Cost', 0):.2f}",
+                ]
+            )
+
+        bd_table = Table(table_data, colWidths=[140, 50, 60, 60, 60, 60, 80])
+        bd_table.setStyle(
+            TableStyle(
+                [
+                    ("BACKGROUND", (0, 0), (-1, 0), colors.HexColor("#f0f2f6")),
+                    ("TEXTCOLOR", (0, 0), (-1, 0), colors.black),
+                    ("ALIGN", (0, 0), (-1, -1), "CENTER"),
+                    ("ALIGN", (0, 0), (0, -1), "LEFT"),  # Process column left align
+                    ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
+                    ("FONTSIZE", (0, 0), (-1, -1), 9),
+                    ("GRID", (0, 0), (-1, -1), 0.5, colors.grey),
+                ]
+            )
+        )
+        story.append(bd_table)
+    else:
+        story.append(Paragraph("No cost details available.", normal_style))
+
+    story.append(Spacer(1, 30))
+    # Add a visual divider
+    story.append(Paragraph("_" * 60, normal_style))
+    story.append(Spacer(1, 30))
+
+    return story
+
+
+@instrumentation.timed("export.pdf")
+def generate_pdf_export(
+    parts_data, units="Imperial", output=None, workers=None, progress=None
+):
     """
     Generates a PDF report for a batch of parts.
 
+    Thumbnails are converted in parallel worker processes, and the report can
+    be written straight to a file instead of being returned as bytes.
+
     Args:
         parts_data: List of dicts, same as generate_batch_export but may include 'thumbnail_svg'
+        units: "Imperial" or "Metric"
+        output: Optional file path or binary file-like object to write to
+        workers: Thumbnail conversion processes (defaults to the CPU count)
+        progress: Optional callable(stage, done, total), where stage is
+            "thumbnails" or "layout"
 
     Returns:
-        bytes: The PDF file content
+        bytes: The PDF file content, or None when output is given
     """
-    buffer = io.BytesIO()
+    buffer = io.BytesIO() if output is None else None
     doc = SimpleDocTemplate(
-        buffer,
+        output if output is not None else buffer,
         pagesize=letter,
         rightMargin=40,
         leftMargin=40,
@@ -210,7 +654,6 @@ def generate_pdf_export(parts_data, units="Imperial"):
         bottomMargin=40,
     )
 
-    story = []
     styles = getSampleStyleSheet()
     title_style = styles["Title"]
     h2_style = styles["Heading2"]
@@ -223,188 +666,36 @@ def generate_pdf_export(parts_data, units="Imperial"):
 
     normal_style = styles["Normal"]
 
+    # 1. Prepare Thumbnails
+    thumbnails = _prepare_thumbnails(
+        [item.get("thumbnail_svg") for item in parts_data], workers, progress
+    )
+
     # Report Title
+    story = []
     story.append(Paragraph("QuoteForge Part Report", title_style))
     story.append(Spacer(1, 10))
 
-    for item in parts_data:
-        p_file_name = item["name"]
-        p_name = os.path.splitext(p_file_name)[0].replace("_", "-")
-        config = item["config"]
-        res = item["result"]
-        svg_content = item.get("thumbnail_svg")
-
-        # Part Header
-        story.append(Paragraph(f"Part: {p_name}", h2_style))
-        story.append(Spacer(1, 2))
-
-        # --- Top Section: Thumbnail + Specs ---
-
-        # 1. Prepare Thumbnail
-        drawing = None
-        if svg_content:
-            try:
-                # Ensure the thumbnail is visible on white PDF background by changing white stroke to black
-                svg_content = svg_content.replace(
-                    'stroke="rgb(255,255,255)"', 'stroke="rgb(0,0,0)"'
-                )
-                svg_content = svg_content.replace(
-                    'stroke="#ffffff"', 'stroke="#000000"'
-                )
-                svg_content = svg_content.replace(
-                    'stroke="#FFFFFF"', 'stroke="#000000"'
-                )
-
-                # svglib needs a file path
-                with tempfile.NamedTemporaryFile(
-                    delete=False, suffix=".svg", mode="w"
-                ) as tmp_svg:
-                    tmp_svg.write(svg_content)
-                    tmp_svg_path = tmp_svg.name
-
-                drawing = svg2rlg(tmp_svg_path)
-                os.remove(tmp_svg_path)
-
-                if drawing:
-                    # Resize drawing to fit nicely (e.g., width 200)
-                    desired_width = 200
-                    scale_factor = desired_width / drawing.width
-                    drawing.width *= scale_factor
-                    drawing.height *= scale_factor
-                    drawing.scale(scale_factor, scale_factor)
-            except Exception as e:
-                print(f"Error processing SVG for {p_name}: {e}")
-                drawing = None
-
-        # 2. Prepare Specs Table
-        # Data for specs
-        # 2. Prepare Specs Table
-        if units == "Metric":
-            LBS_TO_KG = 0.453592
-            weight_val = res.get("weight_lbs", 0) * LBS_TO_KG
-            specs_data = [
-                ["Quantity:", str(config.get("quantity", 1))],
-                ["Material:", str(config.get("material", "-"))],
-                ["Weight:", f"{weight_val:.2f} kg"],
-                ["Per Part Cost:", f"${res.get('per_part_cost', 0):.2f}"],
-                ["Total Cost:", f"${res.get('total_cost_batch', 0):.2f}"],
-            ]
-        else:
-            specs_data = [
-                ["Quantity:", str(config.get("quantity", 1))],
-                ["Material:", str(config.get("material", "-"))],
-                ["Weight:", f"{res.get('weight_lbs', 0):.2f} lbs"],
-                ["Per Part Cost:", f"${res.get('per_part_cost', 0):.2f}"],
-                ["Total Cost:", f"${res.get('total_cost_batch', 0):.2f}"],
-            ]
-
-        specs_table = Table(specs_data, colWidths=[100, 150])
-        specs_table.setStyle(
-            TableStyle(
-                [
-                    ("FONTNAME", (0, 0), (0, -1), "Helvetica-Bold"),
-                    ("ALIGN", (0, 0), (-1, -1), "LEFT"),
-                    ("VALIGN", (0, 0), (-1, -1), "TOP"),
-                    ("GRID", (0, 0), (-1, -1), 0.5, colors.lightgrey),
-                ]
-            )
+    for item, (drawing, error) in zip(parts_data, thumbnails):
+        if error:
+            p_name = os.path.splitext(item["name"])[0].replace("_", "-")
+            print(f"Error processing SVG for {p_name}: {error}")
+        story.extend(
+            _part_story(item, drawing, units, (h2_style, h3_style, normal_style))
         )
 
-        # Layout for Top Section
-        # If we have a drawing, use a 2-column layout. If not, just specs.
-        if drawing:
-            # We can't put a Drawing directly into a Table cell easily with Flowables?
-            # Actually we can if we wrap it in renderPDF.GraphicsFlowable or similar?
-            # svglib returns a Drawing, which is a Flowable.
-
-            # Create a table with 2 columns: [Drawing, SpecsTable]
-            top_data = [[drawing, specs_table]]
-            top_layout = Table(top_data, colWidths=[250, 260])
-            top_layout.setStyle(
-                TableStyle(
-                    [
-                        ("VALIGN", (0, 0), (-1, -1), "TOP"),
-                        ("ALIGN", (0, 0), (0, 0), "CENTER"),  # Center image
-                    ]
-                )
-            )
-            story.append(top_layout)
-        else:
-            story.append(specs_table)
+    if progress:
+        n_flowables = len(story)
 
-        story.append(Spacer(1, 5))
-
-        # --- Bottom Section: Cost Breakdown ---
-        story.append(Paragraph("Cost Breakdown", h3_style))
-        # (Spacer removed as style has spaceBefore/spaceAfter)
-
-        breakdown_list = res.get("breakdown", [])
-        if breakdown_list:
-            # Table Header
-            table_data = [
-                [
-                    "Process",
-                    "Rate",
-                    "Setup (mins)",
-                    "Run (mins)",
-                    "Setup $",
-                    "Run $",
-                    "Batch Total $",
-                ]
-            ]
+        def on_build_progress(kind, value):
+            if kind == "PROGRESS":
+                progress("layout", max(0, min(value, n_flowables)), n_flowables)
 
-            for row in breakdown_list:
-                rate = row.get("Rate", 0)
-                unit_str = row.get("Unit", "").lower()
-
-                if units == "Metric" and "lbs" in unit_str:
-                    # Convert $/lb to $/kg
-                    LB_TO_KG_PRICE = 2.20462
-                    rate = rate * LB_TO_KG_PRICE
-
-                table_data.append(
-                    [
-                        row.get("Process", ""),
-                        f"{rate:.2f}",
-                        f"{row.get('Setup Mins', 0):.1f}"
-                        if row.get("Setup Mins") is not None
-                        else "-",
-                        f"{row.get('Run Mins', 0):.1f}"
-                        if row.get("Run Mins") is not None
-                        else "-",
-                        f"${row.get('Setup Cost', 0):.2f}"
-                        if row.get("Setup Cost") is not None
-                        else "-",
-                        f"${row.get('Run Cost', 0):.2f}"
-                        if row.get("Run Cost") is not None
-                        else "-",
-                        f"${row.get('Batch Total Cost', 0):.2f}",
-                    ]
-                )
-
-            bd_table = Table(table_data, colWidths=[140, 50, 60, 60, 60, 60, 80])
-            bd_table.setStyle(
-                TableStyle(
-                    [
-                        ("BACKGROUND", (0, 0), (-1, 0), colors.HexColor("#f0f2f6")),
-                        ("TEXTCOLOR", (0, 0), (-1, 0), colors.black),
-                        ("ALIGN", (0, 0), (-1, -1), "CENTER"),
-                        ("ALIGN", (0, 0), (0, -1), "LEFT"),  # Process column left align
-                        ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
-                        ("FONTSIZE", (0, 0), (-1, -1), 9),
-                        ("GRID", (0, 0), (-1, -1), 0.5, colors.grey),
-                    ]
-                )
-            )
-            story.append(bd_table)
-        else:
-            story.append(Paragraph("No cost details available.", normal_style))
-
-        story.append(Spacer(1, 30))
-        # Add a visual divider
-        story.append(Paragraph("_" * 60, normal_style))
-        story.append(Spacer(1, 30))
+        doc.setProgressCallBack(on_build_progress)
 
     doc.build(story)
+
+    if buffer is None:
+        return None
     buffer.seek(0)
     return buffer.getvalue()
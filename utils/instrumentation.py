@@ -0,0 +1,186 @@
+"""
+Lightweight instrumentation for QuoteForge hot paths.
+Records span durations and counters in memory so slow quotes can be traced to
+STEP import, thumbnail export, rate fetches, costing or report generation.
+
+Spans are recorded into the process-wide registry and, when one is active,
+into a per-session registry set with ``use_registry`` (the app keeps one per
+Streamlit session). Spans timed inside process-pool workers stay in the
+worker, so pooled calls are also timed as a whole in the parent.
+"""
+
+import contextvars
+import functools
+import json
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional
+
+from utils.lazy import lazy_import
+
+# Only needed to summarize, so it stays out of the import path
+np = lazy_import("numpy")
+
+# Samples kept per span name; older samples are dropped first
+MAX_SAMPLES = 1000
+
+PERCENTILES = (50, 90, 99)
+
+
+class Registry:
+    """Thread-safe store of span samples (seconds) and counters"""
+
+    def __init__(self, max_samples: int = MAX_SAMPLES):
+        self.max_samples = max_samples
+        self._lock = threading.Lock()
+        self._samples: Dict[str, deque] = {}
+        self._span_totals: Dict[str, list] = {}
+        self._counters: Dict[str, float] = {}
+
+    def observe(self, name: str, seconds: float) -> None:
+        """Records one span duration"""
+        with self._lock:
+            samples = self._samples.get(name)
+            if samples is None:
+                samples = self._samples[name] = deque(maxlen=self.max_samples)
+                self._span_totals[name] = [0, 0.0]
+            samples.append(seconds)
+            totals = self._span_totals[name]
+            totals[0] += 1
+            totals[1] += seconds
+
+    def increment(self, name: str, amount: float = 1) -> None:
+        """Adds amount to a counter"""
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + amount
+
+    def reset(self) -> None:
+        with self._lock:
+            self._samples.clear()
+            self._span_totals.clear()
+            self._counters.clear()
+
+    def summary(self) -> dict:
+        """
+        Returns span statistics and counters.
+
+        Returns:
+            Dict with "spans" (name -> count, total_s, p50_s, p90_s, p99_s,
+            max_s over the retained samples) and "counters" (name -> value)
+        """
+        with self._lock:
+            samples = {name: list(values) for name, values in self._samples.items()}
+            totals = {name: list(values) for name, values in self._span_totals.items()}
+            counters = dict(self._counters)
+
+        spans = {}
+        for name in sorted(samples):
+            values = np.asarray(samples[name])
+            stats = {"count": totals[name][0], "total_s": totals[name][1]}
+            for pct, value in zip(PERCENTILES, np.percentile(values, PERCENTILES)):
+                stats[f"p{pct}_s"] = float(value)
+            stats["max_s"] = float(values.max())
+            spans[name] = stats
+
+        return {"spans": spans, "counters": dict(sorted(counters.items()))}
+
+    def to_json(self) -> str:
+        return json.dumps(self.summary(), indent=2)
+
+    def to_prometheus(self, prefix: str = "quoteforge") -> str:
+        """Renders the registry in the Prometheus text exposition format"""
+        summary = self.summary()
+        lines = []
+
+        if summary["spans"]:
+            metric = f"{prefix}_span_seconds"
+            lines.append(f"# TYPE {metric} summary")
+            for name, stats in summary["spans"].items():
+                label = f'span="{_escape_label(name)}"'
+                for pct in PERCENTILES:
+                    quantile = pct / 100
+                    lines.append(
+                        f'{metric}{{{label},quantile="{quantile}"}} {stats[f"p{pct}_s"]:.6f}'
+                    )
+                lines.append(f"{metric}_sum{{{label}}} {stats['total_s']:.6f}")
+                lines.append(f"{metric}_count{{{label}}} {stats['count']}")
+
+        if summary["counters"]:
+            metric = f"{prefix}_events_total"
+            lines.append(f"# TYPE {metric} counter")
+            for name, value in summary["counters"].items():
+                lines.append(f'{metric}{{event="{_escape_label(name)}"}} {value:g}')
+
+        return "\n".join(lines) + "\n"
+
+
+def _escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+# Process-wide registry; every span and counter lands here
+default_registry = Registry()
+
+_session_registry: contextvars.ContextVar[Optional[Registry]] = contextvars.ContextVar(
+    "quoteforge_session_registry", default=None
+)
+
+
+@contextmanager
+def use_registry(registry: Registry) -> Iterator[Registry]:
+    """Also records spans and counters into registry for the enclosed block"""
+    token = _session_registry.set(registry)
+    try:
+        yield registry
+    finally:
+        _session_registry.reset(token)
+
+
+def set_session_registry(registry: Optional[Registry]) -> None:
+    """
+    Makes registry the session registry for the current context until changed.
+    Suits script-style callers (such as a Streamlit rerun) that cannot wrap
+    their whole body in use_registry.
+    """
+    _session_registry.set(registry)
+
+
+def _targets():
+    session = _session_registry.get()
+    if session is None or session is default_registry:
+        return (default_registry,)
+    return (default_registry, session)
+
+
+def count(name: str, amount: float = 1) -> None:
+    """Increments a counter"""
+    for registry in _targets():
+        registry.increment(name, amount)
+
+
+@contextmanager
+def span(name: str) -> Iterator[None]:
+    """Times the enclosed block, recording it even if it raises"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        for registry in _targets():
+            registry.observe(name, elapsed)
+
+
+def timed(name: str):
+    """Decorator form of span"""
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,88 @@
+"""
+Deferred imports for QuoteForge.
+Heavy dependencies (CadQuery/OCP, ReportLab, pandas) are imported on first
+attribute access instead of at startup, and can be preloaded in a background
+thread once the first page has rendered.
+"""
+
+import importlib
+import sys
+import threading
+import types
+from typing import Optional
+
+
+class LazyModule(types.ModuleType):
+    """
+    Stand-in for a module that imports it on first attribute access.
+
+    Attribute lookups are always forwarded to the real module, so module
+    globals that are reassigned after import stay current.
+    """
+
+    def __init__(self, name: str):
+        super().__init__(name)
+        self.__dict__["_lazy_module"] = None
+
+    def _load(self) -> types.ModuleType:
+        module = self.__dict__["_lazy_module"]
+        if module is None:
+            # importlib serializes concurrent imports of the same module
+            module = importlib.import_module(self.__name__)
+            self.__dict__["_lazy_module"] = module
+        return module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __dir__(self):
+        return dir(self._load())
+
+    @property
+    def is_loaded(self) -> bool:
+        return self.__dict__["_lazy_module"] is not None
+
+    def __repr__(self):
+        state = "loaded" if self.is_loaded else "not loaded"
+        return f"<lazy module '{self.__name__}' ({state})>"
+
+
+def lazy_import(name: str):
+    """Returns the module if it is already imported, otherwise a LazyModule"""
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+    return LazyModule(name)
+
+
+_warm_up_lock = threading.Lock()
+_warm_up_thread: Optional[threading.Thread] = None
+
+
+def warm_up(*modules) -> Optional[threading.Thread]:
+    """
+    Imports lazy modules in a background thread, in the given order.
+
+    Only one warm-up runs per process; later calls return the running thread,
+    or None once everything is already loaded.
+    """
+    global _warm_up_thread
+
+    pending = [m for m in modules if isinstance(m, LazyModule) and not m.is_loaded]
+    with _warm_up_lock:
+        if _warm_up_thread is not None and _warm_up_thread.is_alive():
+            return _warm_up_thread
+        if not pending:
+            return None
+
+        def run():
+            for module in pending:
+                try:
+                    module._load()
+                except Exception as e:
+                    # The real import error resurfaces on first use
+                    print(f"[Lazy] Warm-up import of {module.__name__} failed: {e}")
+
+        _warm_up_thread = threading.Thread(target=run, name="lazy-warm-up", daemon=True)
+        _warm_up_thread.start()
+        return _warm_up_thread